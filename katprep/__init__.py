@@ -10,10 +10,14 @@ from __future__ import absolute_import, print_function
 import getpass
 import logging
 import os
-import json
 import argparse
+from collections import OrderedDict
 from .AuthContainer import AuthContainer, ContainerException
 from .exceptions import SessionException
+from .storage.journal import apply_journal
+from .storage.jsonfile import ReportStore
+from .storage.jsonl import JSONLReportStore, is_jsonl_report
+from .storage.sqlite import SQLiteReportStore, is_sqlite_report
 
 try:
     raw_input
@@ -149,9 +153,30 @@ def get_json(filename):
 
 
 
+def get_report_store(filename):
+    """
+    Opens a snapshot report using the store matching its format. Values of
+    a verification journal that hasn't been merged yet are applied.
+
+    :param filename: the report filename
+    :type filename: str
+    """
+    if is_jsonl_report(filename):
+        report = JSONLReportStore(filename)
+    elif is_sqlite_report(filename):
+        report = SQLiteReportStore(filename)
+    else:
+        report = ReportStore(filename)
+    apply_journal(report)
+    return report
+
+
+
 def is_valid_report(filename):
     """
-    Checks whether a JSON file contains a valid snapshot report.
+    Checks whether a JSON file contains a valid snapshot report. The report
+    is parsed only once, the resulting ReportStore is returned so that it
+    can be used directly.
 
     :param filename: the JSON filename
     :type filename: str
@@ -161,9 +186,9 @@ def is_valid_report(filename):
             " readable".format(filename))
     #check whether valid json
     try:
-        json_obj = json.loads(get_json(filename))
+        report = get_report_store(filename)
         #check whether at least one host with a params dict is found
-        if "params" not in iter(json_obj.values()).next().keys():
+        if "params" not in report[next(iter(report))].keys():
             raise argparse.ArgumentTypeError("File '{}' is not a valid JSON" \
                 " snapshot report.".format(filename))
     except StopIteration as err:
@@ -172,7 +197,10 @@ def is_valid_report(filename):
     except ValueError as err:
         raise argparse.ArgumentTypeError("File '{}' is not a valid JSON" \
             " document: '{}'".format(filename, err))
-    return filename
+    except (AttributeError, KeyError, TypeError):
+        raise argparse.ArgumentTypeError("File '{}' is not a valid JSON" \
+            " snapshot report.".format(filename))
+    return report
 
 
 
@@ -231,21 +259,22 @@ def get_required_hosts_by_report(report, key):
     """
     Retrieves all required external hosts (such as monitoring systems
     or hypervisor connections) for maintaining hosts mentioned in a
-    report.
+    report. The first host maintained using every external host is
+    returned by external host.
 
     :param report: report dictionary
     :type report: dict
     :param key: key that contains hostname (e.g. katprep_virt)
     :type key: str
     """
-    hosts=[]
-    try:
-        for host in report:
-            if report[host]["params"][key] != "" and report[host]["params"][key] not in hosts:
-                hosts.append(report[host]["params"][key])
-    except KeyError:
+    hosts = OrderedDict()
+    for host in report:
+        try:
+            if report[host]["params"][key] != "" and \
+                report[host]["params"][key] not in hosts:
+                hosts[report[host]["params"][key]] = host
+        except KeyError:
             LOGGER.info("Key '{}' not found for host '{}'".format(key, host))
-            pass
     return hosts
 
 
@@ -260,8 +289,38 @@ def get_host_params_by_report(report, host):
     :type host: str
     """
     try:
-        for entry in report:
-            return report[entry]["params"]
+        return report[host]["params"]
     except KeyError:
-            LOGGER.info("Parameters not found for host '{}'".format(host))
-            pass
+        LOGGER.info("Parameters not found for host '{}'".format(host))
+        return {}
+
+
+
+def get_id_by_report(report, host, api_object, api_client):
+    """
+    Retrieves the Foreman ID of a host (api_object "host") or of its
+    organization or location. IDs stored in the report are preferred, for
+    reports created by previous versions the ID is looked up by name.
+
+    :param report: report dictionary
+    :type report: dict
+    :param host: hostname
+    :type host: str
+    :param api_object: Foreman object type (host, organization, location)
+    :type api_object: str
+    :param api_client: Foreman API client
+    :type api_client: ForemanAPIClient
+    """
+    params = get_host_params_by_report(report, host)
+    object_id = params.get("{}_id".format(api_object))
+    if object_id not in (None, ""):
+        return object_id
+    if api_object == "host":
+        name = host
+    else:
+        name = params.get("{}_name".format(api_object))
+    LOGGER.debug(
+        "No %s ID for host '%s' stored, looking up '%s'", api_object,
+        host, name
+    )
+    return api_client.get_id_by_name(name, api_object)
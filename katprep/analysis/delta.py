@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Errata delta between two snapshot reports.
+
+The errata IDs of a host are collected into a set once per report, the
+installed, remaining and new errata are then computed with set lookups.
+As only the IDs of the newer report are needed, they can also be collected
+for all hosts up front (see get_errata_index), so that both reports never
+have to be opened at the same time.
+"""
+
+import logging
+
+LOGGER = logging.getLogger('katprep_analysis')
+"""
+logging: Logger instance
+"""
+
+
+def get_errata_ids(errata):
+    """
+    Returns the set of erratum IDs of a host's errata list.
+
+    :param errata: errata
+    :type errata: list
+    """
+    return set(erratum["errata_id"] for erratum in errata)
+
+
+
+class HostDelta(object):
+    """
+.. class:: HostDelta
+    Errata changes of a single host between two snapshot reports.
+
+    :param host: hostname
+    :type host: str
+    :param params: host parameters of the older report
+    :type params: dict
+    :param verification: verification settings of the older report
+    :type verification: dict
+    :param installed: errata that were installed between the snapshots
+    :type installed: list
+    :param remaining: errata that are still outstanding
+    :type remaining: list
+    :param new: errata that appeared in the newer snapshot
+    :type new: list
+    """
+
+    def __init__(self, host, params, verification, installed, remaining,
+                 new):
+        """
+        Constructor, creating the class. It requires specifying the
+        hostname, its parameters, verification settings and errata lists.
+        """
+        self.host = host
+        self.params = params
+        self.verification = verification
+        self.installed = installed
+        self.remaining = remaining
+        self.new = new
+
+    def __repr__(self):
+        return "HostDelta({!r}, installed={}, remaining={}, new={})".format(
+            self.host, len(self.installed), len(self.remaining),
+            len(self.new)
+        )
+
+    def is_patched(self):
+        """
+        Returns whether at least one erratum was installed.
+        """
+        return len(self.installed) > 0
+
+    def get_report_data(self):
+        """
+        Returns the data used for rendering a host report. This uses the
+        layout of a snapshot report host entry (``params``, ``verification``
+        and ``errata``) with ``errata`` containing the installed errata.
+        """
+        return {
+            "params": self.params,
+            "verification": self.verification,
+            "errata": self.installed
+        }
+
+
+
+def get_host_delta(host, old_entry, new_entry):
+    """
+    Computes the errata delta of a host.
+
+    :param host: hostname
+    :type host: str
+    :param old_entry: host entry of the older report
+    :type old_entry: dict
+    :param new_entry: host entry of the newer report
+    :type new_entry: dict
+    """
+    new_errata = new_entry.get("errata", [])
+    delta = get_host_delta_by_ids(
+        host, old_entry, get_errata_ids(new_errata)
+    )
+    old_ids = get_errata_ids(old_entry.get("errata", []))
+    delta.new = [x for x in new_errata if x["errata_id"] not in old_ids]
+    return delta
+
+
+
+def get_host_delta_by_ids(host, old_entry, new_ids):
+    """
+    Computes the errata delta of a host using only the erratum IDs of the
+    newer report. New errata therefore only consist of their ID.
+
+    :param host: hostname
+    :type host: str
+    :param old_entry: host entry of the older report
+    :type old_entry: dict
+    :param new_ids: erratum IDs of the newer report
+    :type new_ids: set
+    """
+    old_errata = old_entry.get("errata", [])
+    old_ids = get_errata_ids(old_errata)
+
+    installed = []
+    remaining = []
+    for erratum in old_errata:
+        if erratum["errata_id"] in new_ids:
+            LOGGER.debug(
+                "Erratum '%s' (#%s) seems not to be installed on '%s'",
+                erratum.get("summary"), erratum["errata_id"], host
+            )
+            remaining.append(erratum)
+        else:
+            installed.append(erratum)
+    new = [{"errata_id": x} for x in sorted(new_ids - old_ids)]
+
+    return HostDelta(
+        host, dict(old_entry.get("params", {})),
+        dict(old_entry.get("verification", {})), installed, remaining, new
+    )
+
+
+
+def iter_deltas(report_old, report_new, release=False):
+    """
+    Yields the errata delta of every host of the older report that is also
+    part of the newer report.
+
+    :param report_old: older snapshot report
+    :type report_old: ReportStore
+    :param report_new: newer snapshot report
+    :type report_new: ReportStore
+    :param release: drops decoded hosts from the reports once processed
+    :type release: bool
+    """
+    for host in report_old:
+        LOGGER.debug("Analyzing changes for host '%s'", host)
+        try:
+            new_entry = report_new[host]
+        except KeyError:
+            LOGGER.debug("Unable to find changes for host '%s'", host)
+            continue
+        yield get_host_delta(host, report_old[host], new_entry)
+        if release:
+            report_old.release(host)
+            report_new.release(host)
+
+
+
+def get_errata_index(report, release=False):
+    """
+    Returns the erratum IDs of every host of a report by hostname. This is
+    all that is needed from the newer report for computing deltas, so the
+    newer report can be closed before reading the older one.
+
+    :param report: newer snapshot report
+    :type report: ReportStore
+    :param release: drops decoded hosts from the report once processed
+    :type release: bool
+    """
+    index = {}
+    for host in report:
+        index[host] = get_errata_ids(report[host].get("errata", []))
+        if release:
+            report.release(host)
+    return index
+
+
+
+def iter_deltas_by_index(report_old, errata_index, release=False):
+    """
+    Yields the errata delta of every host of the older report that is also
+    part of the errata index of the newer report (see get_errata_index).
+
+    :param report_old: older snapshot report
+    :type report_old: ReportStore
+    :param errata_index: erratum IDs of the newer report by hostname
+    :type errata_index: dict
+    :param release: drops decoded hosts from the report once processed
+    :type release: bool
+    """
+    for host in report_old:
+        if host not in errata_index:
+            LOGGER.debug("Unable to find changes for host '%s'", host)
+            continue
+        yield get_host_delta_by_ids(host, report_old[host], errata_index[host])
+        if release:
+            report_old.release(host)
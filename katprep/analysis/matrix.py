@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse host×errata matrix of a snapshot report.
+
+The matrix is stored in compressed sparse row (CSR) layout: erratum IDs
+are interned to integers, the sorted erratum IDs of all hosts are stored
+in one flat ``indices`` array and ``indptr`` marks where every host's row
+starts. Column queries use a transposed (CSC) copy that is built on first
+use.
+"""
+
+from array import array
+from collections import OrderedDict
+
+
+class ErrataMatrix(object):
+    """
+.. class:: ErrataMatrix
+    Boolean matrix of outstanding errata (columns) per host (rows).
+    """
+
+    def __init__(self):
+        """
+        Constructor, creating an empty matrix.
+        """
+        self.hosts = []
+        self.errata = []
+        self._host_index = {}
+        self._errata_index = {}
+        self.indptr = array('l', [0])
+        self.indices = array('l')
+        self._csc = None
+
+    @classmethod
+    def from_report(cls, report, release=True):
+        """
+        Creates the matrix of a snapshot report.
+
+        :param report: snapshot report
+        :type report: ReportStore
+        :param release: drops decoded hosts from the report once added
+        :type release: bool
+        """
+        matrix = cls()
+        for host in report:
+            matrix.add_host(
+                host, [x["errata_id"] for x in report[host]["errata"]]
+            )
+            if release:
+                report.release(host)
+        return matrix
+
+    @property
+    def shape(self):
+        """
+        Returns the number of rows (hosts) and columns (errata).
+        """
+        return (len(self.hosts), len(self.errata))
+
+    def add_host(self, host, errata):
+        """
+        Adds a host row.
+
+        :param host: hostname
+        :type host: str
+        :param errata: erratum IDs (e.g. RHSA-2017:0001)
+        :type errata: list
+        """
+        if host in self._host_index:
+            raise ValueError("Host '{}' already added".format(host))
+        row = set()
+        for erratum in errata:
+            column = self._errata_index.get(erratum)
+            if column is None:
+                column = self._errata_index[erratum] = len(self.errata)
+                self.errata.append(erratum)
+            row.add(column)
+        self._host_index[host] = len(self.hosts)
+        self.hosts.append(host)
+        self.indices.extend(sorted(row))
+        self.indptr.append(len(self.indices))
+        self._csc = None
+
+    def get_row(self, host):
+        """
+        Returns the erratum IDs of a host. Raises KeyError for unknown
+        hosts.
+
+        :param host: hostname
+        :type host: str
+        """
+        row = self._host_index[host]
+        return [self.errata[x] for x in
+                self.indices[self.indptr[row]:self.indptr[row + 1]]]
+
+    def get_column_counts(self):
+        """
+        Returns the number of hosts per erratum (column sums).
+        """
+        counts = array('l', [0]) * len(self.errata)
+        for column in self.indices:
+            counts[column] += 1
+        return counts
+
+    def __get_csc(self):
+        """
+        Returns the transposed matrix (column pointers and host rows),
+        building it on first use.
+        """
+        if self._csc is None:
+            counts = self.get_column_counts()
+            colptr = array('l', [0]) * (len(self.errata) + 1)
+            for column, count in enumerate(counts):
+                colptr[column + 1] = colptr[column] + count
+            rows = array('l', [0]) * len(self.indices)
+            position = array('l', colptr[:-1])
+            for row in range(len(self.hosts)):
+                for column in self.indices[
+                        self.indptr[row]:self.indptr[row + 1]]:
+                    rows[position[column]] = row
+                    position[column] += 1
+            self._csc = (colptr, rows)
+        return self._csc
+
+    def get_hosts_missing(self, erratum):
+        """
+        Returns the hosts an erratum is outstanding for (column query).
+
+        :param erratum: erratum ID
+        :type erratum: str
+        """
+        column = self._errata_index.get(erratum)
+        if column is None:
+            return []
+        colptr, rows = self.__get_csc()
+        return [self.hosts[x] for x in rows[colptr[column]:colptr[column + 1]]]
+
+    def get_common_errata(self, threshold=0.9):
+        """
+        Returns errata outstanding for at least a share of all hosts along
+        with the number of hosts and the share, most common errata first.
+
+        :param threshold: minimum share of hosts (0-1)
+        :type threshold: float
+        """
+        if not self.hosts:
+            return []
+        minimum = threshold * len(self.hosts)
+        common = [
+            (self.errata[column], count, float(count) / len(self.hosts))
+            for column, count in enumerate(self.get_column_counts())
+            if count >= minimum
+        ]
+        return sorted(common, key=lambda x: (-x[1], x[0]))
+
+    def get_identical_hosts(self, min_hosts=2):
+        """
+        Returns groups of hosts sharing identical sets of outstanding errata,
+        largest groups first. Every group consists of the erratum IDs and
+        the hostnames.
+
+        :param min_hosts: minimum number of hosts per group
+        :type min_hosts: int
+        """
+        groups = OrderedDict()
+        for row, host in enumerate(self.hosts):
+            key = self.indices[
+                self.indptr[row]:self.indptr[row + 1]].tobytes()
+            groups.setdefault(key, (row, []))[1].append(host)
+        result = [
+            (self.get_row(self.hosts[row]), hosts)
+            for row, hosts in groups.values() if len(hosts) >= min_hosts
+        ]
+        return sorted(result, key=lambda x: (-len(x[1]), x[1][0]))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Fleet-wide maintenance summary.
+
+The summary is computed in a single pass over the host deltas of two
+snapshot reports, only counters are kept in memory.
+"""
+
+from collections import Counter, OrderedDict
+import csv
+import html
+
+GROUP_PARAMS = OrderedDict([
+    ("organization", "organization_name"),
+    ("location", "location_name"),
+    ("environment", "environment_name"),
+])
+"""
+OrderedDict: Host parameters used for grouping systems
+"""
+MON_STATUS_OK = "Ok"
+"""
+str: Monitoring status of systems without failing services
+"""
+
+
+class FleetSummary(object):
+    """
+.. class:: FleetSummary
+    Aggregated errata and verification statistics of all systems.
+    """
+
+    def __init__(self):
+        """
+        Constructor, creating an empty summary.
+        """
+        self.systems = 0
+        self.patched = 0
+        self.errata = 0
+        self.reboots_suggested = 0
+        self.rebooted = 0
+        self.by_type = Counter()
+        self.by_severity = Counter()
+        self.groups = dict(
+            (group, {}) for group in GROUP_PARAMS
+        )
+        self.failures = []
+
+    def add(self, delta):
+        """
+        Adds a host delta to the summary.
+
+        :param delta: errata delta of a system
+        :type delta: HostDelta
+        """
+        self.systems += 1
+        installed = len(delta.installed)
+        if installed:
+            self.patched += 1
+            self.errata += installed
+        for erratum in delta.installed:
+            self.by_type[erratum.get("type") or "unknown"] += 1
+            self.by_severity[erratum.get("severity") or "None"] += 1
+        if any(x.get("reboot_suggested") for x in delta.installed):
+            self.reboots_suggested += 1
+        if delta.verification.get("system_reboot"):
+            self.rebooted += 1
+
+        for group, param in GROUP_PARAMS.items():
+            name = delta.params.get(param) or "unknown"
+            counts = self.groups[group].setdefault(name, Counter())
+            counts["systems"] += 1
+            counts["patched"] += 1 if installed else 0
+            counts["errata"] += installed
+
+        status = delta.verification.get("mon_status")
+        if status and status != MON_STATUS_OK:
+            self.failures.append((
+                delta.host, status,
+                delta.verification.get("mon_status_detail", "")
+            ))
+
+    def get_tables(self):
+        """
+        Returns the summary as list of tables. Every table consists of a
+        title, the column headers and the rows.
+        """
+        tables = [
+            ("Overview", ["Metric", "Value"], [
+                ["Systems compared", self.systems],
+                ["Systems patched", self.patched],
+                ["Errata installed", self.errata],
+                ["Systems with suggested reboot", self.reboots_suggested],
+                ["Systems rebooted", self.rebooted],
+                ["Verification failures", len(self.failures)],
+            ]),
+            ("Errata by type", ["Type", "Errata"],
+             sorted([list(x) for x in self.by_type.items()])),
+            ("Errata by severity", ["Severity", "Errata"],
+             sorted([list(x) for x in self.by_severity.items()])),
+        ]
+        for group in GROUP_PARAMS:
+            tables.append((
+                "Systems by {}".format(group),
+                [group.capitalize(), "Systems", "Patched", "Errata"],
+                [[name, x["systems"], x["patched"], x["errata"]] for
+                 name, x in sorted(self.groups[group].items())]
+            ))
+        tables.append((
+            "Verification failures", ["Host", "Monitoring status", "Details"],
+            sorted([list(x) for x in self.failures])
+        ))
+        return tables
+
+
+
+def write_markdown(summary, report_file, title):
+    """
+    Writes a summary as Markdown document.
+
+    :param summary: fleet summary
+    :type summary: FleetSummary
+    :param report_file: file-like object to write to
+    :type report_file: file
+    :param title: document title
+    :type title: str
+    """
+    report_file.write("# {}\n".format(title))
+    for caption, header, rows in summary.get_tables():
+        report_file.write("\n## {}\n\n".format(caption))
+        report_file.write("{}\n".format(" | ".join(header)))
+        report_file.write("{}\n".format(
+            " | ".join("-" * len(x) for x in header)
+        ))
+        for row in rows:
+            report_file.write("{}\n".format(
+                " | ".join("{}".format(x).replace("|", "\\|") for x in row)
+            ))
+
+
+
+def write_html(summary, report_file, title):
+    """
+    Writes a summary as HTML document.
+
+    :param summary: fleet summary
+    :type summary: FleetSummary
+    :param report_file: file-like object to write to
+    :type report_file: file
+    :param title: document title
+    :type title: str
+    """
+    report_file.write(
+        "<!DOCTYPE html>\n<html>\n<head>\n<title>{0}</title>\n</head>\n"
+        "<body>\n<h1>{0}</h1>\n".format(html.escape(title))
+    )
+    for caption, header, rows in summary.get_tables():
+        report_file.write("\n<h2>{}</h2>\n<table>\n<tr>\n".format(
+            html.escape(caption)
+        ))
+        for column in header:
+            report_file.write("<th>{}</th>\n".format(html.escape(column)))
+        report_file.write("</tr>\n")
+        for row in rows:
+            report_file.write("<tr>\n")
+            for value in row:
+                report_file.write("<td>{}</td>\n".format(
+                    html.escape("{}".format(value))
+                ))
+            report_file.write("</tr>\n")
+        report_file.write("</table>\n")
+    report_file.write("</body>\n</html>\n")
+
+
+
+def write_csv(summary, report_file, title):
+    """
+    Writes a summary as CSV document. Every table row is written as one
+    line per value (``table,name,column,value``).
+
+    :param summary: fleet summary
+    :type summary: FleetSummary
+    :param report_file: file-like object to write to
+    :type report_file: file
+    :param title: document title (unused)
+    :type title: str
+    """
+    writer = csv.writer(report_file)
+    writer.writerow(["table", "name", "column", "value"])
+    for caption, header, rows in summary.get_tables():
+        for row in rows:
+            for column, value in zip(header[1:], row[1:]):
+                writer.writerow([caption, row[0], column, value])
+
+
+
+SUMMARY_WRITERS = {
+    "html": write_html,
+    "md": write_markdown,
+    "csv": write_csv,
+}
+"""
+dict: Summary writers by format
+"""
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Trend analytics over multiple snapshot reports.
+
+Snapshots are loaded into compact columns (one ``array`` per snapshot and
+errata type, indexed by interned host IDs) so that aggregations only walk
+flat integer arrays instead of nested report dictionaries.
+"""
+
+from array import array
+import datetime
+from operator import itemgetter
+import os
+import re
+
+ERRATA_TYPES = ("security", "bugfix", "enhancement")
+"""
+tuple: Errata types tracked per host and snapshot
+"""
+MISSING = -1
+"""
+int: Column value of hosts that are not part of a snapshot
+"""
+SNAPSHOT_DATE_PATTERN = re.compile(r"(\d{8}-\d{4})")
+"""
+re: Pattern matching the timestamp within snapshot report filenames
+"""
+
+
+def get_snapshot_date(filename):
+    """
+    Returns the creation date of a snapshot report. The timestamp within
+    the filename (``errata-snapshot-report-<server>-<YYYYmmdd-HHMM>``) is
+    preferred, the modification time is used as fallback.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    match = SNAPSHOT_DATE_PATTERN.search(os.path.basename(filename))
+    if match:
+        try:
+            return datetime.datetime.strptime(match.group(1), "%Y%m%d-%H%M")
+        except ValueError:
+            pass
+    return datetime.datetime.fromtimestamp(os.path.getmtime(filename))
+
+
+
+def get_percentile(values, percentile):
+    """
+    Returns a percentile of sorted values (nearest rank).
+
+    :param values: sorted values
+    :type values: list
+    :param percentile: percentile (0-100)
+    :type percentile: int
+    """
+    if not values:
+        return 0
+    rank = int(round(percentile / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+
+def _intern(index, values, name):
+    """
+    Returns the ID of a name, registering it if necessary.
+
+    :param index: IDs by name
+    :type index: dict
+    :param values: names by ID
+    :type values: list
+    :param name: name
+    :type name: str
+    """
+    try:
+        return index[name]
+    except KeyError:
+        index[name] = len(values)
+        values.append(name)
+        return index[name]
+
+
+
+class TrendData(object):
+    """
+.. class:: TrendData
+    Outstanding errata counts of many hosts over many snapshots.
+
+    Snapshots need to be added in chronological order. Patch latencies are
+    measured from the first snapshot listing an erratum for a host until
+    the first snapshot without it. Errata that are already outstanding in
+    the first snapshot are counted from that snapshot on.
+    """
+
+    def __init__(self, errata_type="security"):
+        """
+        Constructor, creating an empty data set.
+
+        :param errata_type: errata type of the outstanding errata curve
+        :type errata_type: str
+        """
+        self.errata_type = errata_type
+        self.dates = []
+        self.hosts = []
+        self.environments = []
+        self._host_index = {}
+        self._environment_index = {}
+        self._errata = []
+        self._errata_index = {}
+        #errata type (index of ERRATA_TYPES or MISSING) by erratum ID
+        self._errata_types = array('b')
+        #per snapshot: errata type -> counts by host ID
+        self.counts = []
+        #per snapshot: environment IDs by host ID
+        self.host_environments = []
+        #patch latencies in days by errata type
+        self.latencies = dict((x, array('d')) for x in ERRATA_TYPES)
+        #days since the first snapshot by snapshot
+        self._days = array('d')
+        #host ID -> erratum IDs of the latest snapshot containing the host
+        self._previous = {}
+        #host ID -> {erratum ID: snapshot of first occurrence}
+        self._first_seen = {}
+        #errata set -> counts by errata type
+        self._type_counts = {}
+
+    def add_snapshot(self, date, report):
+        """
+        Adds the hosts of a snapshot report. Decoded hosts are released from
+        the report once added.
+
+        :param date: snapshot creation date
+        :type date: datetime.datetime
+        :param report: snapshot report
+        :type report: ReportStore
+        """
+        if self.dates and date < self.dates[-1]:
+            raise ValueError("Snapshots need to be added chronologically")
+        snapshot = len(self.dates)
+        self.dates.append(date)
+        self._days.append(
+            (date - self.dates[0]).total_seconds() / 86400.0
+        )
+        columns = [array('l', [MISSING]) * len(self.hosts)
+                   for _ in ERRATA_TYPES]
+        environments = array('l', [MISSING]) * len(self.hosts)
+        errata_index = self._errata_index
+
+        for host in report:
+            entry = report[host]
+            host_id = _intern(self._host_index, self.hosts, host)
+            if host_id == len(environments):
+                environments.append(MISSING)
+                for column in columns:
+                    column.append(MISSING)
+            environments[host_id] = _intern(
+                self._environment_index, self.environments,
+                entry.get("params", {}).get("environment_name") or "unknown"
+            )
+
+            errata = entry.get("errata", [])
+            errata_ids = list(map(
+                errata_index.get, map(itemgetter("errata_id"), errata)
+            ))
+            if None in errata_ids:
+                errata_ids = [self.__intern_erratum(x) for x in errata]
+            current = frozenset(errata_ids)
+            for column, count in zip(columns, self.__count_types(current)):
+                column[host_id] = count
+            self.__track_latency(host_id, current, snapshot)
+            report.release(host)
+
+        self.counts.append(dict(zip(ERRATA_TYPES, columns)))
+        self.host_environments.append(environments)
+
+    def __intern_erratum(self, erratum):
+        """
+        Returns the ID of an erratum, registering it and its type if
+        necessary.
+        """
+        erratum_id = _intern(
+            self._errata_index, self._errata, erratum["errata_id"]
+        )
+        if erratum_id == len(self._errata_types):
+            try:
+                errata_type = ERRATA_TYPES.index(erratum.get("type"))
+            except ValueError:
+                errata_type = MISSING
+            self._errata_types.append(errata_type)
+        return erratum_id
+
+    def __count_types(self, errata):
+        """
+        Returns the number of errata per type of a set of erratum IDs.
+        Hosts often share identical errata sets, so counts are cached.
+        """
+        try:
+            return self._type_counts[errata]
+        except KeyError:
+            counts = [0] * len(ERRATA_TYPES)
+            for erratum_id in errata:
+                errata_type = self._errata_types[erratum_id]
+                if errata_type != MISSING:
+                    counts[errata_type] += 1
+            self._type_counts[errata] = counts
+            return counts
+
+    def __track_latency(self, host_id, current, snapshot):
+        """
+        Records the patch latency of errata that disappeared from a host
+        and remembers errata that appeared.
+        """
+        previous = self._previous.get(host_id, frozenset())
+        if previous == current:
+            return
+        first_seen = self._first_seen.setdefault(host_id, {})
+        for erratum_id in previous - current:
+            first = first_seen.pop(erratum_id)
+            errata_type = self._errata_types[erratum_id]
+            if errata_type != MISSING:
+                self.latencies[ERRATA_TYPES[errata_type]].append(
+                    self._days[snapshot] - self._days[first]
+                )
+        for erratum_id in current - previous:
+            first_seen[erratum_id] = snapshot
+        self._previous[host_id] = current
+
+    def get_outstanding(self, errata_type="security"):
+        """
+        Returns the outstanding errata curve of an errata type. For every
+        snapshot, the date, the number of hosts with outstanding errata and
+        the sum of outstanding errata is returned.
+
+        :param errata_type: errata type
+        :type errata_type: str
+        """
+        curve = []
+        for date, columns in zip(self.dates, self.counts):
+            column = columns[errata_type]
+            values = [x for x in column if x > 0]
+            curve.append((date, len(values), sum(values)))
+        return curve
+
+    def get_latency_stats(self):
+        """
+        Returns patch latency statistics (number of patched errata, mean,
+        median, 90th percentile and maximum latency in days) per errata
+        type.
+        """
+        stats = []
+        for errata_type in ERRATA_TYPES:
+            values = sorted(self.latencies[errata_type])
+            stats.append((
+                errata_type, len(values),
+                sum(values) / len(values) if values else 0,
+                get_percentile(values, 50), get_percentile(values, 90),
+                values[-1] if values else 0
+            ))
+        return stats
+
+    def get_environment_drift(self):
+        """
+        Returns the per-environment drift. For every environment and
+        snapshot, the mean of outstanding errata per host is compared with
+        the fleet mean. Returns the environment name and lists of means and
+        drifts per snapshot.
+        """
+        drift = []
+        totals = []
+        for snapshot, columns in enumerate(self.counts):
+            sums = [0] * len(self.environments)
+            hosts = [0] * len(self.environments)
+            for host_id, environment in enumerate(
+                    self.host_environments[snapshot]):
+                if environment == MISSING:
+                    continue
+                hosts[environment] += 1
+                sums[environment] += sum(
+                    columns[x][host_id] for x in ERRATA_TYPES
+                )
+            totals.append((sums, hosts))
+
+        for environment, name in enumerate(self.environments):
+            means = []
+            drifts = []
+            for sums, hosts in totals:
+                fleet = float(sum(sums)) / sum(hosts) if sum(hosts) else 0
+                if environment < len(hosts) and hosts[environment]:
+                    mean = float(sums[environment]) / hosts[environment]
+                    means.append(mean)
+                    drifts.append(mean - fleet)
+                else:
+                    means.append(None)
+                    drifts.append(None)
+            drift.append((name, means, drifts))
+        return drift
+
+    def get_tables(self):
+        """
+        Returns the trends as list of tables. Every table consists of a
+        title, the column headers and the rows.
+        """
+        def _format(value):
+            return "" if value is None else "{:.1f}".format(value)
+
+        dates = [x.strftime("%Y-%m-%d %H:%M") for x in self.dates]
+        tables = [
+            ("Outstanding {} errata".format(self.errata_type),
+             ["Snapshot", "Systems affected", "Errata outstanding"],
+             [[date, hosts, errata] for date, (_, hosts, errata) in
+              zip(dates, self.get_outstanding(self.errata_type))]),
+            ("Patch latency (days)",
+             ["Type", "Errata patched", "Mean", "Median", "90th percentile",
+              "Maximum"],
+             [[x[0], x[1]] + [_format(y) for y in x[2:]] for
+              x in self.get_latency_stats()]),
+        ]
+        rows = []
+        for name, means, drifts in self.get_environment_drift():
+            for date, mean, drift in zip(dates, means, drifts):
+                if mean is not None:
+                    rows.append([name, date, _format(mean), _format(drift)])
+        tables.append((
+            "Environment drift",
+            ["Environment", "Snapshot", "Errata per system",
+             "Drift from fleet"], rows
+        ))
+        return tables
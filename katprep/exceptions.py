@@ -70,3 +70,11 @@ class UnauthenticatedError(RuntimeError):
     """
     Exception for showing that a client wasn't able to authenticate itself.
     """
+
+
+class TemplateException(Exception):
+    """
+    Dummy class for invalid report templates
+
+    .. class:: TemplateException
+    """
@@ -9,16 +9,21 @@ managed with Foreman/Katello or Red Hat Satellite 6.
 from __future__ import absolute_import, print_function
 
 import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import itertools
 import logging
 import json
+import threading
 import time
 import os
 import getpass
 import datetime
 import yaml
 from . import (
-    __version__, is_valid_report, get_json, get_credentials,
-    get_required_hosts_by_report, get_host_params_by_report)
+    __version__, is_valid_report, get_credentials,
+    get_required_hosts_by_report, get_host_params_by_report,
+    get_id_by_report)
 from .exceptions import (EmptySetException,
 InvalidCredentialsException, SessionException, SnapshotExistsException,
 UnsupportedRequestException)
@@ -28,6 +33,10 @@ from .management.vmware import PyvmomiClient
 from .monitoring.nagios import NagiosCGIClient
 from .monitoring.icinga2 import Icinga2APIClient
 from .network import validate_hostname
+from .storage.journal import VerificationJournal, merge_journal
+from .tasks import Backoff, is_finished
+from .waves import (MISSING_POLLS, WaveScheduler, get_bulk_groups,
+get_group_param, get_waves)
 
 """
 ForemanAPIClient: Foreman API client handle
@@ -60,6 +69,26 @@ REPORT_PREFIX = ""
 """
 str: Date prefix for snapshots and downtimes
 """
+JOURNAL = None
+"""
+VerificationJournal: Journal of verification values
+"""
+BULK_TASKS = {}
+"""
+dict: Sub-tasks of bulk tasks by hostname (None until retrieved)
+"""
+VIRT_SEMAPHORES = {}
+"""
+dict: Semaphores limiting concurrent requests per virtualization host
+"""
+MON_SEMAPHORES = {}
+"""
+dict: Semaphores limiting concurrent requests per monitoring host
+"""
+SEMAPHORE_LOCK = threading.Lock()
+"""
+threading.Lock: Lock for creating semaphores
+"""
 
 
 
@@ -91,6 +120,76 @@ def get_host_param_from_report(report, host, param):
 
 
 
+def get_semaphore(semaphores, backend, limit):
+    """
+    This function returns the semaphore limiting concurrent requests to a
+    particular virtualization or monitoring host. Semaphores are created on
+    first use.
+
+    :param semaphores: semaphores by backend (VIRT_SEMAPHORES, MON_SEMAPHORES)
+    :type semaphores: dict
+    :param backend: virtualization or monitoring host
+    :type backend: str
+    :param limit: maximum number of concurrent requests
+    :type limit: int
+    """
+    with SEMAPHORE_LOCK:
+        if backend not in semaphores:
+            semaphores[backend] = threading.BoundedSemaphore(limit)
+        return semaphores[backend]
+
+
+
+def get_interleaved_hosts(report):
+    """
+    This function returns the hosts of a report ordered round-robin by
+    virtualization host, so that concurrent workers don't queue up for a
+    single backend.
+
+    :param report: snapshot report data
+    :type report: ReportStore
+    """
+    backends = OrderedDict()
+    for host in report:
+        backends.setdefault(
+            get_host_param_from_report(report, host, "katprep_virt"), []
+        ).append(host)
+    return [
+        host for hosts in itertools.zip_longest(*backends.values())
+        for host in hosts if host is not None
+    ]
+
+
+
+def manage_hosts_preparation(options, cleanup=False):
+    """
+    This function prepares or cleans up maintenance tasks for all hosts.
+    Hosts are handled concurrently, the number of concurrent requests per
+    virtualization and monitoring host is limited (see
+    manage_host_preparation).
+
+    :param cleanup: Flag whether preparations should be undone (default: no)
+    :type cleanup: bool
+    """
+    #decode hosts before starting workers
+    hosts = get_interleaved_hosts(REPORT)
+    with ThreadPoolExecutor(max_workers=options.jobs) as executor:
+        futures = dict(
+            (executor.submit(manage_host_preparation, options, host, cleanup),
+             host) for host in hosts
+        )
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except (KeyError, ValueError) as err:
+                LOGGER.error(
+                    "Error %s host '%s': '%s'",
+                    "cleaning-up" if cleanup else "preparing",
+                    futures[future], err
+                )
+
+
+
 def manage_host_preparation(options, host, cleanup=False):
     """
     This function prepares or cleans up maintenance tasks for a particular
@@ -117,6 +216,7 @@ def manage_host_preparation(options, host, cleanup=False):
         else:
             vm_name = host
 
+        virt_host = get_host_param_from_report(REPORT, host, "katprep_virt")
         if options.generic_dry_run:
             if cleanup:
                 LOGGER.info(
@@ -133,17 +233,19 @@ def manage_host_preparation(options, host, cleanup=False):
                     pass
         else:
             try:
-                if cleanup:
-                    #remove snapshot
-                    VIRT_CLIENTS[get_host_param_from_report(REPORT, host, "katprep_virt")].remove_snapshot(
-                        vm_name, "katprep_{}".format(REPORT_PREFIX)
-                    )
-                else:
-                    #create snapshot
-                    VIRT_CLIENTS[get_host_param_from_report(REPORT, host, "katprep_virt")].create_snapshot(
-                        vm_name, "katprep_{}".format(REPORT_PREFIX),
-                        "Snapshot created automatically by katprep"
-                    )
+                with get_semaphore(
+                        VIRT_SEMAPHORES, virt_host, options.virt_concurrency):
+                    if cleanup:
+                        #remove snapshot
+                        VIRT_CLIENTS[virt_host].remove_snapshot(
+                            vm_name, "katprep_{}".format(REPORT_PREFIX)
+                        )
+                    else:
+                        #create snapshot
+                        VIRT_CLIENTS[virt_host].create_snapshot(
+                            vm_name, "katprep_{}".format(REPORT_PREFIX),
+                            "Snapshot created automatically by katprep"
+                        )
             except InvalidCredentialsException as err:
                 LOGGER.error("Invalid crendentials supplied")
             except SnapshotExistsException as err:
@@ -181,6 +283,7 @@ def manage_host_preparation(options, host, cleanup=False):
         else:
             mon_name = host
 
+        mon_host = get_host_param_from_report(REPORT, host, "katprep_mon")
         if options.generic_dry_run:
             if cleanup:
                 LOGGER.info("Host '%s' --> remove downtime", host)
@@ -188,14 +291,16 @@ def manage_host_preparation(options, host, cleanup=False):
                 LOGGER.info("Host '%s' --> schedule downtime", host)
         else:
             try:
-                if cleanup:
-                    #remove downtime
-                    MON_CLIENTS[get_host_param_from_report(REPORT, host, "katprep_mon")].remove_downtime(mon_name, "host")
-                else:
-                    #schedule downtime
-                    MON_CLIENTS[get_host_param_from_report(REPORT, host, "katprep_mon")].schedule_downtime(
-                        mon_name, "host", hours=options.mon_downtime
-                    )
+                with get_semaphore(
+                        MON_SEMAPHORES, mon_host, options.mon_concurrency):
+                    if cleanup:
+                        #remove downtime
+                        MON_CLIENTS[mon_host].remove_downtime(mon_name, "host")
+                    else:
+                        #schedule downtime
+                        MON_CLIENTS[mon_host].schedule_downtime(
+                            mon_name, "host", hours=options.mon_downtime
+                        )
             except InvalidCredentialsException as err:
                 LOGGER.error("Unable to maintain downtime: '%s'", err)
             except UnsupportedRequestException as err:
@@ -206,9 +311,9 @@ def manage_host_preparation(options, host, cleanup=False):
 
 def set_verification_value(options, host, setting, value):
     """
-    This function stores verification data in a snapshot report. This is done
-    by altering the host information dictionary and storing the changes in the
-    JSON catalog.
+    This function stores verification data in a snapshot report. Values are
+    appended to the report's verification journal, which is merged into the
+    report once the maintenance command has finished.
 
     :param host: hostname
     :type host: str
@@ -217,16 +322,11 @@ def set_verification_value(options, host, setting, value):
     :param value: setting value
     :type value: str
     """
-    global REPORT
-
     try:
-        #set value
-        REPORT[host]["verification"][setting] = value
-
-        #store file
-        with open(options.report[0], 'w') as target:
-            target.write(json.dumps(REPORT))
-    except IOError as err:
+        #append value to journal
+        JOURNAL.record(host, setting, value)
+        REPORT.overlay_verification(host, setting, value)
+    except (IOError, OSError) as err:
         LOGGER.error("Unable to store report: '%s'", err)
     except ValueError as err:
         LOGGER.error(
@@ -245,85 +345,366 @@ def prepare(options, args):
     """
     #create snapshot/downtime per host
     try:
-        for host in REPORT:
-            LOGGER.debug("Preparing host '%s'...", host)
+        manage_hosts_preparation(options)
 
-            #prepare host
-            manage_host_preparation(options, host)
-
-            #verify preparation
-            #if not options.generic_dry_run:
-                #verify(options, args)
+        #verify preparation
+        #if not options.generic_dry_run:
+            #verify(options, args)
 
     except ValueError as err:
         LOGGER.error("Error preparing maintenance: '%s'", err)
 
 
 
-def execute(options, args):
+def get_task_ids(result):
     """
-    This function executes maintenance tasks, which might include applying
-    errata.
+    This function returns the ID of the Foreman task started by an API
+    request.
 
-    :param args: argparse options dictionary containing parameters
-    :type args: argparse options dict
+    :param result: API response body
+    :type result: str
     """
     try:
-        for host in REPORT:
-            LOGGER.debug("Patching host '%s'...", host)
+        return [json.loads(result)["id"]]
+    except (KeyError, TypeError, ValueError):
+        LOGGER.debug("No task found in response '%s'", result)
+        return []
 
-            #installing errata
-            errata_target = [x["errata_id"] for x in REPORT[host]["errata"]]
-            errata_target = [x.encode('utf-8') for x in errata_target]
-            if len(errata_target) > 0:
-                #errata found
-                if options.generic_dry_run:
-                    LOGGER.info(
-                        "Host '%s' --> install: %s", host, ", ".join(errata_target)
-                    )
-                else:
-                    SAT_CLIENT.api_put(
-                        "/hosts/{}/errata/apply".format(
-                            SAT_CLIENT.get_id_by_name(host, "host")
-                        ),
-                        json.dumps({"errata_ids": errata_target})
-                    )
+
+
+def put_host_request(host, sub_url, payload):
+    """
+    This function sends a PUT request to a host-specific API URL, the host
+    ID replaces the placeholder within the URL. If the request fails (e.g.
+    as the host was re-registered and has a new ID), the cached and
+    reported IDs are discarded and the request is repeated once using an
+    ID looked up by name.
+
+    :param host: hostname
+    :type host: str
+    :param sub_url: relative path containing a placeholder for the host ID
+    :type sub_url: str
+    :param payload: payload
+    :type payload: str
+    """
+    host_id = get_id_by_report(REPORT, host, "host", SAT_CLIENT)
+    try:
+        return SAT_CLIENT.api_put(sub_url.format(host_id), payload)
+    except SessionException as err:
+        SAT_CLIENT.invalidate_id_cache("host", host)
+        current_id = SAT_CLIENT.get_id_by_name(host, "host")
+        if current_id == host_id:
+            raise
+        LOGGER.warning(
+            "Host '%s' has a new ID (#%s instead of #%s), retrying: '%s'",
+            host, current_id, host_id, err
+        )
+        return SAT_CLIENT.api_put(sub_url.format(current_id), payload)
+
+
+
+def submit_host_maintenance(options, host, install_errata=True):
+    """
+    This function starts installing errata and package upgrades for a
+    particular host. The IDs of the started Foreman tasks are returned,
+    None is returned if starting maintenance failed.
+
+    :param host: hostname
+    :type host: str
+    :param install_errata: Flag whether errata should be installed (default: yes)
+    :type install_errata: bool
+    """
+    LOGGER.debug("Patching host '%s'...", host)
+    task_ids = []
+    try:
+        #installing errata
+        errata_target = [x["errata_id"] for x in REPORT[host]["errata"]]
+        if not install_errata:
+            pass
+        elif len(errata_target) > 0:
+            #errata found
+            if options.generic_dry_run:
+                LOGGER.info(
+                    "Host '%s' --> install: %s", host, ", ".join(errata_target)
+                )
             else:
-                LOGGER.info("No errata for host %s available", host)
+                task_ids.extend(get_task_ids(put_host_request(
+                    host, "/hosts/{}/errata/apply",
+                    json.dumps({"errata_ids": errata_target})
+                )))
+        else:
+            LOGGER.info("No errata for host %s available", host)
+
+        #install package upgrades
+        if options.upgrade_packages:
+            if options.generic_dry_run:
+                LOGGER.info(
+                    "Host '%s' --> install package upgrades", host
+                )
+            else:
+                task_ids.extend(get_task_ids(put_host_request(
+                    host, "/hosts/{}/packages/upgrade_all",
+                    json.dumps({})
+                )))
+    except (SessionException, ValueError) as err:
+        LOGGER.error("Error maintaining host '%s': '%s'", host, err)
+        return None
+    return task_ids
 
-            #install package upgrades
-            if options.upgrade_packages:
-                if options.generic_dry_run:
-                    LOGGER.info(
-                        "Host '%s' --> install package upgrades", host
-                    )
-                else:
-                    SAT_CLIENT.api_put(
-                        "/hosts/{}/packages/upgrade_all".format(
-                            SAT_CLIENT.get_id_by_name(host, "host")
-                        ),
-                        json.dumps({})
-                    )
 
-            #get errata reboot flags
+
+def get_bulk_selection(hosts):
+    """
+    This function returns the selection of hosts for Katello bulk actions.
+    Hosts are selected by their IDs if stored in the report, otherwise by
+    a search query.
+
+    :param hosts: hostnames
+    :type hosts: list
+    """
+    host_ids = [
+        get_host_params_by_report(REPORT, x).get("host_id") for x in hosts
+    ]
+    if None not in host_ids and "" not in host_ids:
+        return {"ids": host_ids}
+    return {"search": "name ^ ({})".format(", ".join(hosts))}
+
+
+
+def submit_bulk_maintenance(options, organization, errata, hosts):
+    """
+    This function starts installing errata on multiple hosts sharing the
+    same errata using a single Katello bulk action. The IDs of the started
+    Foreman tasks are returned.
+
+    :param organization: organization name
+    :type organization: str
+    :param errata: erratum IDs
+    :type errata: list
+    :param hosts: hostnames
+    :type hosts: list
+    """
+    if options.generic_dry_run:
+        LOGGER.info(
+            "Hosts '%s' --> bulk install: %s", ", ".join(hosts),
+            ", ".join(errata)
+        )
+        return []
+    LOGGER.debug(
+        "Installing %s errata on %s hosts of organization '%s'...",
+        len(errata), len(hosts), organization
+    )
+    return get_task_ids(SAT_CLIENT.api_put(
+        "/../../katello/api/hosts/bulk/install_content",
+        json.dumps({
+            "organization_id": get_id_by_report(
+                REPORT, hosts[0], "organization", SAT_CLIENT
+            ),
+            "included": get_bulk_selection(hosts),
+            "content_type": "errata",
+            "content": errata
+        })
+    ))
+
+
+
+def submit_maintenance(options, hosts):
+    """
+    This function starts maintenance tasks for multiple hosts. Hosts
+    sharing an organization and identical errata are maintained using bulk
+    actions (unless disabled), other hosts one by one. The IDs of the
+    started Foreman tasks are returned by host and stored as verification
+    value (foreman_tasks). None is returned for hosts whose maintenance
+    couldn't be started.
+
+    :param hosts: hostnames
+    :type hosts: list
+    """
+    task_ids = OrderedDict((host, []) for host in hosts)
+    bulk_hosts = set()
+    if options.bulk_install:
+        for (organization, errata, group) in get_bulk_groups(
+                REPORT, hosts, options.bulk_size):
+            if len(group) < 2:
+                continue
             try:
-                errata_reboot = [x["reboot_suggested"] for x in REPORT[host]["errata"]]
-            except KeyError:
-                #no reboot suggested
-                errata_reboot = []
-                pass
+                bulk_task_ids = submit_bulk_maintenance(
+                    options, organization, errata, group
+                )
+            except (SessionException, ValueError) as err:
+                LOGGER.warning(
+                    "Bulk installation failed, installing errata host by " \
+                    "host: '%s'", err
+                )
+                continue
+            for task_id in bulk_task_ids:
+                BULK_TASKS[task_id] = None
+            for host in group:
+                task_ids[host].extend(bulk_task_ids)
+                bulk_hosts.add(host)
+
+    for host in hosts:
+        host_task_ids = submit_host_maintenance(
+            options, host, host not in bulk_hosts
+        )
+        if host_task_ids is not None:
+            task_ids[host].extend(host_task_ids)
+        if task_ids[host]:
+            #remember tasks for status
+            set_verification_value(
+                options, host, "foreman_tasks", task_ids[host]
+            )
+        if host_task_ids is None:
+            #failed hosts must not be rebooted
+            task_ids[host] = None
+    return task_ids
 
-            if options.foreman_reboot or \
-                (True in errata_reboot and not options.foreman_no_reboot):
-                if options.generic_dry_run:
-                    LOGGER.info("Host '%s' --> reboot host", host)
-                else:
-                    SAT_CLIENT.api_put(
-                        "/hosts/{}/power".format(
-                            SAT_CLIENT.get_id_by_name(host, "host")
-                        ),
-                        json.dumps({"power_action": "soft"})
+
+
+def poll_tasks(task_ids):
+    """
+    This function retrieves Foreman tasks by their IDs in bulk. If the tasks
+    couldn't be retrieved, no tasks are returned, so they're polled again.
+
+    :param task_ids: Foreman task IDs
+    :type task_ids: list
+    """
+    try:
+        return SAT_CLIENT.get_tasks(task_ids)
+    except (SessionException, ValueError) as err:
+        LOGGER.warning("Unable to get tasks: '%s'", err)
+        return {}
+
+
+
+def get_host_tasks(host, tasks):
+    """
+    This function replaces finished bulk tasks by the sub-tasks of a
+    particular host, so that a failure on one host doesn't fail all hosts
+    of the bulk action. Bulk tasks whose sub-tasks can't be retrieved are
+    kept.
+
+    :param host: hostname
+    :type host: str
+    :param tasks: finished Foreman tasks
+    :type tasks: list
+    """
+    host_tasks = []
+    for task in tasks:
+        task_id = task.get("id")
+        if task_id in BULK_TASKS and is_finished(task):
+            if BULK_TASKS[task_id] is None:
+                try:
+                    BULK_TASKS[task_id] = SAT_CLIENT.get_sub_tasks(task_id)
+                except (SessionException, ValueError) as err:
+                    LOGGER.error(
+                        "Unable to get sub-tasks of task %s: '%s'",
+                        task_id, err
                     )
+                    BULK_TASKS[task_id] = {}
+            if BULK_TASKS[task_id].get(host):
+                host_tasks.extend(BULK_TASKS[task_id][host])
+                continue
+        host_tasks.append(task)
+    return host_tasks
+
+
+
+def finish_host_maintenance(options, host, tasks):
+    """
+    This function completes maintenance of a particular host once its
+    Foreman tasks have finished. This includes rebooting the host if
+    required. Hosts with failed tasks are not rebooted. Bulk tasks are
+    replaced by the sub-tasks of the host.
+
+    :param host: hostname
+    :type host: str
+    :param tasks: finished Foreman tasks
+    :type tasks: list
+    """
+    host_tasks = get_host_tasks(host, tasks)
+    if host_tasks != tasks:
+        #remember the tasks of this host for status
+        set_verification_value(
+            options, host, "foreman_tasks", [x["id"] for x in host_tasks]
+        )
+        tasks = host_tasks
+    failed = [x for x in tasks if x.get("result") != "success"]
+    if failed:
+        LOGGER.error(
+            "Maintenance of host '%s' FAILED (%s), not rebooting", host,
+            ", ".join(
+                "{} {}".format(x.get("label"), x.get("result")) for x in failed
+            )
+        )
+        return
+    elif tasks:
+        LOGGER.info("Maintenance tasks for host '%s' succeeded", host)
+
+    #get errata reboot flags
+    try:
+        errata_reboot = [x["reboot_suggested"] for x in REPORT[host]["errata"]]
+    except KeyError:
+        #no reboot suggested
+        errata_reboot = []
+        pass
+
+    if options.foreman_reboot or \
+        (True in errata_reboot and not options.foreman_no_reboot):
+        if options.generic_dry_run:
+            LOGGER.info("Host '%s' --> reboot host", host)
+        else:
+            try:
+                put_host_request(
+                    host, "/hosts/{}/power",
+                    json.dumps({"power_action": "soft"})
+                )
+            except (SessionException, ValueError) as err:
+                LOGGER.error("Unable to reboot host '%s': '%s'", host, err)
+
+
+
+def prepare_host_index():
+    """
+    This function builds the name-to-ID index of hosts at once if many
+    hosts of the report (e.g. created by previous versions) lack stored
+    IDs and walking all hosts is cheaper than looking them up one by one.
+    """
+    missing = len([
+        x for x in REPORT
+        if get_host_params_by_report(REPORT, x).get("host_id") in (None, "")
+    ])
+    try:
+        if SAT_CLIENT.prepare_id_index("host", missing):
+            LOGGER.debug("Indexed hosts as %s hosts lack stored IDs", missing)
+    except SessionException as err:
+        LOGGER.warning("Unable to index hosts: '%s'", err)
+
+
+
+def execute(options, args):
+    """
+    This function executes maintenance tasks, which might include applying
+    errata. Hosts are maintained in waves, the next wave starts once the
+    Foreman tasks of the previous wave have finished. Within a wave, hosts
+    with identical errata are maintained using bulk actions. Hosts are
+    rebooted once their tasks have finished.
+
+    :param args: argparse options dictionary containing parameters
+    :type args: argparse options dict
+    """
+    try:
+        prepare_host_index()
+        waves = get_waves(REPORT, options.wave_size, options.group_by)
+        scheduler = WaveScheduler(
+            lambda hosts: submit_maintenance(options, hosts),
+            poll_tasks,
+            lambda host, tasks: finish_host_maintenance(options, host, tasks),
+            max_in_flight=options.max_in_flight,
+            poll_interval=options.poll_interval,
+            timeout=options.wave_timeout * 60
+        )
+        scheduler.run(waves)
 
     except ValueError as err:
         LOGGER.error("Error maintaining host: '%s'", err)
@@ -470,68 +851,140 @@ def verify(options, args):
 
 
 
+def log_task_status(task, host, result):
+    """
+    This function logs the status of a Foreman task.
+
+    :param task: task name
+    :type task: str
+    :param host: hostname
+    :type host: str
+    :param result: task result
+    :type result: str
+    """
+    if result.lower() == "success":
+        LOGGER.info("%s task for host '%s' succeeded", task, host)
+    elif result.lower() == "error":
+        LOGGER.info("%s task for host '%s' FAILED!", task, host)
+    else:
+        LOGGER.info(
+            "%s task for host '%s' has state '%s'", task, host, result
+        )
+
+
+
+def get_filtered_task_status(host):
+    """
+    This function shows the Foreman/Katello maintenance task status of a
+    particular host by searching today's tasks. This is used for hosts
+    without recorded task IDs (e.g. maintained by previous versions).
+
+    :param host: hostname
+    :type host: str
+    """
+    LOGGER.debug("Getting '%s' task status...", host)
+
+    #check maintenance progress
+    tasks = {
+        "Erratum": "Actions::Katello::Host::Erratum::Install",
+        "Package": "Actions::Katello::Host::Update"
+    }
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+
+    try:
+        for task in tasks:
+            #print task
+            results = SAT_CLIENT.get_task_by_filter(
+                host, tasks[task], today
+            )
+            if results:
+                for result in results:
+                    #print result
+                    LOGGER.debug(
+                        "Found '%s' task %s from %s (state %s)", result["label"],
+                        result["id"], result["started_at"], result["result"]
+                    )
+                    log_task_status(task, host, result["result"])
+            else:
+                if task.lower() == "package":
+                    LOGGER.info("No %s task for '%s' found!", task.lower(), host)
+                else:
+                    LOGGER.error("No %s task for '%s' found!", task.lower(), host)
+    except TypeError:
+        pass
+
+
+
 def status(options, args):
     """
     This function shows current Foreman/Katello software maintenance task
-    status.
+    status. Tasks recorded by execute are retrieved in bulk, optionally
+    until all of them have finished or couldn't be retrieved repeatedly.
 
     :param args: argparse options dictionary containing parameters
     :type args: argparse options dict
     """
-    #verify snapshot/downtime per host
+    recorded = OrderedDict()
     try:
         for host in REPORT:
-            LOGGER.debug("Getting '%s' task status...", host)
-
-            #check maintenance progress
-            tasks = {
-                "Erratum": "Actions::Katello::Host::Erratum::Install",
-                "Package": "Actions::Katello::Host::Update"
-            }
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-
-            try:
-                for task in tasks:
-                    #print task
-                    results = SAT_CLIENT.get_task_by_filter(
-                        host, tasks[task], today
-                    )
-                    if results:
-                        for result in results:
-                            #print result
-                            LOGGER.debug(
-                                "Found '%s' task %s from %s (state %s)", result["label"],
-                                result["id"], result["started_at"], result["result"]
-                            )
-                            if result["result"].lower() == "success":
-                                LOGGER.info(
-                                    "%s task for host '%s' succeeded",
-                                    task, host
-                                )
-                            elif result["result"].lower() == "error":
-                                LOGGER.info(
-                                    "%s task for host '%s' FAILED!",
-                                    task, host
-                                )
-                            else:
-                                LOGGER.info(
-                                    "%s task for host '%s' has state '%s'",
-                                    task, host, result["result"]
-                                )
-                    else:
-                        if task.lower() == "package":
-                            LOGGER.info("No %s task for '%s' found!", task.lower(), host)
-                        else:
-                            LOGGER.error("No %s task for '%s' found!", task.lower(), host)
-            except TypeError:
-                pass
-
+            task_ids = REPORT[host].get("verification", {}).get(
+                "foreman_tasks"
+            )
+            if task_ids:
+                recorded[host] = task_ids
+            else:
+                get_filtered_task_status(host)
     except KeyError:
         #host with either no virt/mon
         pass
     except ValueError:
         LOGGER.error("Error getting '%s' task status...", host)
 
+    backoff = Backoff()
+    missing = {}
+    while recorded:
+        try:
+            tasks = SAT_CLIENT.get_tasks(
+                [x for y in recorded.values() for x in y]
+            )
+        except (SessionException, ValueError) as err:
+            LOGGER.error("Unable to get tasks: '%s'", err)
+            return
+        finished = []
+        for host in recorded:
+            if any(x not in tasks for x in recorded[host]):
+                #give up on tasks that can't be retrieved repeatedly
+                missing[host] = missing.get(host, 0) + 1
+                if missing[host] >= MISSING_POLLS:
+                    finished.append(host)
+            elif all(is_finished(tasks[x]) for x in recorded[host]):
+                finished.append(host)
+        for host in recorded:
+            if options.status_wait and host not in finished:
+                continue
+            for task_id in recorded[host]:
+                if task_id not in tasks:
+                    LOGGER.error(
+                        "Task %s for host '%s' not found!", task_id, host
+                    )
+                    continue
+                log_task_status(
+                    tasks[task_id].get("label", "Maintenance"), host,
+                    tasks[task_id].get("result", "")
+                )
+        if not options.status_wait:
+            break
+        for host in finished:
+            del recorded[host]
+        if recorded:
+            interval = backoff.next(bool(finished))
+            LOGGER.info(
+                "Tasks of %s hosts still running, checking again in %s " \
+                "seconds", len(recorded), interval
+            )
+            time.sleep(interval)
+
+
 
 def cleanup(options, args):
     """
@@ -543,11 +996,7 @@ def cleanup(options, args):
     """
     #remove snapshot/downtime per host
     try:
-        for host in REPORT:
-            LOGGER.debug("Cleaning-up host '%s'...", host)
-
-            #clean-up host
-            manage_host_preparation(options, host, True)
+        manage_hosts_preparation(options, True)
 
     except ValueError as err:
         LOGGER.error("Error cleaning-up maintenance: '%s'", err)
@@ -631,6 +1080,10 @@ def parse_options(args=None):
     #--insecure
     gen_opts.add_argument("--insecure", dest="ssl_verify", default=True, \
     action="store_false", help="Disables SSL verification (default: no)")
+    #-j / --jobs
+    gen_opts.add_argument("-j", "--jobs", action="store", default=10, \
+    type=int, dest="jobs", metavar="NUMBER", help="defines the number of " \
+    "hosts prepared or cleaned-up concurrently (default: 10)")
 
     #FOREMAN ARGUMENTS
     #-s / --foreman-server
@@ -646,6 +1099,10 @@ def parse_options(args=None):
     fman_opts.add_argument("-R", "--no-reboot", dest="foreman_no_reboot", \
     default=True, action="store_false", help="suppresses rebooting the " \
     "system under any circumstances (default: no)")
+    #--id-cache
+    fman_opts.add_argument("--id-cache", dest="foreman_id_cache", \
+    metavar="FILE", default=None, action="store", help="caches Foreman " \
+    "object IDs in a file to re-use them across runs (default: no)")
 
     #VIRTUALIZATION ARGUMENTS
     #--virt-uri
@@ -657,6 +1114,11 @@ def parse_options(args=None):
     virt_opts.add_argument("-k", "--skip-snapshot", dest="virt_skip_snapshot", \
     default=False, action="store_true", \
     help="skips creating snapshots (default: no)")
+    #--virt-concurrency
+    virt_opts.add_argument("--virt-concurrency", dest="virt_concurrency", \
+    metavar="NUMBER", action="store", type=int, default=1, \
+    help="maximum number of concurrent snapshot operations per " \
+    "virtualization host (default: 1)")
 
     #MONITORING ARGUMENTS
     #--mon-url
@@ -679,6 +1141,11 @@ def parse_options(args=None):
     mon_opts.add_argument("-t", "--mon-downtime", dest="mon_downtime", \
     metavar="HOURS", action="store", type=int, default=8, \
     help="downtime period (default: 8 hours)")
+    #--mon-concurrency
+    mon_opts.add_argument("--mon-concurrency", dest="mon_concurrency", \
+    metavar="NUMBER", action="store", type=int, default=1, \
+    help="maximum number of concurrent downtime operations per " \
+    "monitoring host (default: 1)")
 
     #FILTER ARGUMENTS
     #-l / --location
@@ -712,9 +1179,38 @@ def parse_options(args=None):
     cmd_execute.add_argument("-p", "--include-packages", action="store_true", \
     default=False, dest="upgrade_packages", help="installs available package" \
     " upgrades (default: no)")
+    cmd_execute.add_argument("--wave-size", action="store", default=0, \
+    type=int, dest="wave_size", metavar="NUMBER", help="maximum number of " \
+    "hosts per wave, waves start once all tasks of the previous wave have " \
+    "finished (default: 0, one wave per group)")
+    cmd_execute.add_argument("--max-in-flight", action="store", default=0, \
+    type=int, dest="max_in_flight", metavar="NUMBER", help="maximum number " \
+    "of hosts with running tasks (default: 0, whole wave)")
+    cmd_execute.add_argument("--group-by", action="store", default=None, \
+    type=get_group_param, dest="group_by", metavar="KEY", help="maintains " \
+    "groups of hosts one after another, waves never span multiple groups: " \
+    "hostgroup, location, environment, organization or param:NAME for a " \
+    "custom host parameter (default: no)")
+    cmd_execute.add_argument("--no-bulk", action="store_false", \
+    default=True, dest="bulk_install", help="installs errata host by host " \
+    "instead of using bulk actions for hosts sharing the same errata " \
+    "(default: no)")
+    cmd_execute.add_argument("--bulk-size", action="store", default=100, \
+    type=int, dest="bulk_size", metavar="NUMBER", help="maximum number of " \
+    "hosts per bulk action (default: 100)")
+    cmd_execute.add_argument("--poll-interval", action="store", default=30, \
+    type=int, dest="poll_interval", metavar="SECONDS", help="interval for " \
+    "checking the tasks of a wave (default: 30)")
+    cmd_execute.add_argument("--wave-timeout", action="store", default=120, \
+    type=int, dest="wave_timeout", metavar="MINUTES", help="maximum " \
+    "duration per wave, remaining waves are skipped when exceeded " \
+    "(default: 120, 0 = unlimited)")
     cmd_status = subparsers.add_parser("status", help="Display software " \
     "maintenance progress")
     cmd_status.set_defaults(func=status)
+    cmd_status.add_argument("-w", "--wait", action="store_true", \
+    default=False, dest="status_wait", help="waits until all tasks " \
+    "recorded by execute have finished (default: no)")
     cmd_revert = subparsers.add_parser("revert", help="Reverting changes")
     cmd_revert.set_defaults(func=revert)
     cmd_verify = subparsers.add_parser("verify", help="Verifying status")
@@ -728,6 +1224,15 @@ def parse_options(args=None):
     if options.config != "":
         options = load_configuration(options.config, options)
         options = parser.parse_args()
+    if min(options.jobs, options.virt_concurrency,
+           options.mon_concurrency) < 1:
+        parser.error("at least one concurrent job is required")
+    if min(getattr(options, "wave_size", 0),
+           getattr(options, "max_in_flight", 0),
+           getattr(options, "bulk_size", 0)) < 0:
+        parser.error(
+            "wave size, hosts in flight and bulk size must not be negative"
+        )
     #validate hostname
     options.foreman_server = validate_hostname(options.foreman_server)
     #set password
@@ -747,12 +1252,27 @@ def set_filter(options, report):
     :param options: argparse options dictionary containing parameters
     :type options: argparse options dict
     :param report: report data
-    :type report: JSON data
+    :type report: ReportStore
     """
     remove = []
     for host in report:
-        #removing filtered/blacklisted hosts
-        params = report[host]["params"]
+        #removing blacklisted hosts, no need to decode them
+        if is_blacklisted(host, options.filter_exclude):
+            LOGGER.debug("Removing '%s'", host)
+            remove.append(host)
+            continue
+        elif len(options.filter_include) > 0 and \
+            not is_blacklisted(host, options.filter_include):
+            LOGGER.debug("Removing '%s'", host)
+            remove.append(host)
+            continue
+        elif options.filter_organization == "" and \
+            options.filter_location == "" and \
+            options.filter_environment == "":
+            continue
+
+        #removing filtered hosts
+        params = report.get_summary(host)
         if options.filter_organization != "" and \
             params["organization_name"] != options.filter_organization:
             LOGGER.debug("Removing '%s'", host)
@@ -765,24 +1285,17 @@ def set_filter(options, report):
             params["environment_name"] != options.filter_environment:
             LOGGER.debug("Removing '%s'", host)
             remove.append(host)
-        elif is_blacklisted(host, options.filter_exclude):
-            LOGGER.debug("Removing '%s'", host)
-            remove.append(host)
-        elif len(options.filter_include) > 0 and \
-            not is_blacklisted(host, options.filter_include):
-            LOGGER.debug("Removing '%s'", host)
-            remove.append(host)
 
-    #remove entries
+    #hide entries
     for entry in remove:
-        del report[entry]
+        report.exclude(entry)
     return report
 
 
 
 def main(options, args):
     """Main function, starts the logic based on parameters."""
-    global REPORT, REPORT_PREFIX, SAT_CLIENT
+    global REPORT, REPORT_PREFIX, SAT_CLIENT, JOURNAL
     global VIRT_CLIENTS, MON_CLIENTS
 
     LOGGER.debug("Options: %s", options)
@@ -792,10 +1305,10 @@ def main(options, args):
         LOGGER.info("This is just a SIMULATION - no changes will be made.")
 
     #load report
-    REPORT = json.loads(get_json(options.report[0]))
+    REPORT = options.report[0]
     REPORT_PREFIX = time.strftime(
         "%Y%m%d", time.gmtime(
-            os.path.getmtime(options.report[0])
+            os.path.getmtime(REPORT.filename)
         )
     )
 
@@ -815,7 +1328,8 @@ def main(options, args):
     )
     SAT_CLIENT = ForemanAPIClient(
         LOG_LEVEL, options.foreman_server, fman_user,
-        fman_pass, options.ssl_verify
+        fman_pass, options.ssl_verify,
+        id_cache_file=options.foreman_id_cache
     )
 
     #get virtualization host credentials
@@ -827,7 +1341,9 @@ def main(options, args):
                 host, options.generic_auth_container, options.auth_password
             )
             #create client based on type
-            host_params = get_host_params_by_report(REPORT, host)
+            host_params = get_host_params_by_report(
+                REPORT, required_virt[host]
+            )
             if "katprep_virt_type" in host_params and \
                 host_params["katprep_virt_type"] == "pyvmomi":
                 #VIRT_CLIENTS[host] = PyvmomiClient(host, virt_user, virt_pass)
@@ -845,7 +1361,9 @@ def main(options, args):
                 "Monitoring {}".format(host),
                 host, options.generic_auth_container, options.auth_password
             )
-            host_params = get_host_params_by_report(REPORT, host)
+            host_params = get_host_params_by_report(
+                REPORT, required_mon[host]
+            )
             if "katprep_mon_type" in host_params and \
                 host_params["katprep_mon_type"] == "nagios":
                 #Yet another legacy installation
@@ -861,7 +1379,20 @@ def main(options, args):
                 )
 
     #start action
-    options.func(options, options.func)
+    JOURNAL = VerificationJournal(REPORT.filename)
+    try:
+        options.func(options, options.func)
+    finally:
+        JOURNAL.close()
+
+    #merge verification values into the report
+    try:
+        merge_journal(REPORT)
+    except (IOError, OSError) as err:
+        LOGGER.error("Unable to store report: '%s'", err)
+
+    #persist Foreman object IDs for subsequent runs
+    SAT_CLIENT.save_id_cache()
 
 
 def cli():
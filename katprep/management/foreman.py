@@ -5,6 +5,10 @@ This file contains the ForemanAPIClient class
 
 import logging
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -32,9 +36,30 @@ class ForemanAPIClient(BaseConnector):
     """
     dict: Default headers set for every HTTP request
     """
+    PAGE_SIZE = 250
+    """
+    int: Default number of hits per page when walking paginated collections
+    """
+    TASK_SEARCH_SIZE = 100
+    """
+    int: Maximum number of task IDs per bulk task search
+    """
+    ID_CACHE_TTL = 86400
+    """
+    int: Default lifetime of name-to-ID cache entries in seconds
+    """
+    ID_FIELDS = {
+        "hostgroup" : "title", "location": "name", "host" : "name",
+        "organization" : "title", "environment" : "name"
+    }
+    """
+    dict: Object types that can be looked up by name and their name field
+    """
 
     def __init__(self, log_level, hostname,
-                 username, password, verify=True, prefix=""):
+                 username, password, verify=True, prefix="",
+                 id_cache_file=None, id_cache_ttl=ID_CACHE_TTL,
+                 pool_size=10):
         """
         Constructor, creating the class. It requires specifying a
         hostname, username and password to access the API. After
@@ -52,6 +77,13 @@ class ForemanAPIClient(BaseConnector):
         :type verify: bool
         :param prefix: API prefix (e.g. /katello)
         :type prefix: str
+        :param id_cache_file: file for persisting name-to-ID lookups
+        :type id_cache_file: str
+        :param id_cache_ttl: lifetime of cached name-to-ID lookups in seconds
+        :type id_cache_ttl: int
+        :param pool_size: maximum number of pooled connections, should match
+            the number of threads sharing the client
+        :type pool_size: int
         """
         #set logging
         self.LOGGER.setLevel(log_level)
@@ -61,6 +93,14 @@ class ForemanAPIClient(BaseConnector):
         self.HOSTNAME = hostname
         self.VERIFY = verify
         self.URL = "https://{0}{1}/api/v2".format(self.HOSTNAME, prefix)
+        self._pool_size = pool_size
+        #set name-to-ID index
+        self._id_index = {}
+        self._id_index_complete = {}
+        self._id_cache_file = id_cache_file
+        self._id_cache_ttl = id_cache_ttl
+        if self._id_cache_file:
+            self.load_id_cache()
 
         # start session and check API version if Foreman API
         super().__init__(username, password)
@@ -75,6 +115,11 @@ class ForemanAPIClient(BaseConnector):
         """
         self._session = requests.Session()
         self._session.auth = (self._username, self._password)
+        #allow sharing the session between threads
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self._pool_size, pool_maxsize=self._pool_size
+        )
+        self._session.mount("https://", adapter)
 
 
     def get_hostname(self):
@@ -85,7 +130,6 @@ class ForemanAPIClient(BaseConnector):
 
 
 
-    #TODO: find a nicer way to displaying _all_ the hits...
     def __api_request(self, method, sub_url, payload="", hits=1337, page=1):
         """
         Sends a HTTP request to the Foreman API. This function requires
@@ -105,9 +149,8 @@ class ForemanAPIClient(BaseConnector):
         :param page: number of page/results to display (must be set sadly)
         :type page: int
 
-.. todo:: Find a nicer way to display all hits, we shouldn't use 1337 hits/page
-
 .. seealso:: api_get()
+.. seealso:: api_get_all()
 .. seealso:: api_post()
 .. seealso:: api_put()
 .. seealso:: api_delete()
@@ -123,7 +166,7 @@ class ForemanAPIClient(BaseConnector):
                 sub_url, str(payload)
             )
             #setting headers
-            my_headers = self.HEADERS
+            my_headers = dict(self.HEADERS)
             if method.lower() != "get":
                 #add special headers for non-GETs
                 my_headers["Content-Type"] = "application/json"
@@ -150,10 +193,15 @@ class ForemanAPIClient(BaseConnector):
                 )
             else:
                 #GET
+                if "?" in sub_url:
+                    #sub-URL already contains a query (e.g. search)
+                    separator = "&"
+                else:
+                    separator = "?"
                 result = self._session.get(
-                    "{}{}?per_page={}&page={}".format(
-                        self.URL, sub_url, hits, page),
-                    headers=self.HEADERS, verify=self.VERIFY
+                    "{}{}{}per_page={}&page={}".format(
+                        self.URL, sub_url, separator, hits, page),
+                    headers=my_headers, verify=self.VERIFY
                 )
             if "unable to authenticate" in result.text.lower():
                 raise InvalidCredentialsException("Unable to authenticate")
@@ -161,11 +209,8 @@ class ForemanAPIClient(BaseConnector):
                 raise SessionException("{}: HTTP operation not successful {}".format(
                     result.status_code, result.text))
             else:
-                #return result
-                if method.lower() == "get":
-                    return result.text
-                else:
-                    return True
+                #return result (e.g. tasks started by PUT requests)
+                return result.text
 
         except ValueError as err:
             self.LOGGER.error(err)
@@ -188,6 +233,69 @@ class ForemanAPIClient(BaseConnector):
         """
         return self.__api_request("get", sub_url, "", hits, page)
 
+    def api_get_all(self, sub_url, per_page=PAGE_SIZE):
+        """
+        Walks all pages of a Foreman API collection (such as /hosts) and
+        yields the parsed result pages one after another. The next page is
+        requested in the background while the caller processes the current
+        one. Pagination stops once the ``subtotal`` announced by Foreman
+        has been retrieved.
+
+        :param sub_url: relative path within the API tree (e.g. /hosts)
+        :type sub_url: str
+        :param per_page: numbers of hits/page
+        :type per_page: int
+
+.. seealso:: iter_results()
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            page = 1
+            retrieved = 0
+            pending = executor.submit(self.api_get, sub_url, per_page, page)
+            while pending:
+                result_obj = json.loads(pending.result())
+                pending = None
+                results = result_obj.get("results", [])
+                retrieved = retrieved + len(results)
+                try:
+                    subtotal = int(result_obj["subtotal"])
+                except (KeyError, TypeError, ValueError):
+                    #no pagination information, assume a single page
+                    subtotal = retrieved
+                if results and retrieved < subtotal:
+                    #prefetch next page
+                    page = page + 1
+                    self.LOGGER.debug(
+                        "Prefetching page %s of '%s' (%s/%s hits)",
+                        page, sub_url, retrieved, subtotal
+                    )
+                    pending = executor.submit(
+                        self.api_get, sub_url, per_page, page
+                    )
+                yield result_obj
+        except ValueError as err:
+            self.LOGGER.error(err)
+            raise SessionException(err)
+        finally:
+            executor.shutdown(wait=False)
+
+    def iter_results(self, sub_url, per_page=PAGE_SIZE):
+        """
+        Lazily iterates over all entries of a Foreman API collection (such
+        as /hosts) across all pages.
+
+        :param sub_url: relative path within the API tree (e.g. /hosts)
+        :type sub_url: str
+        :param per_page: numbers of hits/page
+        :type per_page: int
+
+.. seealso:: api_get_all()
+        """
+        for result_obj in self.api_get_all(sub_url, per_page):
+            for entry in result_obj.get("results", []):
+                yield entry
+
     def api_post(self, sub_url, payload):
         """
         Sends a POST request to the Foreman API. This function requires a
@@ -215,7 +323,8 @@ class ForemanAPIClient(BaseConnector):
     def api_put(self, sub_url, payload):
         """
         Sends a PUT request to the Foreman API. This function requires a
-        sub-URL (such as /hosts/3) and payload data.
+        sub-URL (such as /hosts/3) and payload data. The response body is
+        returned.
 
         :param sub_url: relative path within the API tree (e.g. /hosts)
         :type sub_url: str
@@ -299,49 +408,246 @@ class ForemanAPIClient(BaseConnector):
 
     def get_id_by_name(self, name, api_object):
         """
-        Returns a Foreman object's internal ID by its name.
+        Returns a Foreman object's internal ID by its name. Lookups are
+        answered from the name-to-ID index if possible. Otherwise, Foreman
+        is queried using a server-side search and the index is updated.
 
         :param name: Foreman object name
         :type name: str
         :param api_object: Foreman object type (e.g. host, environment)
         :type api_object: str
+
+.. seealso:: build_id_index()
         """
-        valid_objects = [
-            "hostgroup", "location", "organization", "environment",
-            "host"
-        ]
-        filter_object = {
-            "hostgroup" : "title", "location": "name", "host" : "name",
-            "organization" : "title", "environment" : "name"
-        }
         try:
-            if api_object.lower() not in valid_objects:
+            api_object = api_object.lower()
+            if api_object not in self.ID_FIELDS:
                 #invalid type
                 raise ValueError(
                     "Unable to lookup name by invalid field"
                     " type '{}'".format(api_object)
                 )
-            else:
-                #get ID by name
-                result_obj = json.loads(
-                    self.api_get("/{}s".format(api_object))
+            #check index
+            object_id = self.__get_cached_id(name, api_object)
+            if object_id is not None:
+                self.LOGGER.debug(
+                    "%s %s has cached ID #%s", api_object, name, object_id
                 )
-                #TODO: nicer way than looping? numpy? Direct URL?
-                for entry in result_obj["results"]:
-                    if entry[filter_object[api_object]].lower() == name.lower():
-                        self.LOGGER.debug(
-                            "%s %s seems to have ID #%s",
-                            api_object, name, entry["id"]
-                        )
-                        return entry["id"]
-                #not found
+                return object_id
+            if self.__is_index_complete(api_object):
+                #index knows all objects, no need to ask Foreman
                 raise SessionException("Object not found")
+
+            #get ID by name
+            search = '{}="{}"'.format(self.ID_FIELDS[api_object], name)
+            object_id = None
+            for entry in self.iter_results(
+                    "/{}s?search={}".format(api_object, quote(search))
+            ):
+                self.__add_cached_id(entry, api_object)
+                if str(entry.get(self.ID_FIELDS[api_object])).lower() == \
+                    name.lower():
+                    object_id = entry["id"]
+            if object_id is not None:
+                self.LOGGER.debug(
+                    "%s %s seems to have ID #%s", api_object, name, object_id
+                )
+                return object_id
+            #not found
+            raise SessionException("Object not found")
         except ValueError as err:
             self.LOGGER.error(err)
             raise SessionException(err)
 
 
 
+    def build_id_index(self, api_object):
+        """
+        Retrieves all objects of a particular type and adds them to the
+        name-to-ID index. This is cheaper than searching for every single
+        name if most objects of a type need to be looked up.
+
+        :param api_object: Foreman object type (e.g. host, environment)
+        :type api_object: str
+        """
+        api_object = api_object.lower()
+        if api_object not in self.ID_FIELDS:
+            raise SessionException(
+                "Unable to index invalid field type '{}'".format(api_object)
+            )
+        self.invalidate_id_cache(api_object)
+        for entry in self.iter_results("/{}s".format(api_object)):
+            self.__add_cached_id(entry, api_object)
+        self._id_index_complete[api_object] = time.time()
+        self.LOGGER.debug(
+            "Indexed %s %s objects",
+            len(self._id_index[api_object]), api_object
+        )
+
+    def prepare_id_index(self, api_object, lookups):
+        """
+        Builds the name-to-ID index of a particular object type if walking
+        the whole collection requires fewer requests than searching a
+        number of names one by one. Returns whether the index was built.
+
+        :param api_object: Foreman object type (e.g. host, environment)
+        :type api_object: str
+        :param lookups: number of names that are going to be looked up
+        :type lookups: int
+
+.. seealso:: build_id_index()
+        """
+        api_object = api_object.lower()
+        if lookups < 2 or self.__is_index_complete(api_object):
+            return False
+        try:
+            total = int(json.loads(
+                self.api_get("/{}s".format(api_object), hits=1)
+            )["subtotal"])
+        except (KeyError, TypeError, ValueError) as err:
+            self.LOGGER.debug("Unable to count %s objects: '%s'", api_object, err)
+            return False
+        if -(-total // self.PAGE_SIZE) >= lookups:
+            return False
+        self.build_id_index(api_object)
+        return True
+
+    def invalidate_id_cache(self, api_object=None, name=None):
+        """
+        Removes cached name-to-ID lookups for a particular object, a
+        particular object type or for all object types. As the index of the
+        object type can't be trusted anymore, it is no longer considered
+        complete.
+
+        :param api_object: Foreman object type (e.g. host, environment)
+        :type api_object: str
+        :param name: Foreman object name
+        :type name: str
+        """
+        if api_object and name:
+            self._id_index.get(api_object.lower(), {}).pop(name.lower(), None)
+            self._id_index_complete.pop(api_object.lower(), None)
+        elif api_object:
+            self._id_index.pop(api_object.lower(), None)
+            self._id_index_complete.pop(api_object.lower(), None)
+        else:
+            self._id_index = {}
+            self._id_index_complete = {}
+
+    def __is_expired(self, timestamp):
+        """
+        Returns whether a cache timestamp exceeds the configured lifetime.
+
+        :param timestamp: UNIX timestamp of the cache entry
+        :type timestamp: float
+        """
+        return time.time() - timestamp > self._id_cache_ttl
+
+    def __is_index_complete(self, api_object):
+        """
+        Returns whether all objects of a particular type are indexed.
+
+        :param api_object: Foreman object type (e.g. host, environment)
+        :type api_object: str
+        """
+        timestamp = self._id_index_complete.get(api_object)
+        return timestamp is not None and not self.__is_expired(timestamp)
+
+    def __get_cached_id(self, name, api_object):
+        """
+        Returns a cached object ID or None if the name is unknown or the
+        cache entry has expired.
+
+        :param name: Foreman object name
+        :type name: str
+        :param api_object: Foreman object type (e.g. host, environment)
+        :type api_object: str
+        """
+        try:
+            (object_id, timestamp) = self._id_index[api_object][name.lower()]
+        except KeyError:
+            return None
+        if self.__is_expired(timestamp):
+            del self._id_index[api_object][name.lower()]
+            return None
+        return object_id
+
+    def __add_cached_id(self, entry, api_object):
+        """
+        Adds a Foreman API result entry to the name-to-ID index.
+
+        :param entry: Foreman API result entry
+        :type entry: dict
+        :param api_object: Foreman object type (e.g. host, environment)
+        :type api_object: str
+        """
+        try:
+            name = entry[self.ID_FIELDS[api_object]].lower()
+            self._id_index.setdefault(api_object, {})[name] = \
+                (entry["id"], time.time())
+        except (KeyError, AttributeError):
+            self.LOGGER.debug("Unable to index %s entry: %s", api_object, entry)
+
+    def load_id_cache(self):
+        """
+        Loads previously persisted name-to-ID lookups for this Foreman
+        server from the cache file. Expired entries are dropped.
+        """
+        try:
+            with open(self._id_cache_file, "r") as cache_file:
+                cache = json.load(cache_file).get(self.HOSTNAME, {})
+        except (IOError, ValueError, AttributeError) as err:
+            self.LOGGER.debug("Unable to load ID cache: '%s'", err)
+            return
+        try:
+            for api_object, entries in cache.get("index", {}).items():
+                for name, entry in entries.items():
+                    try:
+                        (object_id, timestamp) = entry
+                        if not self.__is_expired(timestamp):
+                            self._id_index.setdefault(api_object, {})[name] = \
+                                (object_id, timestamp)
+                    except (TypeError, ValueError):
+                        self.LOGGER.debug(
+                            "Ignoring invalid ID cache entry '%s'", name
+                        )
+            for api_object, timestamp in cache.get("complete", {}).items():
+                try:
+                    if not self.__is_expired(timestamp):
+                        self._id_index_complete[api_object] = timestamp
+                except TypeError:
+                    self.LOGGER.debug(
+                        "Ignoring invalid ID cache index '%s'", api_object
+                    )
+        except AttributeError as err:
+            self.LOGGER.debug("Unable to load ID cache: '%s'", err)
+            self.invalidate_id_cache()
+
+    def save_id_cache(self):
+        """
+        Persists the name-to-ID index to the cache file so that it can be
+        re-used by subsequent runs. Entries of other Foreman servers are
+        kept.
+        """
+        if not self._id_cache_file:
+            return
+        try:
+            with open(self._id_cache_file, "r") as cache_file:
+                cache = json.load(cache_file)
+        except (IOError, ValueError):
+            cache = {}
+        cache[self.HOSTNAME] = {
+            "index": self._id_index, "complete": self._id_index_complete
+        }
+        try:
+            with open("{}.tmp".format(self._id_cache_file), "w") as target:
+                target.write(json.dumps(cache))
+            os.replace("{}.tmp".format(self._id_cache_file), self._id_cache_file)
+        except (IOError, OSError) as err:
+            self.LOGGER.error("Unable to store ID cache: '%s'", err)
+
+
+
     def get_hostparam_id_by_name(self, host, param_name):
         """
         Returns a Foreman host parameter's internal ID by its name.
@@ -390,6 +696,51 @@ class ForemanAPIClient(BaseConnector):
 
 
 
+    def get_tasks(self, task_ids):
+        """
+        Returns Foreman tasks by their IDs. Tasks are searched in bulk
+        (``id ^ (...)``), so only one request per chunk of IDs is sent.
+        Tasks that don't exist are omitted.
+
+        :param task_ids: Foreman task IDs
+        :type task_ids: list
+        """
+        tasks = {}
+        task_ids = list(task_ids)
+        for start in range(0, len(task_ids), self.TASK_SEARCH_SIZE):
+            search = "id ^ ({})".format(
+                ", ".join(task_ids[start:start+self.TASK_SEARCH_SIZE])
+            )
+            for task in self.iter_results(
+                    "/../../foreman_tasks/api/tasks?search={}".format(
+                        quote(search))):
+                tasks[task["id"]] = task
+        return tasks
+
+
+
+    def get_sub_tasks(self, task_id):
+        """
+        Returns the sub-tasks of a Foreman task (e.g. of a bulk action) by
+        the name of the host they're running on. Sub-tasks that don't
+        belong to a particular host are omitted.
+
+        :param task_id: Foreman task ID
+        :type task_id: str
+        """
+        tasks = {}
+        for task in self.iter_results(
+                "/../../foreman_tasks/api/tasks?search={}".format(
+                    quote("parent_task_id = {}".format(task_id)))):
+            try:
+                host = task["input"]["host"]["name"]
+            except (KeyError, TypeError):
+                continue
+            tasks.setdefault(host, []).append(task)
+        return tasks
+
+
+
     def get_task_by_filter(self, host, task_name, task_date):
         """
         Returns host management tasks by filter
@@ -157,12 +157,9 @@ def manage_params(options):
     #get all the hosts depending on the filter
     filter_url = get_filter(options, "host")
     LOGGER.debug("Filter URL will be '%s'", filter_url)
-    result_obj = json.loads(
-        SAT_CLIENT.api_get("{}".format(filter_url))
-    )
 
-    #manage _all_ the hosts
-    for entry in result_obj["results"]:
+    #manage _all_ the hosts, walking all result pages
+    for entry in SAT_CLIENT.iter_results(filter_url):
         LOGGER.debug(
             "Found host '%s' (#%s),", entry["name"], entry["id"]
         )
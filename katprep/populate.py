@@ -53,8 +53,8 @@ def populate(options):
     LOGGER.info("Gathering host inventory information. " \
         "This *WILL* take some time - please be patient.")
     try:
-        #retrieve host information
-        hosts = json.loads(SAT_CLIENT.api_get("/hosts"))
+        #retrieve host information lazily, page by page
+        hosts = SAT_CLIENT.iter_results("/hosts")
         required_settings = {}
 
         #retrieve VM/IP information
@@ -81,7 +81,7 @@ def populate(options):
             ip_filter = "ip6"
         else:
             ip_filter = "ip"
-        for host in hosts["results"]:
+        for host in hosts:
             LOGGER.debug(
                 "SATELLITE: Found host '%s' with IP '%s'",
                 host["name"], host[ip_filter]
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# pylint: disable=not-callable
+"""
+A script for querying outstanding errata and CVEs of systems within a
+snapshot report of systems managed with Foreman/Katello or Red Hat
+Satellite 6.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import logging
+import os
+
+from . import __version__, is_valid_report
+from .analysis.matrix import ErrataMatrix
+from .storage.cveindex import CVEIndex, get_cve_index_filename
+
+"""
+str: Program version
+"""
+LOGGER = logging.getLogger('katprep_query')
+"""
+logging: Logger instance
+"""
+LOG_LEVEL = None
+"""
+logging: Logger level
+"""
+
+
+
+def parse_options(args=None):
+    """Parses options and arguments."""
+    desc = '''%(prog)s is used for querying outstanding errata of systems
+    within a snapshot report, e.g. finding systems that still miss a
+    particular erratum or are affected by a CVE.'''
+    epilog = '''Check-out the website for more details:
+    http://github.com/stdevel/katprep'''
+    parser = argparse.ArgumentParser(description=desc, epilog=epilog)
+    parser.add_argument('--version', action='version', version=__version__)
+
+    #define option groups
+    gen_opts = parser.add_argument_group("generic arguments")
+
+    #GENERIC ARGUMENTS
+    #-q / --quiet
+    gen_opts.add_argument("-q", "--quiet", action="store_true", \
+    dest="generic_quiet", default=False, help="don't print status messages " \
+    "to stdout (default: no)")
+    #-d / --debug
+    gen_opts.add_argument("-d", "--debug", dest="generic_debug", default=False, \
+    action="store_true", help="enable debugging outputs (default: no)")
+    #snapshot report
+    parser.add_argument('report', metavar='FILE', \
+    help='Snapshot report to query')
+
+    #COMMANDS
+    subparsers = parser.add_subparsers(title='commands', \
+    description='queries', help='Additional help')
+    subparsers.required = True
+    subparsers.dest = "command"
+    cmd_missing = subparsers.add_parser("missing", help="Lists systems " \
+    "an erratum is outstanding for")
+    cmd_missing.set_defaults(func=query_missing)
+    cmd_missing.add_argument('errata', metavar='ERRATUM', nargs='+', \
+    help='Erratum IDs (e.g. RHSA-2017:0001)')
+    cmd_common = subparsers.add_parser("common", help="Lists errata " \
+    "outstanding for most systems")
+    cmd_common.set_defaults(func=query_common)
+    cmd_common.add_argument("-t", "--threshold", action="store", \
+    default=90.0, type=float, dest="threshold", metavar="PERCENT", \
+    help="minimum share of systems an erratum is outstanding for " \
+    "(default: 90)")
+    cmd_identical = subparsers.add_parser("identical", help="Lists " \
+    "systems sharing identical sets of outstanding errata")
+    cmd_identical.set_defaults(func=query_identical)
+    cmd_identical.add_argument("-m", "--min-hosts", action="store", \
+    default=2, type=int, dest="min_hosts", metavar="NUMBER", \
+    help="minimum number of systems per group (default: 2)")
+    cmd_cve = subparsers.add_parser("cve", help="Lists errata fixing a " \
+    "CVE and the systems they are outstanding for")
+    cmd_cve.set_defaults(func=query_cve)
+    cmd_cve.add_argument('cves', metavar='CVE', nargs='+', \
+    help='CVE IDs (e.g. CVE-2017-0001)')
+
+    #parse options and arguments
+    options = parser.parse_args(args)
+    if not os.path.isfile(options.report) or \
+        not os.access(options.report, os.R_OK):
+        parser.error(
+            "File '{}' non-existent or not readable".format(options.report)
+        )
+    return (options, args)
+
+
+
+def get_matrix(options):
+    """
+    Returns the errata matrix of the snapshot report.
+
+    :param options: argparse options dictionary containing parameters
+    :type options: argparse options dict
+    """
+    try:
+        report = is_valid_report(options.report)
+    except argparse.ArgumentTypeError as err:
+        LOGGER.error(err)
+        exit(1)
+    matrix = ErrataMatrix.from_report(report)
+    report.close()
+    LOGGER.debug("Errata matrix: %s systems, %s errata", *matrix.shape)
+    return matrix
+
+
+
+def get_cve_index(options):
+    """
+    Returns the CVE index of the snapshot report. If the report has no CVE
+    index (see katprep_snapshot --cve-index), it is created from the report.
+
+    :param options: argparse options dictionary containing parameters
+    :type options: argparse options dict
+    """
+    index_file = get_cve_index_filename(options.report)
+    if os.path.isfile(index_file):
+        LOGGER.debug("Using CVE index '%s'", index_file)
+        try:
+            return CVEIndex.load(index_file)
+        except (IOError, OSError, ValueError, KeyError) as err:
+            LOGGER.warning("Unable to read CVE index: '%s'", err)
+    LOGGER.warning(
+        "No CVE index found for '%s', reading the report", options.report
+    )
+    try:
+        report = is_valid_report(options.report)
+    except argparse.ArgumentTypeError as err:
+        LOGGER.error(err)
+        exit(1)
+    index = CVEIndex.from_report(report)
+    report.close()
+    return index
+
+
+
+def query_missing(options):
+    """
+    Prints the systems particular errata are outstanding for.
+
+    :param options: argparse options dictionary containing parameters
+    :type options: argparse options dict
+    """
+    matrix = get_matrix(options)
+    for erratum in options.errata:
+        hosts = matrix.get_hosts_missing(erratum)
+        LOGGER.info(
+            "Erratum '%s' is outstanding for %s systems", erratum, len(hosts)
+        )
+        for host in sorted(hosts):
+            if len(options.errata) > 1:
+                print("{}\t{}".format(erratum, host))
+            else:
+                print(host)
+
+
+
+def query_common(options):
+    """
+    Prints errata outstanding for a minimum share of all systems.
+
+    :param options: argparse options dictionary containing parameters
+    :type options: argparse options dict
+    """
+    matrix = get_matrix(options)
+    for erratum, count, share in matrix.get_common_errata(
+            options.threshold / 100.0):
+        print("{}\t{}\t{:.1f}%".format(erratum, count, share * 100))
+
+
+
+def query_identical(options):
+    """
+    Prints groups of systems sharing identical sets of outstanding errata.
+
+    :param options: argparse options dictionary containing parameters
+    :type options: argparse options dict
+    """
+    matrix = get_matrix(options)
+    for errata, hosts in matrix.get_identical_hosts(options.min_hosts):
+        print("{} systems, {} errata: {}".format(
+            len(hosts), len(errata), " ".join(sorted(errata)) or "-"
+        ))
+        for host in sorted(hosts):
+            print("  {}".format(host))
+
+
+
+def query_cve(options):
+    """
+    Prints the errata fixing particular CVEs and the systems they are
+    outstanding for.
+
+    :param options: argparse options dictionary containing parameters
+    :type options: argparse options dict
+    """
+    index = get_cve_index(options)
+    for cve in options.cves:
+        errata = index.lookup(cve)
+        LOGGER.info(
+            "CVE '%s' is fixed by %s errata outstanding for %s systems",
+            cve, len(errata), len(set(x for y in errata.values() for x in y))
+        )
+        for erratum in sorted(errata):
+            for host in sorted(errata[erratum]):
+                print("{}\t{}\t{}".format(cve.upper(), erratum, host))
+
+
+
+def main(options, args):
+    """Main function, starts the logic based on parameters."""
+    LOGGER.debug("Options: %s", options)
+    LOGGER.debug("Arguments: %s", args)
+
+    options.func(options)
+
+
+def cli():
+    """
+    This functions initializes the CLI interface
+    """
+    global LOG_LEVEL
+    (options, args) = parse_options()
+
+    #set logging level
+    logging.basicConfig()
+    if options.generic_debug:
+        LOG_LEVEL = logging.DEBUG
+    elif options.generic_quiet:
+        LOG_LEVEL = logging.ERROR
+    else:
+        LOG_LEVEL = logging.INFO
+    LOGGER.setLevel(LOG_LEVEL)
+
+    main(options, args)
+
+
+
+if __name__ == "__main__":
+    cli()
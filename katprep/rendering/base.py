@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Base for creating report renderers.
+"""
+
+from abc import ABCMeta, abstractmethod
+
+import yaml
+
+try:
+    YAML_DUMPER = yaml.CSafeDumper
+except AttributeError:
+    YAML_DUMPER = yaml.SafeDumper
+"""
+yaml.Dumper: YAML dumper, preferring libyaml
+"""
+
+
+class BaseRenderer(metaclass=ABCMeta):
+    """
+    Renders host reports based on a template. The output type is derived
+    from the template file extension.
+    """
+
+    def __init__(self, template_file, output_type, preserve_yaml=False):
+        """
+        Constructor, preparing the template.
+
+        :param template_file: template filename
+        :type template_file: str
+        :param output_type: output file type (e.g. html or md)
+        :type output_type: str
+        :param preserve_yaml: also writes the YAML metadata per host
+        :type preserve_yaml: bool
+        """
+        self.template_file = template_file
+        self.output_type = output_type
+        self.preserve_yaml = preserve_yaml
+
+    @abstractmethod
+    def render(self, data, filename):
+        """
+        Renders a host report.
+
+        :param data: host report data (``params``, ``verification`` and
+        ``errata``)
+        :type data: dict
+        :param filename: output filename without extension
+        :type filename: str
+        """
+
+    def get_output_filename(self, filename):
+        """
+        Returns the output filename of a report.
+
+        :param filename: output filename without extension
+        :type filename: str
+        """
+        return "{}.{}".format(filename, self.output_type)
+
+    @staticmethod
+    def dump_yaml(data, stream=None):
+        """
+        Serializes host report data as YAML metadata block. The libyaml
+        based dumper is used if available. Returns the YAML document if
+        no stream is given.
+
+        :param data: host report data
+        :type data: dict
+        :param stream: file-like object to write to
+        :type stream: file
+        """
+        return yaml.dump(
+            data, stream, Dumper=YAML_DUMPER, default_flow_style=False,
+            explicit_start=True, explicit_end=True, default_style="'"
+        )
+
+    def write_yaml(self, data, filename):
+        """
+        Writes host report data as YAML metadata block.
+
+        :param data: host report data
+        :type data: dict
+        :param filename: YAML filename
+        :type filename: str
+        """
+        with open(filename, "w") as yaml_file:
+            self.dump_yaml(data, yaml_file)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Render cache for regenerating reports incrementally.
+
+Every rendered report is recorded in a manifest file within the output
+path along with a hash of its inputs (host delta, verification settings
+and template). Reports are only rendered again if their inputs changed or
+the output file is missing.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+LOGGER = logging.getLogger('katprep_rendering')
+"""
+logging: Logger instance
+"""
+MANIFEST_FILE = ".katprep_report.manifest"
+"""
+str: Manifest filename within the output path
+"""
+MANIFEST_VERSION = 1
+"""
+int: Manifest format version
+"""
+VOLATILE_PARAMS = ("date", "time")
+"""
+tuple: Host parameters set on every run, not considered for the hash
+"""
+
+
+def get_template_digest(template_file, *args):
+    """
+    Returns the hash of a template and additional rendering settings
+    (e.g. engine and output type).
+
+    :param template_file: template filename
+    :type template_file: str
+    """
+    digest = hashlib.sha256()
+    with open(template_file, "rb") as tmpl:
+        digest.update(tmpl.read())
+    for arg in args:
+        digest.update("\0{}".format(arg).encode("utf-8"))
+    return digest.hexdigest()
+
+
+
+def get_host_digest(data, template_digest):
+    """
+    Returns the hash of a host's report inputs.
+
+    :param data: host report data (``params``, ``verification`` and
+    ``errata``)
+    :type data: dict
+    :param template_digest: template hash
+    :type template_digest: str
+    """
+    params = dict(
+        (key, value) for key, value in data.get("params", {}).items()
+        if key not in VOLATILE_PARAMS
+    )
+    inputs = [
+        template_digest, params, data.get("verification", {}),
+        data.get("errata", [])
+    ]
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+
+class RenderCache(object):
+    """
+.. class:: RenderCache
+    Manifest of rendered reports and their input hashes.
+
+    :param output_path: report output path
+    :type output_path: str
+    """
+
+    def __init__(self, output_path):
+        """
+        Constructor, loading the manifest of an output path. Missing or
+        invalid manifests result in an empty cache.
+        """
+        self.filename = os.path.join(output_path, MANIFEST_FILE)
+        self._hosts = {}
+        self._changed = False
+        try:
+            with open(self.filename, "r") as manifest:
+                data = json.load(manifest)
+            if data.get("version") == MANIFEST_VERSION:
+                self._hosts = data["hosts"]
+        except (IOError, OSError):
+            pass
+        except (ValueError, KeyError, AttributeError):
+            LOGGER.warning(
+                "Ignoring invalid render cache manifest '%s'", self.filename
+            )
+
+    def is_current(self, host, digest, output_file):
+        """
+        Returns whether a host's report was rendered with the same inputs
+        and still exists.
+
+        :param host: hostname
+        :type host: str
+        :param digest: hash of the report inputs
+        :type digest: str
+        :param output_file: report filename
+        :type output_file: str
+        """
+        entry = self._hosts.get(host)
+        return entry is not None and entry.get("digest") == digest and \
+            entry.get("output") == output_file and \
+            os.path.isfile(output_file)
+
+    def update(self, host, digest, output_file):
+        """
+        Records a rendered report.
+
+        :param host: hostname
+        :type host: str
+        :param digest: hash of the report inputs
+        :type digest: str
+        :param output_file: report filename
+        :type output_file: str
+        """
+        self._hosts[host] = {"digest": digest, "output": output_file}
+        self._changed = True
+
+    def save(self):
+        """
+        Writes the manifest if it was changed.
+        """
+        if not self._changed:
+            return
+        tmp_file = "{}.tmp".format(self.filename)
+        with open(tmp_file, "w") as manifest:
+            json.dump(
+                {"version": MANIFEST_VERSION, "hosts": self._hosts}, manifest
+            )
+        os.replace(tmp_file, self.filename)
+        self._changed = False
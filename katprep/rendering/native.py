@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Renders reports in-process using a compiled Pandoc template.
+"""
+
+import html
+
+from .base import BaseRenderer
+from .template import PandocTemplate
+
+
+class NativeRenderer(BaseRenderer):
+    """
+    Renders reports without spawning external processes. The template is
+    compiled once and rendered for every host. Values are escaped for
+    HTML output, other output types receive the values as they are.
+    """
+
+    def __init__(self, template_file, output_type, preserve_yaml=False):
+        super().__init__(template_file, output_type, preserve_yaml)
+        with open(template_file, "r") as tmpl:
+            self._template = PandocTemplate(tmpl.read(), template_file)
+        if output_type in ("html", "htm", "xhtml"):
+            self._escape = lambda value: html.escape(value, quote=False)
+        else:
+            self._escape = str
+
+    def render(self, data, filename):
+        if self.preserve_yaml:
+            self.write_yaml(data, "{}.yml".format(filename))
+        with open(self.get_output_filename(filename), "w") as report:
+            report.write(self._template.render(data, self._escape))
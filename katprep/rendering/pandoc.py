@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Renders reports using the ``pandoc`` binary.
+"""
+
+import subprocess
+
+from .base import BaseRenderer
+
+
+class PandocRenderer(BaseRenderer):
+    """
+    Renders reports by passing per-host YAML metadata to ``pandoc`` via
+    standard input.
+    """
+
+    def render(self, data, filename):
+        metadata = self.dump_yaml(data)
+        if self.preserve_yaml:
+            with open("{}.yml".format(filename), "w") as yaml_file:
+                yaml_file.write(metadata)
+        subprocess.run([
+            "pandoc", "--from", "markdown", "--template", self.template_file,
+            "-o", self.get_output_filename(filename)
+        ], input=metadata, universal_newlines=True, check=True)
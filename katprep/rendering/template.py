@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Compiler for the Pandoc template syntax used by katprep report templates.
+
+Supported are the following constructs:
+
+- ``$variable$`` and ``$variable.key$`` for inserting values
+- ``$if(variable)$ ... $else$ ... $endif$`` for conditionals
+- ``$for(variable)$ ... $sep$ ... $endfor$`` for loops, the loop variable
+  (or ``$it$``) refers to the current item inside the loop
+- ``$$`` for a literal dollar sign and ``$--`` for comments
+
+Like Pandoc, the line break after a conditional or loop keyword standing
+on its own line is swallowed.
+"""
+
+from abc import ABCMeta, abstractmethod
+import re
+
+from ..exceptions import TemplateException
+
+TOKEN_PATTERN = re.compile(r"\$\$|\$--[^\n]*|\$([^$\n]+)\$")
+"""
+re: Pattern matching literal dollars, comments and template keywords
+"""
+VARIABLE_PATTERN = re.compile(r"^[A-Za-z_][\w-]*(\.[A-Za-z_][\w-]*)*$")
+"""
+re: Pattern matching variable names
+"""
+KEYWORD_PATTERN = re.compile(r"^(if|for)\(([^)]+)\)$")
+"""
+re: Pattern matching conditional and loop keywords
+"""
+
+
+class _Node(metaclass=ABCMeta):
+    """
+    A compiled template element.
+    """
+
+    @abstractmethod
+    def render(self, scope, escape, out):
+        """
+        Appends the rendered element to the output list.
+
+        :param scope: variable scopes, innermost last
+        :type scope: list
+        :param escape: function escaping values for the output format
+        :type escape: function
+        :param out: rendered output chunks
+        :type out: list
+        """
+
+
+class _Text(_Node):
+    """
+    Literal template text.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def render(self, scope, escape, out):
+        out.append(self.text)
+
+
+class _Variable(_Node):
+    """
+    Variable substitution.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def render(self, scope, escape, out):
+        out.append(escape(format_value(lookup(scope, self.path))))
+
+
+class _Conditional(_Node):
+    """
+    Conditional with an optional ``else`` branch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.then_nodes = []
+        self.else_nodes = []
+
+    def render(self, scope, escape, out):
+        if is_true(lookup(scope, self.path)):
+            nodes = self.then_nodes
+        else:
+            nodes = self.else_nodes
+        for node in nodes:
+            node.render(scope, escape, out)
+
+
+class _Loop(_Node):
+    """
+    Loop over a list with an optional separator.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.body_nodes = []
+        self.sep_nodes = []
+
+    def render(self, scope, escape, out):
+        items = lookup(scope, self.path)
+        if not is_true(items):
+            return
+        if not isinstance(items, (list, tuple)):
+            items = [items]
+        name = self.path[-1]
+        for i, item in enumerate(items):
+            if i > 0:
+                for node in self.sep_nodes:
+                    node.render(scope, escape, out)
+            scope.append({name: item, "it": item})
+            try:
+                for node in self.body_nodes:
+                    node.render(scope, escape, out)
+            finally:
+                scope.pop()
+
+
+
+def lookup(scope, path):
+    """
+    Resolves a dotted variable path. Returns ``None`` for unset variables.
+
+    :param scope: variable scopes, innermost last
+    :type scope: list
+    :param path: variable path components
+    :type path: list
+    """
+    value = None
+    for variables in reversed(scope):
+        if isinstance(variables, dict) and path[0] in variables:
+            value = variables[path[0]]
+            break
+    for key in path[1:]:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+
+def is_true(value):
+    """
+    Returns whether a value satisfies a template conditional.
+
+    :param value: variable value
+    :type value: object
+    """
+    return value is not None and value is not False and value != "" \
+        and value != [] and value != {}
+
+
+
+def format_value(value):
+    """
+    Converts a variable value into text.
+
+    :param value: variable value
+    :type value: object
+    """
+    if value is None or value is False:
+        return ""
+    if value is True:
+        return "true"
+    if isinstance(value, (list, tuple)):
+        return "".join(format_value(x) for x in value)
+    if isinstance(value, dict):
+        return "true"
+    return "{}".format(value)
+
+
+
+def _is_standalone(text, start, end):
+    """
+    Checks whether a keyword is the only content of its line. Returns the
+    position after the line break if so, otherwise ``None``.
+    """
+    line_start = text.rfind("\n", 0, start) + 1
+    if text[line_start:start].strip(" \t"):
+        return None
+    line_end = text.find("\n", end)
+    if line_end == -1:
+        line_end = len(text)
+    if text[end:line_end].strip(" \t\r"):
+        return None
+    return min(line_end + 1, len(text))
+
+
+
+class PandocTemplate(object):
+    """
+.. class:: PandocTemplate
+    A template compiled once that can be rendered for many hosts.
+
+    :param source: template source
+    :type source: str
+    :param name: template name used in error messages
+    :type name: str
+    """
+
+    def __init__(self, source, name="<template>"):
+        """
+        Constructor, compiling the template. Raises TemplateException for
+        unbalanced or unknown keywords.
+        """
+        self.name = name
+        self._nodes = self.__compile(source)
+
+    def __compile(self, source):
+        """
+        Compiles the template source into a node tree.
+
+        :param source: template source
+        :type source: str
+        """
+        root = []
+        #stack of (node, list receiving children)
+        stack = [(None, root)]
+        pos = 0
+        text = ""
+        for match in TOKEN_PATTERN.finditer(source):
+            text += source[pos:match.start()]
+            pos = match.end()
+            token = match.group(0)
+            if token == "$$":
+                text += "$"
+                continue
+            if token.startswith("$--"):
+                continue
+
+            keyword = match.group(1).strip()
+            if VARIABLE_PATTERN.match(keyword) and keyword not in \
+                ("else", "endif", "sep", "endfor"):
+                if text:
+                    stack[-1][1].append(_Text(text))
+                    text = ""
+                stack[-1][1].append(_Variable(keyword.split(".")))
+                continue
+
+            #block keyword, swallow line if standalone
+            after = _is_standalone(source, match.start(), match.end())
+            if after is not None:
+                text = text.rstrip(" \t")
+                pos = after
+            if text:
+                stack[-1][1].append(_Text(text))
+                text = ""
+
+            block = KEYWORD_PATTERN.match(keyword)
+            if block:
+                path = block.group(2).strip()
+                if not VARIABLE_PATTERN.match(path):
+                    raise TemplateException(
+                        "Invalid variable '{}' in template '{}'".format(
+                            path, self.name
+                        )
+                    )
+                if block.group(1) == "if":
+                    node = _Conditional(path.split("."))
+                    stack[-1][1].append(node)
+                    stack.append((node, node.then_nodes))
+                else:
+                    node = _Loop(path.split("."))
+                    stack[-1][1].append(node)
+                    stack.append((node, node.body_nodes))
+            elif keyword == "else" and isinstance(stack[-1][0], _Conditional):
+                stack[-1] = (stack[-1][0], stack[-1][0].else_nodes)
+            elif keyword == "endif" and isinstance(stack[-1][0], _Conditional):
+                stack.pop()
+            elif keyword == "sep" and isinstance(stack[-1][0], _Loop):
+                stack[-1] = (stack[-1][0], stack[-1][0].sep_nodes)
+            elif keyword == "endfor" and isinstance(stack[-1][0], _Loop):
+                stack.pop()
+            else:
+                raise TemplateException(
+                    "Unexpected '${}$' in template '{}'".format(
+                        keyword, self.name
+                    )
+                )
+        text += source[pos:]
+        if text:
+            stack[-1][1].append(_Text(text))
+        if len(stack) > 1:
+            raise TemplateException(
+                "Unclosed block in template '{}'".format(self.name)
+            )
+        return root
+
+    def render(self, data, escape=None):
+        """
+        Renders the template and returns the result.
+
+        :param data: template variables
+        :type data: dict
+        :param escape: function escaping values for the output format
+        :type escape: function
+        """
+        if escape is None:
+            escape = str
+        out = []
+        scope = [data]
+        for node in self._nodes:
+            node.render(scope, escape, out)
+        return "".join(out)
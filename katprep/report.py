@@ -10,12 +10,20 @@ from __future__ import absolute_import
 
 import argparse
 import logging
-import json
 import datetime
 import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 #import pypandoc
-import yaml
-from . import __version__, is_writable, which, is_valid_report, get_json
+from . import __version__, is_writable, which, is_valid_report
+from .analysis.delta import (get_errata_index, iter_deltas,
+iter_deltas_by_index)
+from .analysis.summary import FleetSummary, SUMMARY_WRITERS
+from .exceptions import TemplateException
+from .rendering.cache import RenderCache, get_host_digest, \
+get_template_digest
+from .rendering.native import NativeRenderer
+from .rendering.pandoc import PandocRenderer
 
 """
 str: Program version
@@ -30,11 +38,19 @@ logging: Logger level
 """
 REPORT_OLD = {}
 """
-dict: Old snapshot report
+ReportStore: Old snapshot report (filename when creating a summary)
 """
 REPORT_NEW = {}
 """
-dic: New snapshot report
+ReportStore: New snapshot report (filename when creating a summary)
+"""
+RENDERERS = {"native": NativeRenderer, "pandoc": PandocRenderer}
+"""
+dict: Report rendering engines by name
+"""
+RENDERER = None
+"""
+BaseRenderer: Renderer of the current process
 """
 
 
@@ -76,24 +92,69 @@ def parse_options(args=None):
     "file extension (default: no)")
     #-x / --preserve-yaml
     rep_opts.add_argument("-x", "--preserve-yaml", dest="preserve_yaml", \
-    default=False, action="store_true", help="keeps the YAML metadata " \
-    "after creating the reports, important for debugging (default: no)")
+    default=False, action="store_true", help="also writes the YAML " \
+    "metadata per report, important for debugging (default: no)")
+    #-e / --engine
+    rep_opts.add_argument("-e", "--engine", dest="engine", default="native", \
+    choices=sorted(RENDERERS), help="defines the engine for rendering " \
+    "reports, 'pandoc' requires the pandoc binary (default: native)")
     #-t / --template
     rep_opts.add_argument("-t", "--template", dest="template_file", \
     metavar="FILE", default="", action="store", help="defines a dedicated" \
     " template file (default: integrated HTML)")
+    #-j / --jobs
+    rep_opts.add_argument("-j", "--jobs", action="store", \
+    default=os.cpu_count() or 1, type=int, dest="jobs", metavar="NUMBER", \
+    help="defines the number of processes rendering reports concurrently " \
+    "(default: number of CPU cores)")
+    #--force
+    rep_opts.add_argument("--force", dest="force_render", default=False, \
+    action="store_true", help="renders all reports, even if their " \
+    "snapshot data and template didn't change since the last run " \
+    "(default: no)")
+    #-s / --summary
+    rep_opts.add_argument("-s", "--summary", dest="summary", default=False, \
+    action="store_true", help="creates a single summary of all systems " \
+    "instead of per-system reports (default: no)")
+    #--summary-format
+    rep_opts.add_argument("--summary-format", dest="summary_format", \
+    default="html", choices=sorted(SUMMARY_WRITERS), help="defines the " \
+    "summary document format (default: html)")
     #snapshot reports
     rep_opts.add_argument('reports', metavar='FILE', nargs=2, \
-    help='Two snapshot reports (before/after patching)', type=is_valid_report)
+    help='Two snapshot reports (before/after patching)', type=is_readable)
 
 
 
     #parse options and arguments
     options = parser.parse_args()
+    if options.jobs < 1:
+        parser.error("at least one job is required")
+    if not options.summary:
+        #summaries open the reports one after another
+        try:
+            options.reports = [is_valid_report(x) for x in options.reports]
+        except argparse.ArgumentTypeError as err:
+            parser.error(err)
     return (options, args)
 
 
 
+def is_readable(filename):
+    """
+    Checks whether a file exists and is readable without parsing it. This
+    is used as argparse type.
+
+    :param filename: filename
+    :type filename: str
+    """
+    if not os.path.isfile(filename) or not os.access(filename, os.R_OK):
+        raise argparse.ArgumentTypeError("File '{}' non-existent or not" \
+            " readable".format(filename))
+    return filename
+
+
+
 def check_pandoc():
     """
     Checks the Pandoc installation by ensuring that the ``pandoc`` binary is
@@ -165,19 +226,15 @@ def get_older_file(file_a, file_b):
 
 def analyze_reports(options):
     """
-    Finds and loads report data. This function compares the two report files
-    passed as arguments and assigns them to dedicated dictionaries (*older and
-    *newer report*).
+    Finds report data. This function compares the two reports passed as
+    arguments (already parsed by is_valid_report unless creating a summary)
+    and assigns them to dedicated stores (*older and *newer report*).
     """
     global REPORT_OLD, REPORT_NEW
 
-    #load reports
-    REPORT_OLD = json.loads(get_json(
-        get_older_file(options.reports[0], options.reports[1])
-    ))
-    REPORT_NEW = json.loads(get_json(
-        get_newer_file(options.reports[0], options.reports[1])
-    ))
+    #assign reports
+    REPORT_OLD = get_older_file(options.reports[0], options.reports[1])
+    REPORT_NEW = get_newer_file(options.reports[0], options.reports[1])
     LOGGER.debug(
         "Old report ist '%s', new report is '%s'",
         get_older_file(options.reports[0], options.reports[1]),
@@ -186,97 +243,213 @@ def analyze_reports(options):
 
 
 
-def get_errata_by_host(report, hostname):
+def get_report_timestamp(options):
     """
-    Returns all errata by a particular host in a report.
-
-    :param report: JSON report content
-    :type report: str
-    :param host: hostname
-    :type host: str
+    Returns the timestamp used for report filenames, based on the
+    modification time of the newer snapshot report.
     """
-    #TODO: find a nicer way to do this -> list comprehension?
-    errata = []
-    for host in report:
-        if host == hostname:
-            for erratum in report[host]["errata"]:
-                errata.append(erratum["errata_id"])
-    LOGGER.debug("Errata for host '%s': '%s'", hostname, errata)
-    return errata
+    return datetime.datetime.fromtimestamp(os.path.getmtime(
+        get_newer_file(options.reports[0], options.reports[1])
+    )).strftime('%Y%m%d')
 
 
 
 def create_delta(options):
     """
-    Creats delta YAML reports per system. This is done by comparing the two
-    snapshot reports passed as arguments.
+    Creates deltas per system. This is done by comparing the two snapshot
+    reports passed as arguments. Returns the deltas of all systems that
+    have been patched.
     """
-    global REPORT_OLD
     now = datetime.datetime.now()
-    #open old report and remove entries from newer report
-    for host in REPORT_OLD:
-        LOGGER.debug("Analyzing changes for host '%s'", host)
-        try:
-            for i, erratum in enumerate(REPORT_OLD[host]["errata"]):
-                if erratum["errata_id"] in get_errata_by_host(REPORT_NEW, host):
-                    LOGGER.debug(
-                        "Dropping erratum '%s' (#%s}) as it seems not to" \
-                        " be installed",
-                        erratum["summary"], erratum["errata_id"]
-                    )
-                    del REPORT_OLD[host]["errata"][i]
-            #add date and time
-            #TODO: date format based on locale?
-            REPORT_OLD[host]["params"]["date"] = now.strftime("%Y-%m-%d")
-            REPORT_OLD[host]["params"]["time"] = now.strftime("%H:%M")
-
-            #store delta report
-            timestamp = datetime.datetime.fromtimestamp(os.path.getmtime(
-                get_newer_file(options.reports[0], options.reports[1])
-            )).strftime('%Y%m%d')
-
-            #store YAML files if at least 1 erratum installed
-            if len(REPORT_OLD[host]["errata"]) > len(REPORT_NEW[host]["errata"]):
-                with open("{}errata-diff-{}-{}.yml".format(options.output_path, \
-                    host, timestamp), "w") as json_file:
-                    yaml.dump(yaml.load(json.dumps(REPORT_OLD[host])), json_file, \
-                    default_flow_style=False, explicit_start=True, \
-                    explicit_end=True, default_style="'")
-            else:
-                LOGGER.debug(
-                    "Host '%s' has not been patched #ohman", host
-                )
-        except KeyError:
-            LOGGER.debug("Unable to find changes for host '%s'", host)
+    deltas = []
+    for delta in iter_deltas(REPORT_OLD, REPORT_NEW):
+        #add date and time
+        #TODO: date format based on locale?
+        delta.params["date"] = now.strftime("%Y-%m-%d")
+        delta.params["time"] = now.strftime("%H:%M")
+
+        #only report systems with at least 1 erratum installed
+        if delta.is_patched():
+            deltas.append(delta)
+        else:
+            LOGGER.debug(
+                "Host '%s' has not been patched #ohman", delta.host
+            )
+    return deltas
+
+
+
+def init_renderer(engine, template_file, output_type, preserve_yaml):
+    """
+    Prepares the renderer of the current process. This is also used for
+    initializing the worker processes when rendering concurrently.
+
+    :param engine: rendering engine name
+    :type engine: str
+    :param template_file: template filename
+    :type template_file: str
+    :param output_type: output file type
+    :type output_type: str
+    :param preserve_yaml: also writes the YAML metadata per host
+    :type preserve_yaml: bool
+    """
+    global RENDERER
+    RENDERER = RENDERERS[engine](template_file, output_type, preserve_yaml)
 
 
 
-def create_reports(options):
+def render_host(job):
     """
-    Creates patch reports per system. This is done by translating the
-    YAML reports created previously into the desired format using ``pandoc``.
+    Renders the report of a single host. Returns the hostname and an error
+    message if rendering failed (otherwise ``None``).
+
+    :param job: hostname, report data and output filename
+    :type job: tuple
+    """
+    host, data, filename = job
+    try:
+        RENDERER.render(data, filename)
+    except (IOError, OSError, subprocess.CalledProcessError) as err:
+        return (host, str(err))
+    return (host, None)
+
+
+
+def create_reports(options, deltas):
     """
-    for host in REPORT_OLD:
-        timestamp = datetime.datetime.fromtimestamp(os.path.getmtime(
-            get_newer_file(options.reports[0], options.reports[1])
-        )).strftime('%Y%m%d')
+    Creates patch reports per system. The template is prepared once per
+    process by the selected rendering engine and rendered for every system.
+    Systems whose snapshot data and template didn't change since the last
+    run are skipped (see RenderCache). If multiple jobs are requested,
+    systems are distributed over a process pool. Returns the hosts that
+    couldn't be rendered along with the error. Raises TemplateException for
+    invalid templates.
+
+    :param deltas: errata deltas of patched systems
+    :type deltas: list
+    """
+    timestamp = get_report_timestamp(options)
+    renderer_args = (
+        options.engine, options.template_file, options.output_type,
+        options.preserve_yaml
+    )
+    #also validates the template before starting workers
+    init_renderer(*renderer_args)
+
+    #skip reports with unchanged inputs
+    cache = RenderCache(options.output_path)
+    template_digest = get_template_digest(
+        options.template_file, options.engine, options.output_type,
+        options.preserve_yaml
+    )
+    jobs = []
+    digests = {}
+    for delta in deltas:
+        data = delta.get_report_data()
         filename = "{}errata-diff-{}-{}".format(
-            options.output_path, host, timestamp
+            options.output_path, delta.host, timestamp
         )
-        if os.path.isfile("{}.yml".format(filename)):
-            LOGGER.debug("Creating report for host '%s'", host)
-            LOGGER.debug("%s.yml", filename)
-            #TODO: figure out why pypandoc doesn't work at this point
-            os.system("pandoc {}.yml --template {} -o {}.{}".format(filename, \
-                options.template_file, filename, options.output_type))
-            if not options.preserve_yaml:
-                #Remove file
-                os.remove("{}.yml".format(filename))
-        else:
-            LOGGER.debug(
-                "Non-existing report template: '%s.yml'",
-                filename
-            )
+        digest = get_host_digest(data, template_digest)
+        if not options.force_render and cache.is_current(
+                delta.host, digest, RENDERER.get_output_filename(filename)):
+            LOGGER.debug("Report for host '%s' is up to date", delta.host)
+            continue
+        digests[delta.host] = (digest, RENDERER.get_output_filename(filename))
+        jobs.append((delta.host, data, filename))
+    if len(jobs) < len(deltas):
+        LOGGER.info(
+            "Skipping %s unchanged reports", len(deltas) - len(jobs)
+        )
+    total = len(jobs)
+    step = max(1, total // 10)
+    errors = []
+    executor = None
+    if options.jobs > 1 and total > 1:
+        LOGGER.debug("Rendering reports using %s processes", options.jobs)
+        executor = ProcessPoolExecutor(
+            max_workers=options.jobs, initializer=init_renderer,
+            initargs=renderer_args
+        )
+        results = executor.map(
+            render_host, jobs, chunksize=max(1, total // (options.jobs * 4))
+        )
+    else:
+        results = map(render_host, jobs)
+
+    try:
+        for done, (host, error) in enumerate(results, 1):
+            if error:
+                errors.append((host, error))
+            else:
+                LOGGER.debug("Created report for host '%s'", host)
+                cache.update(host, *digests[host])
+            if done % step == 0 or done == total:
+                LOGGER.info("Rendered %s/%s reports", done, total)
+    finally:
+        if executor:
+            executor.shutdown()
+        try:
+            cache.save()
+        except (IOError, OSError) as err:
+            LOGGER.error("Unable to save render cache: '%s'", err)
+
+    if errors:
+        LOGGER.error(
+            "Unable to create %s of %s reports:", len(errors), total
+        )
+        for host, error in errors:
+            LOGGER.error("%s: %s", host, error)
+    return errors
+
+
+
+def open_report(filename):
+    """
+    Opens a snapshot report, exits if the report is invalid.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    try:
+        return is_valid_report(filename)
+    except argparse.ArgumentTypeError as err:
+        LOGGER.error(err)
+        exit(1)
+
+
+
+def create_summary(options):
+    """
+    Creates a summary of all systems. The snapshot reports are opened one
+    after another, so both reports are never held in memory at the same
+    time: only the erratum IDs per system are kept from the newer report,
+    the older report is then processed in a single pass. Systems are
+    dropped from the older report once they have been added to the summary.
+    """
+    timestamp = get_report_timestamp(options)
+    summary = FleetSummary()
+    report = open_report(REPORT_NEW)
+    errata_index = get_errata_index(report, release=True)
+    report.close()
+    #free the newer report before parsing the older one
+    del report
+    report = open_report(REPORT_OLD)
+    for delta in iter_deltas_by_index(report, errata_index, release=True):
+        summary.add(delta)
+    report.close()
+
+    filename = "{}errata-summary-{}.{}".format(
+        options.output_path, timestamp, options.summary_format
+    )
+    LOGGER.debug("Creating summary '%s'", filename)
+    with open(filename, "w", newline="") as report_file:
+        SUMMARY_WRITERS[options.summary_format](
+            summary, report_file, "System maintenance summary"
+        )
+    LOGGER.info(
+        "Created summary of %s systems (%s patched)", summary.systems,
+        summary.patched
+    )
 
 
 
@@ -309,7 +482,11 @@ def main(options, args):
     LOGGER.debug("Arguments: %s", args)
 
     #check if we can read and write before digging
-    if not check_pandoc():
+    if options.summary:
+        if is_writable(options.output_path):
+            analyze_reports(options)
+            create_summary(options)
+    elif options.engine == "pandoc" and not check_pandoc():
         LOGGER.error("Pandoc can't be found - check your installation.")
     #check if template exists
     elif not os.path.exists(options.template_file) or \
@@ -323,8 +500,13 @@ def main(options, args):
         analyze_reports(options)
 
         #create delta and reports
-        create_delta(options)
-        create_reports(options)
+        deltas = create_delta(options)
+        try:
+            if create_reports(options, deltas):
+                exit(1)
+        except TemplateException as err:
+            LOGGER.error("Unable to load template: '%s'", err)
+            exit(1)
 
 
 def cli():
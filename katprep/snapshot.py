@@ -13,10 +13,17 @@ import logging
 import json
 import time
 import getpass
+import glob
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from . import (
-    __version__, get_credentials, is_writable, validate_filters, get_filter)
+    __version__, get_credentials, is_writable, validate_filters, get_filter,
+    is_valid_report, get_report_store)
 from .exceptions import SessionException
 from .management.foreman import ForemanAPIClient
+from .storage.cveindex import CVEIndex, get_cve_index_filename
+from .storage.writer import ReportWriter
 from .network import validate_hostname
 
 """
@@ -34,14 +41,28 @@ SAT_CLIENT = None
 """
 ForemanAPIClient: Foreman API client handle
 """
-SYSTEM_ERRATA = {}
-"""
-dict: Errata and parameter information per system
-"""
 OUTPUT_FILE = ""
 """
 str: Output file
 """
+REPORT_WRITER = None
+"""
+ReportWriter: Writer streaming errata and parameter information per system
+into the report
+"""
+CHECKPOINT = None
+"""
+file: Checkpoint file recording the IDs of completely scanned systems
+"""
+COMPLETED_SYSTEMS = set()
+"""
+set: IDs of systems already captured by a previous, interrupted run
+"""
+PREVIOUS_REPORT = None
+"""
+ReportStore: Previous snapshot report used for incremental snapshots (if
+any)
+"""
 
 
 def parse_options(args=None):
@@ -81,6 +102,12 @@ http://github.com/stdevel/katprep'''
     gen_opts.add_argument("-p", "--output-path", dest="output_path", \
     metavar="PATH", default="", action="store", help="defines the output path" \
     " for reports (default: current directory)")
+    #-f / --format
+    gen_opts.add_argument("-f", "--format", dest="report_format", \
+    metavar="FORMAT", default="json", choices=["json", "jsonl", "sqlite"], \
+    help="defines the report format: json (single document), jsonl " \
+    "(one host per line along with an index) or sqlite (SQLite database) " \
+    "(default: json)")
     #-C / --auth-container
     gen_opts.add_argument("-C", "--auth-container", default="", \
     dest="auth_container", action="store", metavar="FILE", \
@@ -120,6 +147,23 @@ http://github.com/stdevel/katprep'''
     fman_opts.add_argument("-E", "--exclude", action="append", default=[], \
     type=str, dest="filter_exclude", metavar="NAME", \
     help="excludes particular hosts (default: no)")
+    #--since
+    fman_opts.add_argument("--since", action="store", default=None, \
+    type=is_valid_report, dest="since", metavar="FILE", help="only " \
+    "retrieves systems that changed since a previous snapshot report " \
+    "(default: no)")
+    #--resume
+    fman_opts.add_argument("--resume", action="store_true", default=False, \
+    dest="resume", help="continues the latest interrupted snapshot, " \
+    "skipping systems that have already been captured (default: no)")
+    #--cve-index
+    fman_opts.add_argument("--cve-index", action="store_true", \
+    default=False, dest="cve_index", help="also stores an index of CVEs, " \
+    "errata and affected systems next to the report (default: no)")
+    #-w / --workers
+    fman_opts.add_argument("-w", "--workers", action="store", default=1, \
+    type=int, dest="workers", metavar="NUMBER", help="defines the number " \
+    "of systems scanned concurrently (default: 1)")
 
 
 
@@ -127,6 +171,8 @@ http://github.com/stdevel/katprep'''
     options = parser.parse_args()
     #validate hostname
     options.server = validate_hostname(options.server)
+    if options.workers < 1:
+        parser.error("at least one worker is required")
     #set password
     while options.auth_password == "empty" or len(options.auth_password) > 32:
         options.auth_password = getpass.getpass(
@@ -136,125 +182,321 @@ http://github.com/stdevel/katprep'''
 
 
 
+def get_system_references(system):
+    """
+    Returns the Foreman IDs of a system, its organization and location as
+    well as its content source (Capsule). Storing them in the report saves
+    looking them up by name later.
+
+    :param system: Foreman API host entry
+    :type system: dict
+    """
+    content = system.get("content_facet_attributes") or {}
+    references = {
+        "host_id": system.get("id"),
+        "organization_id": system.get("organization_id"),
+        "location_id": system.get("location_id"),
+        "content_source_id": content.get("content_source_id"),
+        "content_source_name": content.get("content_source_name"),
+    }
+    return dict(
+        (key, value) for key, value in references.items()
+        if value not in (None, "")
+    )
+
+
+
+def scan_system(system):
+    """
+    Retrieves errata and parameter information for a particular system.
+    Returns the report entry or None if the system information couldn't be
+    retrieved.
+
+    :param system: Foreman API host result entry
+    :type system: dict
+    """
+    try:
+        LOGGER.info(
+            "Checking system '%s' (#%s)...", system["name"], system["id"])
+        errata_counter = system["content_facet_attributes"]["errata_counts"]
+        if not errata_counter:
+            #unable to read errata
+            LOGGER.info(
+                "Unable to read errata counters for system '%s' - check " \
+                "system! (Hint: unregistered content host?)", system["name"]
+            )
+            errata_counter = {}
+            errata_counter["security"] = 0
+            errata_counter["bugfix"] = 0
+            errata_counter["enhancement"] = 0
+            errata_counter["total"] = 0
+        LOGGER.debug(
+            "System errata counter: security=%s, bugfix=%s," \
+            " enhancement=%s, total=%s",
+            errata_counter["security"],
+            errata_counter["bugfix"],
+            errata_counter["enhancement"],
+            errata_counter["total"]
+        )
+        #add columns
+        host = {
+            "errata": {},
+            "params": {},
+            "verification": {},
+        }
+
+        #add _all_ the katprep_* params
+        params_obj = json.loads(
+            SAT_CLIENT.api_get("/hosts/{}".format(system["id"]))
+        )
+        for entry in params_obj["parameters"]:
+            if "katprep_" in entry["name"]:
+                #add key/value
+                host["params"][entry["name"]] = entry["value"]
+
+        #remember change indicators for incremental snapshots
+        host["params"]["errata_counts"] = \
+            system["content_facet_attributes"]["errata_counts"]
+        host["params"]["updated_at"] = system.get("updated_at", "")
+
+        #remember Foreman IDs
+        host["params"].update(get_system_references(params_obj))
+
+        #add some additional information required for katprep_report
+        params = {
+            "name", "ip", "ip6", "organization_name", "location_name",
+            "environment_name", "operatingsystem_name", "hostgroup_name"
+        }
+        for param in params:
+            try:
+                host["params"][param] = params_obj[param]
+            except KeyError as err:
+                LOGGER.debug("Missing key: %s", err)
+                pass
+
+        #get owner
+        try:
+            host["params"]["owner"] =  \
+                SAT_CLIENT.get_name_by_id(params_obj["owner_id"], "user")
+        except SessionException:
+            #no user
+            host["params"]["owner"] = ""
+            LOGGER.debug("No owner for system '%s' defined", system["name"])
+
+        #set HW flag
+        if not params_obj["facts"]["is_virtual"].lower() == "true":
+            host["params"]["system_physical"] = True
+
+        #add errata information if applicable
+        if int(errata_counter["total"]) > 0:
+            host["errata"] = list(SAT_CLIENT.iter_results(
+                "/hosts/{}/errata".format(system["id"])
+            ))
+            #remove _all_ the reboot suggested flags as Pandoc is too dump
+            #to check the value
+            for errata in host["errata"]:
+                if not errata["reboot_suggested"]:
+                    del errata["reboot_suggested"]
+        return host
+    except KeyError as err:
+        LOGGER.error(
+            "Unable to get system information for '%s', " \
+            "dropping system!", system["name"])
+    except (SessionException, ValueError) as err:
+        LOGGER.error(
+            "Unable to get data of system '%s', dropping system: '%s'",
+            system["name"], err
+        )
+
+
+
 def scan_systems(options):
-    """Scans all systems that were selected for errata counters."""
+    """
+    Scans all systems that were selected for errata counters. If multiple
+    workers are requested, systems are scanned concurrently while results
+    are still merged in the order Foreman returned the systems.
+    """
 
     #get all the hosts depending on the filter
     filter_url = get_filter(options, "host")
     LOGGER.debug("Filter URL will be '%s'", filter_url)
-    result_obj = json.loads(
-        SAT_CLIENT.api_get("{}".format(filter_url))
-    )
 
-    #get errata per system
-    for system in result_obj["results"]:
-        try:
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        pending = deque()
+        #get errata per system, walking all result pages
+        for system in SAT_CLIENT.iter_results(filter_url):
             if system["name"] in options.filter_exclude:
                 #ignore blacklisted system
                 LOGGER.info(
                     "Ignoring exlucded system '%s'", system["name"])
                 continue
-            LOGGER.info(
-                "Checking system '%s' (#%s)...", system["name"], system["id"])
-            errata_counter = system["content_facet_attributes"]["errata_counts"]
-            if not errata_counter:
-                #unable to read errata
-                LOGGER.info(
-                    "Unable to read errata counters for system '%s' - check " \
-                    "system! (Hint: unregistered content host?)", system["name"]
+            if system["id"] in COMPLETED_SYSTEMS or \
+                REPORT_WRITER.has_host(system["name"]):
+                #captured by the interrupted run
+                LOGGER.debug(
+                    "System '%s' already captured", system["name"])
+                continue
+            previous = get_unchanged_system(system)
+            if previous is not None:
+                #copy forward
+                LOGGER.debug(
+                    "System '%s' unchanged since previous snapshot",
+                    system["name"]
                 )
-                errata_counter = {}
-                errata_counter["security"] = 0
-                errata_counter["bugfix"] = 0
-                errata_counter["enhancement"] = 0
-                errata_counter["total"] = 0
-            LOGGER.debug(
-                "System errata counter: security=%s, bugfix=%s," \
-                " enhancement=%s, total=%s",
-                errata_counter["security"],
-                errata_counter["bugfix"],
-                errata_counter["enhancement"],
-                errata_counter["total"]
-            )
-            #add columns
-            SYSTEM_ERRATA[system["name"]] = {
-                "errata": {},
-                "params": {},
-                "verification": {},
-            }
-
-            #add _all_ the katprep_* params
-            params_obj = json.loads(
-                SAT_CLIENT.api_get("/hosts/{}".format(system["id"]))
-            )
-            for entry in params_obj["parameters"]:
-                if "katprep_" in entry["name"]:
-                    #add key/value
-                    SYSTEM_ERRATA[system["name"]]["params"][entry["name"]] = {}
-                    SYSTEM_ERRATA[system["name"]]["params"][entry["name"]] = entry["value"]
-
-            #add some additional information required for katprep_report
-            params = {
-                "name", "ip", "ip6", "organization_name", "location_name",
-                "environment_name", "operatingsystem_name"
-            }
-            for param in params:
-                try:
-                    SYSTEM_ERRATA[system["name"]]["params"][param] = params_obj[param]
-                except KeyError as err:
-                    LOGGER.debug("Missing key: %s", err)
-                    pass
+                future = Future()
+                future.set_result(previous)
+            else:
+                future = executor.submit(scan_system, system)
+            pending.append((system["id"], system["name"], future))
+            #keep the amount of queued systems bounded
+            while len(pending) > options.workers * 2:
+                merge_system(*pending.popleft())
+        while pending:
+            merge_system(*pending.popleft())
 
-            #get owner
-            try:
-                SYSTEM_ERRATA[system["name"]]["params"]["owner"] =  \
-                    SAT_CLIENT.get_name_by_id(params_obj["owner_id"], "user")
-            except SessionException:
-                #no user
-                SYSTEM_ERRATA[system["name"]]["params"]["owner"] = ""
-                LOGGER.debug("No owner for system '%s' defined", system["name"])
-
-            #set HW flag
-            if not params_obj["facts"]["is_virtual"].lower() == "true":
-                SYSTEM_ERRATA[system["name"]]["params"]["system_physical"] = True
-
-            #add errata information if applicable
-            if int(errata_counter["total"]) > 0:
-                result_obj = json.loads(
-                    SAT_CLIENT.api_get("/hosts/{}/errata".format(system["id"]))
-                )
-                SYSTEM_ERRATA[system["name"]]["errata"] = result_obj["results"]
-                #remove _all_ the reboot suggested flags as Pandoc is too dump
-                #to check the value
-                for errata in SYSTEM_ERRATA[system["name"]]["errata"]:
-                    if not errata["reboot_suggested"]:
-                        del errata["reboot_suggested"]
-        except KeyError as err:
-            LOGGER.error(
-                "Unable to get system information for '%s', " \
-                "dropping system!", system["name"])
-            pass
-        except ValueError as err:
-            LOGGER.info("Unable to get data: '%s'", err)
+
+
+def get_unchanged_system(system):
+    """
+    Returns the previous report entry of a system if its errata counters
+    and modification date didn't change since the previous snapshot.
+    Otherwise, None is returned.
+
+    :param system: Foreman API host result entry
+    :type system: dict
+    """
+    if PREVIOUS_REPORT is None:
+        return None
+    try:
+        previous = PREVIOUS_REPORT[system["name"]]
+        #entry is only needed once
+        PREVIOUS_REPORT.release(system["name"])
+        if previous["params"]["errata_counts"] != \
+            system["content_facet_attributes"]["errata_counts"] or \
+            previous["params"]["updated_at"] != system["updated_at"]:
+            return None
+    except KeyError:
+        #unknown system or report without change indicators
+        return None
+    #verification data belongs to the previous maintenance
+    previous["verification"] = {}
+    #add Foreman IDs missing in reports of previous versions
+    previous["params"].update(get_system_references(system))
+    return previous
+
+
+
+def merge_system(system_id, name, future):
+    """
+    Waits for a system scan to finish, writes the result to the report and
+    records the system in the checkpoint file.
+
+    :param system_id: Foreman host ID
+    :type system_id: int
+    :param name: hostname
+    :type name: str
+    :param future: pending scan_system() result
+    :type future: concurrent.futures.Future
+    """
+    host = future.result()
+    if host is not None:
+        REPORT_WRITER.add_host(name, host)
+        CHECKPOINT.write("{}\n".format(json.dumps(system_id)))
+        CHECKPOINT.flush()
+
+
+
+def get_checkpoint_filename(filename):
+    """
+    Returns the name of the checkpoint file of a report.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    return "{}.checkpoint".format(filename)
 
 
 
-def create_report():
-    """Creates a JSON report including errata information of all hosts."""
+def find_interrupted_report(options):
+    """
+    Returns the filename of the latest interrupted snapshot report of the
+    selected Foreman server or None if there is none.
+    """
+    checkpoints = glob.glob(get_checkpoint_filename(
+        "{}errata-snapshot-report-{}-*.{}".format(
+            glob.escape(options.output_path),
+            options.server.split('.')[0],
+            options.report_format
+        )
+    ))
+    if not checkpoints:
+        return None
+    return max(checkpoints, key=os.path.getmtime)[:-len(".checkpoint")]
 
+
+
+def load_checkpoint(filename):
+    """
+    Returns the IDs of all systems recorded in a checkpoint file.
+
+    :param filename: checkpoint filename
+    :type filename: str
+    """
+    completed = set()
     try:
-        with open(OUTPUT_FILE, 'w') as target:
-            target.write(json.dumps(SYSTEM_ERRATA))
+        with open(filename, "r") as checkpoint:
+            for line in checkpoint:
+                try:
+                    completed.add(json.loads(line))
+                except ValueError:
+                    #incomplete line of an interrupted run
+                    break
     except IOError as err:
+        LOGGER.error("Unable to read checkpoint: '%s'", err)
+    return completed
+
+
+
+def create_report(options):
+    """
+    Completes the report including errata information of all hosts. As
+    hosts have already been written while scanning, the temporary report
+    only needs to be finalized. If requested, the CVE index is created
+    from the completed report.
+    """
+
+    try:
+        REPORT_WRITER.close()
+        CHECKPOINT.close()
+        os.remove(CHECKPOINT.name)
+    except (IOError, OSError) as err:
         LOGGER.error("Unable to store report: '%s'", err)
-    else:
-        LOGGER.info("Report '%s' created.", OUTPUT_FILE)
+        return
+    LOGGER.info("Report '%s' created.", OUTPUT_FILE)
+
+    if options.cve_index:
+        index_file = get_cve_index_filename(OUTPUT_FILE)
+        try:
+            report = get_report_store(OUTPUT_FILE)
+            try:
+                index = CVEIndex.from_report(report)
+            finally:
+                report.close()
+            index.save(index_file)
+        except (IOError, OSError, ValueError) as err:
+            LOGGER.error("Unable to store CVE index: '%s'", err)
+        else:
+            LOGGER.info(
+                "CVE index '%s' created (%s CVEs).", index_file,
+                len(index.cves)
+            )
 
 
 
 def main(options, args):
     """Main function, starts the logic based on parameters."""
-    global SAT_CLIENT, OUTPUT_FILE
+    global SAT_CLIENT, OUTPUT_FILE, PREVIOUS_REPORT, REPORT_WRITER
+    global CHECKPOINT, COMPLETED_SYSTEMS
 
     LOGGER.debug("Options: %s", options)
     LOGGER.debug("Arguments: %s", args)
@@ -266,11 +508,25 @@ def main(options, args):
     options.output_path[len(options.output_path)-1:] != "/":
         #add trailing slash
         options.output_path = "{}/".format(options.output_path)
-    OUTPUT_FILE = "{}errata-snapshot-report-{}-{}.json".format(
+    OUTPUT_FILE = "{}errata-snapshot-report-{}-{}.{}".format(
         options.output_path,
         options.server.split('.')[0],
-        time.strftime("%Y%m%d-%H%M")
+        time.strftime("%Y%m%d-%H%M"),
+        options.report_format
     )
+    if options.resume:
+        interrupted = find_interrupted_report(options)
+        if interrupted:
+            OUTPUT_FILE = interrupted
+            COMPLETED_SYSTEMS = load_checkpoint(
+                get_checkpoint_filename(OUTPUT_FILE)
+            )
+            LOGGER.info(
+                "Resuming snapshot '%s' (%s systems already captured)",
+                OUTPUT_FILE, len(COMPLETED_SYSTEMS)
+            )
+        else:
+            LOGGER.info("No interrupted snapshot found, starting a new one")
     LOGGER.debug("Output file will be: '%s'", OUTPUT_FILE)
 
     #check if we can read and write before digging
@@ -282,15 +538,32 @@ def main(options, args):
         )
         SAT_CLIENT = ForemanAPIClient(
             LOG_LEVEL, options.server, sat_user,
-            sat_pass, options.ssl_verify
+            sat_pass, options.ssl_verify,
+            #one additional connection for prefetching host pages
+            pool_size=options.workers + 1
         )
 
         #validate filters
         validate_filters(options, SAT_CLIENT)
 
+        #load previous report for incremental snapshots
+        if options.since:
+            PREVIOUS_REPORT = options.since
+
         #scan systems and create report
+        REPORT_WRITER = ReportWriter(
+            OUTPUT_FILE, options.report_format,
+            resume=len(COMPLETED_SYSTEMS) > 0
+        )
+        CHECKPOINT = open(
+            get_checkpoint_filename(OUTPUT_FILE),
+            "a" if COMPLETED_SYSTEMS else "w"
+        )
+        LOGGER.debug(
+            "Systems are written to '%s' while scanning", REPORT_WRITER.spool
+        )
         scan_systems(options)
-        create_report()
+        create_report(options)
     else:
         LOGGER.error("Directory '%s' is not writable!", OUTPUT_FILE)
 
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Formats and backends for storing snapshot reports.
+"""
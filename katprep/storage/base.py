@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Base for creating snapshot report stores.
+"""
+
+from abc import abstractmethod
+from collections.abc import Mapping
+
+
+class BaseReportStore(Mapping):
+    """
+    Read-mostly access to a snapshot report. Stores behave like a
+    dictionary of host entries (``{"errata": [...], "params": {...},
+    "verification": {...}}``) by hostname. Host entries are decoded on
+    first access and cached afterwards.
+
+    Hosts can be excluded (e.g. by filters) without removing them from
+    the underlying report.
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor, opening a report.
+
+        :param filename: report filename
+        :type filename: str
+        """
+        self.filename = filename
+        self._hosts = {}
+        self._excluded = set()
+        self._overlay = {}
+
+    @abstractmethod
+    def _get_hostnames(self):
+        """
+        Returns the names of all hosts stored in the report as a sized
+        collection (e.g. dictionary keys), so that hosts can be counted
+        without copying their names.
+        """
+
+    @abstractmethod
+    def _load_host(self, host):
+        """
+        Decodes a host entry. Raises KeyError for unknown hosts.
+
+        :param host: hostname
+        :type host: str
+        """
+
+    @abstractmethod
+    def set_verification(self, host, setting, value):
+        """
+        Sets a verification value for a particular host.
+
+        :param host: hostname
+        :type host: str
+        :param setting: setting name
+        :type setting: str
+        :param value: setting value
+        :type value: str
+        """
+
+    @abstractmethod
+    def save(self):
+        """
+        Stores changes (such as verification values) in the report.
+        """
+
+    def close(self):
+        """
+        Releases resources held by the store.
+        """
+
+    def __getitem__(self, host):
+        if host in self._excluded:
+            raise KeyError(host)
+        if host not in self._hosts:
+            entry = self._load_host(host)
+            if host in self._overlay:
+                entry = dict(entry)
+                entry["verification"] = dict(
+                    entry.get("verification") or {}, **self._overlay[host]
+                )
+            self._hosts[host] = entry
+        return self._hosts[host]
+
+    def __iter__(self):
+        for host in self._get_hostnames():
+            if host not in self._excluded:
+                yield host
+
+    def __len__(self):
+        hostnames = self._get_hostnames()
+        return len(hostnames) - len(
+            [host for host in self._excluded if host in hostnames]
+        )
+
+    def __str__(self):
+        return str(self.filename)
+
+    def __fspath__(self):
+        return self.filename
+
+    def exclude(self, host):
+        """
+        Hides a host from iteration and lookups. The host is still kept
+        when saving the report.
+
+        :param host: hostname
+        :type host: str
+        """
+        self._excluded.add(host)
+        self._hosts.pop(host, None)
+
+    def overlay_verification(self, host, setting, value):
+        """
+        Sets a verification value for a particular host without changing
+        the report (e.g. values of a verification journal).
+
+        :param host: hostname
+        :type host: str
+        :param setting: setting name
+        :type setting: str
+        :param value: setting value
+        :type value: str
+        """
+        self._overlay.setdefault(host, {})[setting] = value
+        if host in self._hosts:
+            self._hosts[host].setdefault("verification", {})[setting] = value
+
+    def release(self, host):
+        """
+        Drops the decoded entry of a host from the cache, e.g. after it has
+        been processed.
+
+        :param host: hostname
+        :type host: str
+        """
+        self._hosts.pop(host, None)
+
+    def get_summary(self, host):
+        """
+        Returns the parameters used for filtering hosts (organization,
+        location and environment name) of a particular host.
+
+        :param host: hostname
+        :type host: str
+        """
+        params = self.get_params(host)
+        return {
+            key: params.get(key, "") for key in
+            ("organization_name", "location_name", "environment_name")
+        }
+
+    def get_params(self, host):
+        """
+        Returns the parameters of a particular host.
+
+        :param host: hostname
+        :type host: str
+        """
+        return self[host]["params"]
+
+    def get_errata(self, host):
+        """
+        Returns the errata of a particular host.
+
+        :param host: hostname
+        :type host: str
+        """
+        return self[host]["errata"]
+
+    def get_verification(self, host):
+        """
+        Returns the verification values of a particular host.
+
+        :param host: hostname
+        :type host: str
+        """
+        return self[host]["verification"]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot report format with a deduplicated errata catalog.
+
+Legacy snapshot reports store the full erratum object under every host::
+
+    {"host": {"errata": [{...}], "params": {...}, "verification": {...}}}
+
+Reports of version 2 store every erratum only once in a top-level catalog
+and hosts only reference errata by their ID::
+
+    {
+        "katprep_report": 2,
+        "errata": {"RHSA-...": {...}},
+        "hosts": {"host": {"errata": ["RHSA-..."], "params": {...}, ...}}
+    }
+
+If a host's erratum differs from the catalog entry (e.g. host-specific
+flags), the reference is a dictionary containing the ``errata_id``, the
+differing keys and the keys missing in the host's erratum (``_removed``)::
+
+    {"errata_id": "RHSA-...", "_removed": ["reboot_suggested"]}
+"""
+
+import logging
+
+LOGGER = logging.getLogger('katprep_storage')
+"""
+logging: Logger instance
+"""
+REPORT_VERSION = 2
+"""
+int: Report format version using an errata catalog
+"""
+VERSION_KEY = "katprep_report"
+"""
+str: Top-level key containing the report format version
+"""
+REMOVED_KEY = "_removed"
+"""
+str: Reference key listing catalog keys missing in a host's erratum
+"""
+
+
+def is_catalog_report(data):
+    """
+    Returns whether parsed report data uses the errata catalog format.
+
+    :param data: parsed report data
+    :type data: dict
+    """
+    return isinstance(data, dict) and VERSION_KEY in data
+
+
+def pack_host(entry, catalog):
+    """
+    Converts a legacy host entry into a host entry referencing errata by
+    their ID. Previously unknown errata are added to the catalog.
+
+    :param entry: legacy host entry
+    :type entry: dict
+    :param catalog: errata catalog by errata ID
+    :type catalog: dict
+    """
+    packed = dict(entry)
+    references = []
+    for erratum in entry.get("errata") or []:
+        errata_id = erratum["errata_id"]
+        if errata_id not in catalog:
+            catalog[errata_id] = erratum
+        if catalog[errata_id] == erratum:
+            references.append(errata_id)
+        else:
+            #store host-specific differences only
+            reference = {
+                key: value for key, value in erratum.items()
+                if key not in catalog[errata_id] or
+                catalog[errata_id][key] != value
+            }
+            reference["errata_id"] = errata_id
+            removed = sorted(
+                key for key in catalog[errata_id] if key not in erratum
+            )
+            if removed:
+                reference[REMOVED_KEY] = removed
+            references.append(reference)
+    packed["errata"] = references
+    return packed
+
+
+def apply_reference(erratum, reference):
+    """
+    Returns a copy of a catalog erratum with the host-specific differences
+    of an errata reference applied.
+
+    :param erratum: catalog erratum
+    :type erratum: dict
+    :param reference: errata reference containing differences
+    :type reference: dict
+    """
+    erratum = dict(erratum)
+    erratum.update(reference)
+    for key in erratum.pop(REMOVED_KEY, []):
+        erratum.pop(key, None)
+    return erratum
+
+
+
+def unpack_host(entry, catalog):
+    """
+    Converts a host entry referencing errata by their ID into a legacy host
+    entry. Errata without host-specific differences share the catalog
+    objects.
+
+    :param entry: host entry referencing errata
+    :type entry: dict
+    :param catalog: errata catalog by errata ID
+    :type catalog: dict
+    """
+    unpacked = dict(entry)
+    errata = []
+    for reference in entry.get("errata") or []:
+        try:
+            if isinstance(reference, dict):
+                erratum = apply_reference(
+                    catalog[reference["errata_id"]], reference
+                )
+            else:
+                erratum = catalog[reference]
+        except KeyError as err:
+            LOGGER.error("Erratum %s missing in errata catalog", err)
+            continue
+        errata.append(erratum)
+    unpacked["errata"] = errata
+    return unpacked
+
+
+def pack_report(report):
+    """
+    Converts legacy report data into the errata catalog format.
+
+    :param report: legacy report data by hostname
+    :type report: dict
+    """
+    catalog = {}
+    hosts = {}
+    for host in report:
+        hosts[host] = pack_host(report[host], catalog)
+    return {VERSION_KEY: REPORT_VERSION, "errata": catalog, "hosts": hosts}
+
+
+def unpack_report(data):
+    """
+    Returns report data by hostname in the legacy format. Reports that
+    already use the legacy format are returned unchanged.
+
+    :param data: parsed report data
+    :type data: dict
+    """
+    if not is_catalog_report(data):
+        return data
+    catalog = data.get("errata", {})
+    return {
+        host: unpack_host(entry, catalog)
+        for host, entry in data.get("hosts", {}).items()
+    }
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Inverted CVE index stored alongside snapshot reports.
+
+The index maps CVE IDs to the errata fixing them and the hosts these
+errata are outstanding for::
+
+    {
+        "katprep_cve_index": 1,
+        "hosts": ["web01.example.com", ...],
+        "cves": {"CVE-2017-0001": {"RHSA-2017:0001": [0, ...]}}
+    }
+
+Hosts are referenced by their position within ``hosts``.
+"""
+
+import json
+import os
+
+INDEX_VERSION = 1
+"""
+int: CVE index format version
+"""
+VERSION_KEY = "katprep_cve_index"
+"""
+str: Top-level key containing the index format version
+"""
+
+
+def get_cve_index_filename(filename):
+    """
+    Returns the CVE index filename of a snapshot report.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    return "{}.cves.json".format(os.path.splitext(filename)[0])
+
+
+
+def get_erratum_cves(erratum):
+    """
+    Returns the CVE IDs of an erratum. Katello lists CVEs as dictionaries
+    (``{"cve_id": ..., "href": ...}``), plain strings are accepted as well.
+
+    :param erratum: erratum
+    :type erratum: dict
+    """
+    cves = []
+    for cve in erratum.get("cves") or []:
+        if isinstance(cve, dict):
+            cve = cve.get("cve_id")
+        if cve:
+            cves.append(cve.upper())
+    return cves
+
+
+
+class CVEIndex(object):
+    """
+.. class:: CVEIndex
+    Inverted index of CVEs, errata and hosts.
+
+    :param data: index data as stored on disk
+    :type data: dict
+    """
+
+    def __init__(self, data=None):
+        """
+        Constructor, creating an empty index or loading index data.
+        """
+        self.hosts = []
+        self.cves = {}
+        self._host_index = {}
+        if data is not None:
+            if data.get(VERSION_KEY) != INDEX_VERSION:
+                raise ValueError("Unsupported CVE index version")
+            self.hosts = data["hosts"]
+            self.cves = data["cves"]
+            self._host_index = dict(
+                (host, i) for i, host in enumerate(self.hosts)
+            )
+
+    @classmethod
+    def from_report(cls, report, release=True):
+        """
+        Creates the index of a snapshot report.
+
+        :param report: snapshot report
+        :type report: ReportStore
+        :param release: drops decoded hosts from the report once added
+        :type release: bool
+        """
+        index = cls()
+        for host in report:
+            index.add_host(host, report[host]["errata"])
+            if release:
+                report.release(host)
+        return index
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads an index file.
+
+        :param filename: index filename
+        :type filename: str
+        """
+        with open(filename, "r") as index_file:
+            return cls(json.load(index_file))
+
+    def add_host(self, host, errata):
+        """
+        Adds the outstanding errata of a host.
+
+        :param host: hostname
+        :type host: str
+        :param errata: errata
+        :type errata: list
+        """
+        host_id = self._host_index.get(host)
+        if host_id is None:
+            host_id = self._host_index[host] = len(self.hosts)
+            self.hosts.append(host)
+        for erratum in errata:
+            for cve in get_erratum_cves(erratum):
+                hosts = self.cves.setdefault(cve, {}).setdefault(
+                    erratum["errata_id"], []
+                )
+                if not hosts or hosts[-1] != host_id:
+                    hosts.append(host_id)
+
+    def lookup(self, cve):
+        """
+        Returns the errata fixing a CVE along with the hosts they are
+        outstanding for.
+
+        :param cve: CVE ID (e.g. CVE-2017-0001)
+        :type cve: str
+        """
+        return dict(
+            (erratum, [self.hosts[x] for x in hosts])
+            for erratum, hosts in self.cves.get(cve.upper(), {}).items()
+        )
+
+    def save(self, filename):
+        """
+        Writes the index.
+
+        :param filename: index filename
+        :type filename: str
+        """
+        tmp_file = "{}.tmp".format(filename)
+        with open(tmp_file, "w") as index_file:
+            json.dump({
+                VERSION_KEY: INDEX_VERSION, "hosts": self.hosts,
+                "cves": self.cves
+            }, index_file)
+        os.replace(tmp_file, filename)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only journal of verification values.
+
+Instead of rewriting the snapshot report for every verification value,
+values are appended to a journal next to the report (``<report>.journal``),
+one JSON document per line::
+
+    {"host": "web01.example.com", "setting": "virt_snapshot", "value": true}
+
+Lines are flushed immediately and synced to disk in batches. Reports are
+opened with the journal applied on top of them, the journal is merged into
+the report once maintenance tasks have finished. As the report is replaced
+atomically before the journal is removed, an interrupted merge is simply
+repeated the next time.
+"""
+
+import json
+import logging
+import os
+
+LOGGER = logging.getLogger('katprep_storage')
+"""
+logging: Logger instance
+"""
+SYNC_INTERVAL = 50
+"""
+int: Number of journal entries written before syncing to disk
+"""
+
+
+def get_journal_filename(filename):
+    """
+    Returns the name of the verification journal of a report.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    return "{}.journal".format(filename)
+
+
+
+def read_journal(filename):
+    """
+    Reads a journal and yields hostname, setting and value of every entry.
+    An incomplete last line (e.g. of an interrupted run) is ignored.
+
+    :param filename: journal filename
+    :type filename: str
+    """
+    with open(filename, "rb") as journal_file:
+        for line in journal_file:
+            try:
+                entry = json.loads(line.decode("utf-8"))
+                yield (entry["host"], entry["setting"], entry["value"])
+            except (ValueError, KeyError, TypeError):
+                LOGGER.debug("Ignoring invalid journal line '%s'", line)
+                break
+
+
+
+def apply_journal(report):
+    """
+    Applies the journal of a report (if any) on top of the report without
+    changing the report file.
+
+    :param report: snapshot report
+    :type report: BaseReportStore
+    """
+    journal_file = get_journal_filename(report.filename)
+    if not os.path.isfile(journal_file):
+        return
+    LOGGER.debug("Applying verification journal '%s'", journal_file)
+    for (host, setting, value) in read_journal(journal_file):
+        report.overlay_verification(host, setting, value)
+
+
+
+def merge_journal(report):
+    """
+    Merges the journal of a report (if any) into the report and removes
+    the journal afterwards. The modification time of the report is kept as
+    it dates snapshots and downtimes. Returns the number of merged entries.
+
+    :param report: snapshot report
+    :type report: BaseReportStore
+    """
+    journal_file = get_journal_filename(report.filename)
+    if not os.path.isfile(journal_file):
+        return 0
+    stat = os.stat(report.filename)
+    entries = 0
+    for (host, setting, value) in read_journal(journal_file):
+        try:
+            report.set_verification(host, setting, value)
+            entries = entries + 1
+        except KeyError:
+            LOGGER.warning(
+                "Ignoring verification value of unknown host '%s'", host
+            )
+    report.save()
+    os.utime(report.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.remove(journal_file)
+    LOGGER.debug("Merged %s verification values into report", entries)
+    return entries
+
+
+
+class VerificationJournal(object):
+    """
+.. class:: VerificationJournal
+    Appends verification values to the journal of a report. The journal
+    file is created on first use.
+    """
+
+    def __init__(self, filename, sync_interval=SYNC_INTERVAL):
+        """
+        Constructor, creating a journal writer.
+
+        :param filename: report filename
+        :type filename: str
+        :param sync_interval: number of entries written before syncing
+        :type sync_interval: int
+        """
+        self.filename = get_journal_filename(filename)
+        self.sync_interval = sync_interval
+        self._journal = None
+        self._pending = 0
+
+    def record(self, host, setting, value):
+        """
+        Appends a verification value.
+
+        :param host: hostname
+        :type host: str
+        :param setting: setting name
+        :type setting: str
+        :param value: setting value
+        :type value: str
+        """
+        if self._journal is None:
+            self._journal = open(self.filename, "ab")
+        self._journal.write("{}\n".format(json.dumps({
+            "host": host, "setting": setting, "value": value
+        })).encode("utf-8"))
+        self._journal.flush()
+        self._pending = self._pending + 1
+        if self._pending >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Syncs written entries to disk.
+        """
+        if self._journal is not None and self._pending:
+            os.fsync(self._journal.fileno())
+            self._pending = 0
+
+    def close(self):
+        """
+        Syncs and closes the journal.
+        """
+        if self._journal is not None:
+            self.sync()
+            self._journal.close()
+            self._journal = None
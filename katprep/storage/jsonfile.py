@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot reports stored as a single JSON document.
+"""
+
+import json
+import os
+
+from .base import BaseReportStore
+from .catalog import (REPORT_VERSION, VERSION_KEY, is_catalog_report,
+pack_report, unpack_host)
+from .jsonl import scan_lines
+
+
+class ReportStore(BaseReportStore):
+    """
+    Snapshot report stored as a single JSON document, either in the legacy
+    or the errata catalog format. The document is parsed once when opening
+    the store, hosts are decoded lazily.
+
+.. class:: ReportStore
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor, parsing the report. Raises IOError if the file can't
+        be read and ValueError if it isn't valid JSON.
+
+        :param filename: report filename
+        :type filename: str
+        """
+        super().__init__(filename)
+        with open(filename, "r") as json_file:
+            data = json.load(json_file)
+        if is_catalog_report(data):
+            self._raw = data["hosts"]
+            self._catalog = data["errata"]
+        else:
+            self._raw = data
+            self._catalog = None
+
+    def _get_hostnames(self):
+        return self._raw.keys()
+
+    def _load_host(self, host):
+        if self._catalog is None:
+            return self._raw[host]
+        return unpack_host(self._raw[host], self._catalog)
+
+    def set_verification(self, host, setting, value):
+        self._raw[host].setdefault("verification", {})[setting] = value
+        if host in self._hosts:
+            self._hosts[host]["verification"][setting] = value
+
+    def save(self):
+        if self._catalog is None:
+            #convert legacy reports once
+            data = pack_report(self._raw)
+            self._raw = data["hosts"]
+            self._catalog = data["errata"]
+        else:
+            data = {VERSION_KEY: REPORT_VERSION, "errata": self._catalog,
+                    "hosts": self._raw}
+        #replace the report atomically
+        with open("{}.tmp".format(self.filename), "w") as target:
+            target.write(json.dumps(data))
+        os.replace("{}.tmp".format(self.filename), self.filename)
+
+
+def write_json_report(source, filename):
+    """
+    Converts a JSON lines report into a single JSON document in the errata
+    catalog format. Hosts are copied line by line, so only the errata
+    catalog is kept in memory.
+
+    :param source: JSON lines report filename
+    :type source: str
+    :param filename: JSON report filename
+    :type filename: str
+    """
+    catalog = {}
+    with open(filename, "w") as target:
+        target.write('{{"{}": {}, "hosts": {{'.format(
+            VERSION_KEY, REPORT_VERSION
+        ))
+        separator = ""
+        for (_, _, line) in scan_lines(source):
+            if "erratum" in line:
+                catalog[line["erratum"]["errata_id"]] = line["erratum"]
+            elif "host" in line:
+                target.write("{}{}: {}".format(
+                    separator, json.dumps(line["host"]),
+                    json.dumps(line["entry"])
+                ))
+                separator = ", "
+        target.write('}}, "errata": {}}}'.format(json.dumps(catalog)))
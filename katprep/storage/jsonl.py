@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot reports stored as JSON lines with a byte-offset host index.
+
+The report file starts with a header line followed by one line per
+erratum and host::
+
+    {"katprep_report": 2, "format": "jsonl"}
+    {"erratum": {"errata_id": "RHSA-...", ...}}
+    {"host": "web01.example.com", "entry": {"errata": ["RHSA-..."], ...}}
+
+Errata are written before the first host referencing them, so that every
+prefix of the file is a self-contained report. A sidecar index
+(``<report>.idx``) maps hosts and errata to the byte offset and length of
+their lines. Hosts also carry the parameters needed for filtering, so
+that filtering doesn't require decoding hosts.
+"""
+
+import json
+import logging
+import mmap
+import os
+
+from .base import BaseReportStore
+from .catalog import REPORT_VERSION, VERSION_KEY, pack_host, unpack_host
+
+LOGGER = logging.getLogger('katprep_storage')
+"""
+logging: Logger instance
+"""
+FORMAT_NAME = "jsonl"
+"""
+str: Format name stored in the report header
+"""
+FILTER_PARAMS = ("organization_name", "location_name", "environment_name")
+"""
+tuple: Host parameters stored in the index for filtering
+"""
+
+
+def get_index_filename(filename):
+    """
+    Returns the name of the sidecar index of a report.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    return "{}.idx".format(filename)
+
+
+def is_jsonl_report(filename):
+    """
+    Returns whether a file is a JSON lines snapshot report by checking the
+    header line.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    try:
+        with open(filename, "rb") as report_file:
+            header = json.loads(report_file.readline().decode("utf-8"))
+        return header.get("format") == FORMAT_NAME
+    except (IOError, ValueError, AttributeError):
+        return False
+
+
+class JSONLReportWriter:
+    """
+    Writes a JSON lines snapshot report host by host. Every host is
+    flushed to disk as soon as it has been added, the index is written
+    when closing the writer.
+
+.. class:: JSONLReportWriter
+    """
+
+    def __init__(self, filename, mode="wb"):
+        """
+        Constructor, creating the report file and writing the header.
+
+        :param filename: report filename
+        :type filename: str
+        :param mode: file mode, use "r+b" to continue an existing report
+        :type mode: str
+        """
+        self.filename = filename
+        self._target = open(filename, mode)
+        self._target.seek(0, os.SEEK_END)
+        self._index = {"hosts": {}, "errata": {}}
+        self._catalog = {}
+        if self._target.tell() == 0:
+            self._write_line({VERSION_KEY: REPORT_VERSION, "format": FORMAT_NAME})
+        else:
+            #continue an existing report, dropping incomplete lines
+            with open(filename, "rb") as report_file:
+                valid_end = len(report_file.readline())
+            for (offset, length, line) in scan_lines(filename):
+                self._register_line(offset, length, line)
+                valid_end = offset + length
+            self._target.truncate(valid_end)
+            #truncating doesn't move the position new lines are indexed at
+            self._target.seek(valid_end)
+
+    def _write_line(self, data):
+        """
+        Writes a line and returns its byte offset and length.
+
+        :param data: line content
+        :type data: dict
+        """
+        line = "{}\n".format(json.dumps(data)).encode("utf-8")
+        offset = self._target.tell()
+        self._target.write(line)
+        return (offset, len(line))
+
+    def _register_line(self, offset, length, line):
+        """
+        Adds a line of an existing report to the index.
+
+        :param offset: byte offset of the line
+        :type offset: int
+        :param length: length of the line in bytes
+        :type length: int
+        :param line: decoded line
+        :type line: dict
+        """
+        if "erratum" in line:
+            errata_id = line["erratum"]["errata_id"]
+            self._catalog[errata_id] = line["erratum"]
+            self._index["errata"][errata_id] = [offset, length]
+        elif "host" in line:
+            self._index["hosts"][line["host"]] = \
+                [offset, length, get_filter_params(line["entry"])]
+
+    def add_host(self, host, entry):
+        """
+        Adds a host entry in the legacy format to the report.
+
+        :param host: hostname
+        :type host: str
+        :param entry: host entry
+        :type entry: dict
+        """
+        catalog = dict(self._catalog)
+        packed = pack_host(entry, catalog)
+        for errata_id in catalog:
+            if errata_id not in self._catalog:
+                #write errata before the first host referencing them
+                self._catalog[errata_id] = catalog[errata_id]
+                self._index["errata"][errata_id] = list(
+                    self._write_line({"erratum": catalog[errata_id]})
+                )
+        (offset, length) = self._write_line({"host": host, "entry": packed})
+        self._index["hosts"][host] = [offset, length, get_filter_params(packed)]
+        self._target.flush()
+
+    def get_hostnames(self):
+        """
+        Returns the names of all hosts written so far.
+        """
+        return list(self._index["hosts"].keys())
+
+    def has_host(self, host):
+        """
+        Returns whether a host has already been written.
+
+        :param host: hostname
+        :type host: str
+        """
+        return host in self._index["hosts"]
+
+    def close(self):
+        """
+        Closes the report and writes the index.
+        """
+        self._target.close()
+        write_index(self.filename, self._index)
+
+
+def get_filter_params(entry):
+    """
+    Returns the host parameters that are stored in the index.
+
+    :param entry: host entry
+    :type entry: dict
+    """
+    params = entry.get("params", {})
+    return {key: params.get(key, "") for key in FILTER_PARAMS}
+
+
+def scan_lines(filename):
+    """
+    Reads a JSON lines report line by line and yields the byte offset,
+    length and content of every erratum and host line.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    with open(filename, "rb") as report_file:
+        offset = 0
+        for line in report_file:
+            try:
+                data = json.loads(line.decode("utf-8"))
+            except ValueError:
+                #incomplete line of an interrupted run
+                LOGGER.debug("Ignoring invalid line at offset %s", offset)
+                break
+            if VERSION_KEY not in data:
+                yield (offset, len(line), data)
+            offset = offset + len(line)
+
+
+def write_index(filename, index):
+    """
+    Writes the sidecar index of a report.
+
+    :param filename: report filename
+    :type filename: str
+    :param index: index data
+    :type index: dict
+    """
+    index_file = get_index_filename(filename)
+    with open("{}.tmp".format(index_file), "w") as target:
+        target.write(json.dumps(index))
+    os.replace("{}.tmp".format(index_file), index_file)
+
+
+class JSONLReportStore(BaseReportStore):
+    """
+    Snapshot report stored as JSON lines. The report is memory-mapped,
+    only hosts (and errata) that are actually accessed get decoded.
+
+.. class:: JSONLReportStore
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor, opening the report and loading its index. If the
+        index is missing or outdated, it is rebuilt.
+
+        :param filename: report filename
+        :type filename: str
+        """
+        super().__init__(filename)
+        self._catalog = {}
+        self._changed = {}
+        self._index = self._load_index()
+        with open(filename, "rb") as report_file:
+            self._map = mmap.mmap(
+                report_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+    def _load_index(self):
+        """
+        Loads the sidecar index or rebuilds it by scanning the report.
+        """
+        index_file = get_index_filename(self.filename)
+        try:
+            if os.path.getmtime(index_file) >= os.path.getmtime(self.filename):
+                with open(index_file, "r") as json_file:
+                    return json.load(json_file)
+        except (IOError, OSError, ValueError) as err:
+            LOGGER.debug("Unable to load index: '%s'", err)
+        LOGGER.info("Rebuilding index for report '%s'", self.filename)
+        index = {"hosts": {}, "errata": {}}
+        for (offset, length, line) in scan_lines(self.filename):
+            if "erratum" in line:
+                index["errata"][line["erratum"]["errata_id"]] = [offset, length]
+            elif "host" in line:
+                index["hosts"][line["host"]] = \
+                    [offset, length, get_filter_params(line["entry"])]
+        try:
+            write_index(self.filename, index)
+        except (IOError, OSError) as err:
+            LOGGER.debug("Unable to store index: '%s'", err)
+        return index
+
+    def _read_line(self, position):
+        """
+        Decodes a line referenced by the index.
+
+        :param position: index entry (offset, length, ...)
+        :type position: list
+        """
+        (offset, length) = position[0:2]
+        return json.loads(self._map[offset:offset+length].decode("utf-8"))
+
+    def _get_erratum(self, errata_id):
+        """
+        Returns an erratum from the report, decoding it on first access.
+
+        :param errata_id: erratum ID
+        :type errata_id: str
+        """
+        if errata_id not in self._catalog:
+            self._catalog[errata_id] = self._read_line(
+                self._index["errata"][errata_id]
+            )["erratum"]
+        return self._catalog[errata_id]
+
+    def _get_packed_host(self, host):
+        """
+        Returns a host entry referencing errata by their ID.
+
+        :param host: hostname
+        :type host: str
+        """
+        if host in self._changed:
+            return self._changed[host]
+        return self._read_line(self._index["hosts"][host])["entry"]
+
+    def _get_hostnames(self):
+        return self._index["hosts"].keys()
+
+    def _load_host(self, host):
+        return self._unpack(self._get_packed_host(host))
+
+    def get_summary(self, host):
+        if host in self._excluded:
+            raise KeyError(host)
+        return dict(self._index["hosts"][host][2])
+
+    def set_verification(self, host, setting, value):
+        packed = self._get_packed_host(host)
+        packed.setdefault("verification", {})[setting] = value
+        self._changed[host] = packed
+        if host in self._hosts:
+            self._hosts[host]["verification"][setting] = value
+
+    def save(self):
+        if not self._changed:
+            return
+        #rewrite the report, replacing changed hosts
+        writer = JSONLReportWriter("{}.tmp".format(self.filename))
+        for host in self._get_hostnames():
+            packed = self._get_packed_host(host)
+            writer.add_host(host, self._unpack(packed))
+        writer.close()
+        self._map.close()
+        os.replace(writer.filename, self.filename)
+        os.replace(
+            get_index_filename(writer.filename),
+            get_index_filename(self.filename)
+        )
+        self._changed = {}
+        self._index = self._load_index()
+        with open(self.filename, "rb") as report_file:
+            self._map = mmap.mmap(
+                report_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+    def _unpack(self, packed):
+        """
+        Returns a legacy host entry, decoding referenced errata.
+
+        :param packed: host entry referencing errata by their ID
+        :type packed: dict
+        """
+        for reference in packed.get("errata") or []:
+            if isinstance(reference, dict):
+                reference = reference["errata_id"]
+            try:
+                self._get_erratum(reference)
+            except KeyError:
+                #reported by unpack_host
+                pass
+        return unpack_host(packed, self._catalog)
+
+    def close(self):
+        self._map.close()
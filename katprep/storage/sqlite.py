@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot reports stored as SQLite database.
+
+Hosts, their parameters, errata and verification values are stored in
+separate tables::
+
+    meta          (key, value)
+    hosts         (id, name, organization, location, environment)
+    params        (host_id, name, value)
+    errata        (id, errata_id, data)
+    host_errata   (host_id, position, erratum_id, overrides)
+    verification  (host_id, name, value)
+
+Values, errata and host-specific errata differences (see
+:mod:`katprep.storage.catalog`) are stored as JSON. Hosts are indexed by
+name, organization, location and environment and errata by their ID, so
+that filtering and lookups don't require decoding hosts. Verification
+values are updated row by row instead of rewriting the whole report.
+"""
+
+import json
+import logging
+import sqlite3
+
+from .base import BaseReportStore
+from .catalog import REPORT_VERSION, VERSION_KEY, apply_reference
+from .jsonl import FILTER_PARAMS, scan_lines
+
+LOGGER = logging.getLogger('katprep_storage')
+"""
+logging: Logger instance
+"""
+FORMAT_NAME = "sqlite"
+"""
+str: Format name stored in the report metadata
+"""
+SQLITE_HEADER = b"SQLite format 3\x00"
+"""
+bytes: Header of SQLite database files
+"""
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE hosts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    organization TEXT,
+    location TEXT,
+    environment TEXT
+);
+CREATE TABLE params (
+    host_id INTEGER NOT NULL REFERENCES hosts(id),
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (host_id, name)
+);
+CREATE TABLE errata (
+    id INTEGER PRIMARY KEY,
+    errata_id TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE host_errata (
+    host_id INTEGER NOT NULL REFERENCES hosts(id),
+    position INTEGER NOT NULL,
+    erratum_id INTEGER NOT NULL REFERENCES errata(id),
+    overrides TEXT,
+    PRIMARY KEY (host_id, position)
+);
+CREATE TABLE verification (
+    host_id INTEGER NOT NULL REFERENCES hosts(id),
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (host_id, name)
+);
+CREATE INDEX hosts_organization ON hosts (organization);
+CREATE INDEX hosts_location ON hosts (location);
+CREATE INDEX hosts_environment ON hosts (environment);
+CREATE INDEX host_errata_erratum ON host_errata (erratum_id);
+"""
+"""
+str: Database schema
+"""
+
+
+def is_sqlite_report(filename):
+    """
+    Returns whether a file is a SQLite database by checking the file
+    header.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    try:
+        with open(filename, "rb") as report_file:
+            return report_file.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except (IOError, OSError):
+        return False
+
+
+
+def write_sqlite_report(source, filename):
+    """
+    Converts a JSON lines report into a SQLite report. Errata and hosts are
+    copied line by line within a single transaction.
+
+    :param source: JSON lines report filename
+    :type source: str
+    :param filename: SQLite report filename (must not exist)
+    :type filename: str
+    """
+    connection = sqlite3.connect(filename)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [(VERSION_KEY, str(REPORT_VERSION)), ("format", FORMAT_NAME)]
+            )
+            errata = {}
+            for (_, _, line) in scan_lines(source):
+                if "erratum" in line:
+                    cursor = connection.execute(
+                        "INSERT INTO errata (errata_id, data) VALUES (?, ?)",
+                        (line["erratum"]["errata_id"],
+                         json.dumps(line["erratum"]))
+                    )
+                    errata[line["erratum"]["errata_id"]] = cursor.lastrowid
+                elif "host" in line:
+                    _insert_host(connection, line["host"], line["entry"], errata)
+    finally:
+        connection.close()
+
+
+
+def _insert_host(connection, host, entry, errata):
+    """
+    Inserts a host entry referencing errata by their ID.
+
+    :param connection: database connection
+    :type connection: sqlite3.Connection
+    :param host: hostname
+    :type host: str
+    :param entry: host entry referencing errata
+    :type entry: dict
+    :param errata: database IDs by erratum ID
+    :type errata: dict
+    """
+    params = entry.get("params", {})
+    host_id = connection.execute(
+        "INSERT INTO hosts (name, organization, location, environment) "
+        "VALUES (?, ?, ?, ?)",
+        [host] + [params.get(key, "") for key in FILTER_PARAMS]
+    ).lastrowid
+    connection.executemany(
+        "INSERT INTO params (host_id, name, value) VALUES (?, ?, ?)",
+        [(host_id, key, json.dumps(value)) for key, value in params.items()]
+    )
+    rows = []
+    for reference in entry.get("errata") or []:
+        if isinstance(reference, dict):
+            errata_id = reference["errata_id"]
+            overrides = json.dumps(reference)
+        else:
+            errata_id = reference
+            overrides = None
+        if errata_id not in errata:
+            LOGGER.error("Erratum %s missing in errata catalog", errata_id)
+            continue
+        rows.append((host_id, len(rows), errata[errata_id], overrides))
+    connection.executemany(
+        "INSERT INTO host_errata (host_id, position, erratum_id, overrides) "
+        "VALUES (?, ?, ?, ?)", rows
+    )
+    connection.executemany(
+        "INSERT INTO verification (host_id, name, value) VALUES (?, ?, ?)",
+        [(host_id, key, json.dumps(value)) for key, value in
+         (entry.get("verification") or {}).items()]
+    )
+
+
+
+class SQLiteReportStore(BaseReportStore):
+    """
+    Snapshot report stored as SQLite database. Only hosts (and errata) that
+    are actually accessed get decoded. Verification values are written as
+    single rows and committed when saving the report.
+
+.. class:: SQLiteReportStore
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor, opening the database. Raises ValueError if the file
+        isn't a SQLite snapshot report.
+
+        :param filename: report filename
+        :type filename: str
+        """
+        super().__init__(filename)
+        self._catalog = {}
+        self._connection = sqlite3.connect(filename)
+        try:
+            meta = dict(self._connection.execute(
+                "SELECT key, value FROM meta"
+            ))
+            if meta.get("format") != FORMAT_NAME:
+                raise ValueError("Not a SQLite snapshot report")
+            self._ids = dict(
+                (name, host_id) for host_id, name in self._connection.execute(
+                    "SELECT id, name FROM hosts ORDER BY id"
+                )
+            )
+        except sqlite3.DatabaseError as err:
+            self._connection.close()
+            raise ValueError(err)
+        except ValueError:
+            self._connection.close()
+            raise
+
+    def _get_hostnames(self):
+        return self._ids.keys()
+
+    def _load_host(self, host):
+        host_id = self._ids[host]
+        errata = []
+        for errata_id, data, overrides in self._connection.execute(
+                "SELECT errata.errata_id, errata.data, host_errata.overrides "
+                "FROM host_errata JOIN errata "
+                "ON errata.id = host_errata.erratum_id "
+                "WHERE host_errata.host_id = ? ORDER BY host_errata.position",
+                (host_id,)):
+            if errata_id not in self._catalog:
+                self._catalog[errata_id] = json.loads(data)
+            erratum = self._catalog[errata_id]
+            if overrides is not None:
+                erratum = apply_reference(erratum, json.loads(overrides))
+            errata.append(erratum)
+        return {
+            "errata": errata,
+            "params": self.__get_values("params", host_id),
+            "verification": self.__get_values("verification", host_id),
+        }
+
+    def __get_values(self, table, host_id):
+        """
+        Returns the parameters or verification values of a host.
+
+        :param table: table name (params, verification)
+        :type table: str
+        :param host_id: host database ID
+        :type host_id: int
+        """
+        return dict(
+            (name, json.loads(value)) for name, value in
+            self._connection.execute(
+                "SELECT name, value FROM {} WHERE host_id = ?".format(table),
+                (host_id,)
+            )
+        )
+
+    def get_summary(self, host):
+        if host in self._excluded:
+            raise KeyError(host)
+        row = self._connection.execute(
+            "SELECT organization, location, environment FROM hosts "
+            "WHERE id = ?", (self._ids[host],)
+        ).fetchone()
+        return dict(zip(FILTER_PARAMS, row))
+
+    def set_verification(self, host, setting, value):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO verification (host_id, name, value) "
+            "VALUES (?, ?, ?)", (self._ids[host], setting, json.dumps(value))
+        )
+        if host in self._hosts:
+            self._hosts[host]["verification"][setting] = value
+
+    def save(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
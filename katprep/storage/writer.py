@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming writer for snapshot reports.
+"""
+
+import logging
+import os
+
+from .jsonfile import write_json_report
+from .jsonl import JSONLReportWriter, get_index_filename
+from .sqlite import write_sqlite_report
+
+LOGGER = logging.getLogger('katprep_storage')
+"""
+logging: Logger instance
+"""
+
+
+def get_spool_filename(filename):
+    """
+    Returns the name of the temporary file a report is written to until it
+    is complete.
+
+    :param filename: report filename
+    :type filename: str
+    """
+    return "{}.part".format(filename)
+
+
+class ReportWriter:
+    """
+    Writes snapshot reports host by host with constant memory usage.
+    Hosts are appended to a temporary JSON lines report (``<report>.part``)
+    as soon as they have been added. This file can be inspected with all
+    katprep utilities while the snapshot is still running. When closing
+    the writer, the report is converted into the requested format and
+    renamed atomically.
+
+.. class:: ReportWriter
+    """
+
+    def __init__(self, filename, report_format="json", resume=False):
+        """
+        Constructor, creating the temporary report.
+
+        :param filename: report filename
+        :type filename: str
+        :param report_format: report format (json, jsonl, sqlite)
+        :type report_format: str
+        :param resume: continue an existing temporary report
+        :type resume: bool
+        """
+        self.filename = filename
+        self.report_format = report_format
+        self.spool = get_spool_filename(filename)
+        if resume and os.path.isfile(self.spool):
+            LOGGER.debug("Continuing temporary report '%s'", self.spool)
+            self._writer = JSONLReportWriter(self.spool, "r+b")
+        else:
+            self._writer = JSONLReportWriter(self.spool)
+
+    def add_host(self, host, entry):
+        """
+        Adds a host entry to the report.
+
+        :param host: hostname
+        :type host: str
+        :param entry: host entry
+        :type entry: dict
+        """
+        self._writer.add_host(host, entry)
+
+    def get_hostnames(self):
+        """
+        Returns the names of all hosts written so far.
+        """
+        return self._writer.get_hostnames()
+
+    def has_host(self, host):
+        """
+        Returns whether a host has already been written.
+
+        :param host: hostname
+        :type host: str
+        """
+        return self._writer.has_host(host)
+
+    def close(self):
+        """
+        Completes the report and moves it to its final name.
+        """
+        self._writer.close()
+        if self.report_format == "jsonl":
+            os.replace(self.spool, self.filename)
+            os.replace(
+                get_index_filename(self.spool),
+                get_index_filename(self.filename)
+            )
+        else:
+            tmp_file = "{}.tmp".format(self.filename)
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            if self.report_format == "sqlite":
+                write_sqlite_report(self.spool, tmp_file)
+            else:
+                write_json_report(self.spool, tmp_file)
+            os.replace(tmp_file, self.filename)
+            os.remove(self.spool)
+            os.remove(get_index_filename(self.spool))
+        LOGGER.debug("Report '%s' completed", self.filename)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Functions useful for tracking Foreman tasks.
+"""
+
+FINISHED_STATES = ("stopped", "paused")
+"""
+tuple: States of Foreman tasks that don't make progress anymore
+"""
+
+
+def is_finished(task):
+    """
+    Returns whether a Foreman task has finished.
+
+    :param task: Foreman task
+    :type task: dict
+    """
+    return task is not None and task.get("state") in FINISHED_STATES
+
+
+
+class Backoff(object):
+    """
+.. class:: Backoff
+    Adaptive polling interval. The interval grows while polling doesn't
+    show any progress and is reset once it does.
+    """
+
+    def __init__(self, interval=5, maximum=60, factor=2):
+        """
+        Constructor, creating the backoff.
+
+        :param interval: initial interval in seconds
+        :type interval: float
+        :param maximum: maximum interval in seconds
+        :type maximum: float
+        :param factor: factor the interval grows by
+        :type factor: float
+        """
+        self.interval = interval
+        self.maximum = maximum
+        self.factor = factor
+        self._current = None
+
+    def next(self, progress=False):
+        """
+        Returns the next polling interval.
+
+        :param progress: flag whether the last poll showed progress
+        :type progress: bool
+        """
+        if progress or self._current is None:
+            self._current = self.interval
+        else:
+            self._current = min(self._current * self.factor, self.maximum)
+        return self._current
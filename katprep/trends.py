@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# pylint: disable=not-callable
+"""
+A script for analyzing errata trends over multiple snapshot reports of
+systems managed with Foreman/Katello or Red Hat Satellite 6.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import logging
+import os
+import sys
+
+from . import __version__, get_report_store
+from .analysis.summary import SUMMARY_WRITERS
+from .analysis.trends import ERRATA_TYPES, TrendData, get_snapshot_date
+
+"""
+str: Program version
+"""
+LOGGER = logging.getLogger('katprep_trends')
+"""
+logging: Logger instance
+"""
+LOG_LEVEL = None
+"""
+logging: Logger level
+"""
+
+
+
+def parse_options(args=None):
+    """Parses options and arguments."""
+    desc = '''%(prog)s is used for analyzing errata trends over multiple
+    snapshot reports of systems managed with Foreman/Katello or Red Hat
+    Satellite 6. It calculates outstanding errata over time, patch latencies
+    and the drift of environments from the whole landscape.'''
+    epilog = '''Check-out the website for more details:
+    http://github.com/stdevel/katprep'''
+    parser = argparse.ArgumentParser(description=desc, epilog=epilog)
+    parser.add_argument('--version', action='version', version=__version__)
+
+    #define option groups
+    gen_opts = parser.add_argument_group("generic arguments")
+    trend_opts = parser.add_argument_group("trend arguments")
+
+    #GENERIC ARGUMENTS
+    #-q / --quiet
+    gen_opts.add_argument("-q", "--quiet", action="store_true", \
+    dest="generic_quiet", default=False, help="don't print status messages " \
+    "to stdout (default: no)")
+    #-d / --debug
+    gen_opts.add_argument("-d", "--debug", dest="generic_debug", default=False, \
+    action="store_true", help="enable debugging outputs (default: no)")
+    #-o / --output
+    gen_opts.add_argument("-o", "--output", dest="output_file", \
+    metavar="FILE", default="", action="store", help="defines a file " \
+    "for storing the trends (default: stdout)")
+
+    #TREND ARGUMENTS
+    #-f / --format
+    trend_opts.add_argument("-f", "--format", dest="trend_format", \
+    default="md", choices=sorted(SUMMARY_WRITERS), help="defines the " \
+    "output format (default: md)")
+    #-t / --type
+    trend_opts.add_argument("-t", "--type", dest="errata_type", \
+    default="security", choices=ERRATA_TYPES, help="defines the errata " \
+    "type of the outstanding errata curve (default: security)")
+    #snapshot reports
+    trend_opts.add_argument('reports', metavar='FILE', nargs='+', \
+    help='Snapshot reports to analyze')
+
+
+
+    #parse options and arguments
+    options = parser.parse_args(args)
+    for report in options.reports:
+        if not os.path.isfile(report) or not os.access(report, os.R_OK):
+            parser.error(
+                "File '{}' non-existent or not readable".format(report)
+            )
+    return (options, args)
+
+
+
+def load_trends(options):
+    """
+    Loads all snapshot reports in chronological order. Reports are opened
+    one after another and closed once their hosts have been added.
+    """
+    trends = TrendData(options.errata_type)
+    reports = sorted(
+        (get_snapshot_date(x), x) for x in set(options.reports)
+    )
+    for date, filename in reports:
+        LOGGER.debug("Loading snapshot '%s' (%s)", filename, date)
+        try:
+            report = get_report_store(filename)
+        except (IOError, OSError, ValueError, KeyError) as err:
+            LOGGER.error("Unable to read report '%s': '%s'", filename, err)
+            continue
+        try:
+            trends.add_snapshot(date, report)
+        finally:
+            report.close()
+    LOGGER.info(
+        "Loaded %s snapshots of %s systems", len(trends.dates),
+        len(trends.hosts)
+    )
+    return trends
+
+
+
+def main(options, args):
+    """Main function, starts the logic based on parameters."""
+    LOGGER.debug("Options: %s", options)
+    LOGGER.debug("Arguments: %s", args)
+
+    trends = load_trends(options)
+    title = "Errata trends"
+    try:
+        if options.output_file:
+            with open(options.output_file, "w", newline="") as trend_file:
+                SUMMARY_WRITERS[options.trend_format](
+                    trends, trend_file, title
+                )
+        else:
+            SUMMARY_WRITERS[options.trend_format](trends, sys.stdout, title)
+    except (IOError, OSError) as err:
+        LOGGER.error("Unable to write trends: '%s'", err)
+        exit(1)
+
+
+def cli():
+    """
+    This functions initializes the CLI interface
+    """
+    global LOG_LEVEL
+    (options, args) = parse_options()
+
+    #set logging level
+    logging.basicConfig()
+    if options.generic_debug:
+        LOG_LEVEL = logging.DEBUG
+    elif options.generic_quiet:
+        LOG_LEVEL = logging.ERROR
+    else:
+        LOG_LEVEL = logging.INFO
+    LOGGER.setLevel(LOG_LEVEL)
+
+    main(options, args)
+
+
+
+if __name__ == "__main__":
+    cli()
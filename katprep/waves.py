@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling maintenance of hosts in waves.
+
+Hosts are grouped (e.g. by hostgroup or location) and every group is split
+into waves of a limited size. Waves are maintained one after another, a
+wave starts as soon as the Foreman tasks of the previous wave have
+finished. Within a wave, the number of hosts with running tasks can be
+limited as well.
+"""
+
+import argparse
+from collections import OrderedDict
+import logging
+import time
+
+from .tasks import is_finished
+
+LOGGER = logging.getLogger('katprep_maintenance')
+"""
+logging: Logger instance
+"""
+GROUP_PARAMS = OrderedDict([
+    ("hostgroup", "hostgroup_name"),
+    ("location", "location_name"),
+    ("environment", "environment_name"),
+    ("organization", "organization_name"),
+])
+"""
+OrderedDict: Host parameters by grouping key
+"""
+PARAM_PREFIX = "param:"
+"""
+str: Prefix of grouping keys referring to custom host parameters
+"""
+MISSING_POLLS = 10
+"""
+int: Number of polls a task may be missing before its host is failed
+"""
+
+
+def get_group_param(value):
+    """
+    Returns the host parameter of a grouping key (hostgroup, location,
+    environment, organization or param:NAME). Raises ArgumentTypeError for
+    invalid keys, so it can be used as argparse type.
+
+    :param value: grouping key
+    :type value: str
+    """
+    if value in GROUP_PARAMS:
+        return GROUP_PARAMS[value]
+    if value.startswith(PARAM_PREFIX) and len(value) > len(PARAM_PREFIX):
+        return value[len(PARAM_PREFIX):]
+    raise argparse.ArgumentTypeError(
+        "Invalid grouping key '{}', use {} or {}NAME".format(
+            value, ", ".join(GROUP_PARAMS), PARAM_PREFIX
+        )
+    )
+
+
+
+def get_waves(report, wave_size=0, group_param=None):
+    """
+    Returns waves of hostnames. Hosts are grouped by a host parameter (if
+    any), waves never span multiple groups.
+
+    :param report: snapshot report
+    :type report: ReportStore
+    :param wave_size: maximum number of hosts per wave (0 = unlimited)
+    :type wave_size: int
+    :param group_param: host parameter to group hosts by
+    :type group_param: str
+    """
+    groups = OrderedDict()
+    for host in report:
+        if group_param:
+            group = report[host]["params"].get(group_param) or ""
+        else:
+            group = ""
+        groups.setdefault(group, []).append(host)
+
+    waves = []
+    for group in sorted(groups):
+        hosts = groups[group]
+        size = wave_size or len(hosts)
+        for start in range(0, len(hosts), size):
+            waves.append(hosts[start:start+size])
+        if group_param:
+            LOGGER.debug(
+                "Group '%s' contains %s hosts", group or "(none)", len(hosts)
+            )
+    return waves
+
+
+
+def get_bulk_groups(report, hosts, max_hosts=0):
+    """
+    Returns groups of hosts sharing an organization and an identical set of
+    errata, so that they can be maintained by a single bulk action. Every
+    group consists of the organization name, the sorted erratum IDs and the
+    hostnames. Hosts without errata are omitted.
+
+    :param report: snapshot report
+    :type report: ReportStore
+    :param hosts: hostnames
+    :type hosts: list
+    :param max_hosts: maximum number of hosts per group (0 = unlimited)
+    :type max_hosts: int
+    """
+    groups = OrderedDict()
+    for host in hosts:
+        errata = tuple(sorted(set(
+            x["errata_id"] for x in report[host]["errata"]
+        )))
+        if errata:
+            organization = report[host]["params"].get("organization_name")
+            groups.setdefault((organization, errata), []).append(host)
+
+    result = []
+    for (organization, errata), group in groups.items():
+        size = max_hosts or len(group)
+        for start in range(0, len(group), size):
+            result.append((organization, list(errata), group[start:start+size]))
+    return result
+
+
+
+def get_failed_task(task_id, result):
+    """
+    Returns a placeholder for a task that didn't finish, so that its host
+    is considered failed.
+
+    :param task_id: Foreman task ID
+    :type task_id: str
+    :param result: task result (e.g. missing, timeout)
+    :type result: str
+    """
+    return {"id": task_id, "label": task_id, "state": None, "result": result}
+
+
+
+class WaveScheduler(object):
+    """
+.. class:: WaveScheduler
+    Maintains waves of hosts. Hosts are submitted in batches using a
+    callback that returns the IDs of the Foreman tasks started per host, so
+    that hosts can share bulk tasks. Once all tasks of a host have finished,
+    another callback is called (e.g. for rebooting the host). Hosts whose
+    maintenance couldn't be started and tasks that can't be retrieved
+    repeatedly or don't finish in time are passed to this callback as
+    failed tasks.
+    """
+
+    def __init__(self, submit, poll, finish, max_in_flight=0,
+                 poll_interval=30, timeout=0, missing_polls=MISSING_POLLS):
+        """
+        Constructor, creating the scheduler.
+
+        :param submit: callback(hosts) starting maintenance, returns task
+        IDs by hostname (None if maintenance couldn't be started)
+        :type submit: function
+        :param poll: callback(task IDs) returning tasks by task ID
+        :type poll: function
+        :param finish: callback(host, tasks) called once tasks have finished
+        :type finish: function
+        :param max_in_flight: maximum number of hosts with running tasks
+        (0 = wave size)
+        :type max_in_flight: int
+        :param poll_interval: seconds between polling tasks
+        :type poll_interval: float
+        :param timeout: maximum seconds per wave (0 = unlimited)
+        :type timeout: float
+        :param missing_polls: number of polls a task may be missing before
+        its host is failed
+        :type missing_polls: int
+        """
+        self.submit = submit
+        self.poll = poll
+        self.finish = finish
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.missing_polls = missing_polls
+        self._missing = {}
+
+    def run(self, waves):
+        """
+        Maintains waves one after another. Returns False if a wave timed
+        out and the remaining waves were skipped.
+
+        :param waves: waves of hostnames
+        :type waves: list
+        """
+        for number, wave in enumerate(waves, 1):
+            LOGGER.info(
+                "Starting wave %s/%s (%s hosts)", number, len(waves), len(wave)
+            )
+            if not self.run_wave(wave):
+                LOGGER.error(
+                    "Wave %s/%s timed out, skipping %s remaining waves",
+                    number, len(waves), len(waves) - number
+                )
+                return False
+        return True
+
+    def run_wave(self, wave):
+        """
+        Maintains a wave and waits for its tasks. Returns False if the wave
+        timed out.
+
+        :param wave: hostnames
+        :type wave: list
+        """
+        pending = list(wave)
+        in_flight = OrderedDict()
+        started = time.time()
+        while pending or in_flight:
+            if pending and (not self.max_in_flight or
+                            len(in_flight) < self.max_in_flight):
+                if self.max_in_flight:
+                    slots = self.max_in_flight - len(in_flight)
+                else:
+                    slots = len(pending)
+                hosts = pending[:slots]
+                del pending[:slots]
+                task_ids = self.submit(hosts)
+                for host in hosts:
+                    if task_ids.get(host) is None:
+                        self.finish(host, [get_failed_task("submit", "failed")])
+                    elif task_ids[host]:
+                        in_flight[host] = task_ids[host]
+                    else:
+                        #nothing to do (e.g. dry run)
+                        self.finish(host, [])
+            if not in_flight:
+                continue
+            if self.timeout and time.time() - started > self.timeout:
+                for host in in_flight:
+                    LOGGER.error("Tasks of host '%s' timed out", host)
+                    self.finish(host, [
+                        get_failed_task(x, "timeout") for x in in_flight[host]
+                    ])
+                return False
+            time.sleep(self.poll_interval)
+            self.__update(in_flight)
+        return True
+
+    def __update(self, in_flight):
+        """
+        Polls the tasks of all hosts in flight and finishes hosts whose
+        tasks have finished.
+
+        :param in_flight: task IDs by hostname
+        :type in_flight: OrderedDict
+        """
+        tasks = self.poll([x for y in in_flight.values() for x in y])
+        for host in list(in_flight):
+            host_tasks = [tasks.get(x) for x in in_flight[host]]
+            if None in host_tasks:
+                self._missing[host] = self._missing.get(host, 0) + 1
+                if self._missing[host] < self.missing_polls:
+                    continue
+                LOGGER.error(
+                    "Tasks of host '%s' couldn't be retrieved %s times",
+                    host, self._missing[host]
+                )
+                host_tasks = [
+                    x if x is not None else get_failed_task(y, "missing")
+                    for (x, y) in zip(host_tasks, in_flight[host])
+                ]
+            else:
+                self._missing.pop(host, None)
+                if not all(is_finished(x) for x in host_tasks):
+                    continue
+            del in_flight[host]
+            self._missing.pop(host, None)
+            self.finish(host, host_tasks)
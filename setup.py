@@ -97,8 +97,10 @@ setup(
            'katprep_maintenance=katprep.maintenance:cli',
            'katprep_parameters=katprep.parameters:cli',
            'katprep_populate=katprep.populate:cli',
+           'katprep_query=katprep.query:cli',
            'katprep_report=katprep.report:cli',
            'katprep_snapshot=katprep.snapshot:cli',
+           'katprep_trends=katprep.trends:cli',
         ],
     },
 )
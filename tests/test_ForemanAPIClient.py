@@ -110,6 +110,16 @@ def test_api_get(client, bookmark_id):
     assert bookmarks
 
 
+def test_iter_results(client):
+    """
+    Ensure that paginated collections are retrieved completely
+    """
+    hosts = json.loads(client.api_get("/hosts"))
+    results = list(client.iter_results("/hosts", per_page=1))
+
+    assert len(results) == hosts["subtotal"]
+
+
 def test_api_put(client, bookmark_id):
     """
     Ensure that PUT calls are working
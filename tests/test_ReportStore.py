@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for snapshot report stores
+"""
+
+from __future__ import absolute_import
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+from katprep import get_report_store
+from katprep.storage.catalog import pack_report
+from katprep.storage.jsonfile import ReportStore
+from katprep.storage.jsonl import JSONLReportStore, JSONLReportWriter
+from katprep.storage.sqlite import SQLiteReportStore, write_sqlite_report
+from katprep.storage.writer import ReportWriter
+
+
+@pytest.fixture
+def report():
+    return {
+        "web01.example.com": {
+            "errata": [{"errata_id": "RHSA-2017:0001"}],
+            "params": {"organization_name": "Example"},
+            "verification": {},
+        },
+        "web02.example.com": {
+            "errata": [],
+            "params": {"organization_name": "Other"},
+            "verification": {},
+        },
+    }
+
+
+def write_jsonl(filename, report):
+    writer = JSONLReportWriter(filename)
+    for host, entry in report.items():
+        writer.add_host(host, entry)
+    writer.close()
+
+
+@pytest.fixture(params=["legacy", "catalog", "jsonl", "sqlite"])
+def report_file(request, tmp_path, report):
+    filename = tmp_path / "errata-snapshot-report.json"
+    if request.param == "catalog":
+        filename.write_text(json.dumps(pack_report(report)))
+    elif request.param == "jsonl":
+        write_jsonl(str(filename), report)
+    elif request.param == "sqlite":
+        write_jsonl(str(tmp_path / "spool.jsonl"), report)
+        write_sqlite_report(str(tmp_path / "spool.jsonl"), str(filename))
+    else:
+        filename.write_text(json.dumps(report))
+    return str(filename)
+
+
+def test_read(report_file, report):
+    """
+    Ensure that hosts are read from all report formats
+    """
+    store = get_report_store(report_file)
+
+    assert sorted(store) == sorted(report)
+    assert len(store) == len(report)
+    assert store["web01.example.com"] == report["web01.example.com"]
+
+
+def test_exclude(report_file):
+    """
+    Ensure that excluded hosts are hidden but kept when saving
+    """
+    store = get_report_store(report_file)
+    store.exclude("web02.example.com")
+    store.exclude("giertz.example.com")
+    store.save()
+
+    assert list(store) == ["web01.example.com"]
+    assert len(store) == 1
+    assert "web02.example.com" in get_report_store(report_file)
+
+
+def test_set_verification(report_file):
+    """
+    Ensure that verification values are stored
+    """
+    store = get_report_store(report_file)
+    store.set_verification("web01.example.com", "virt_snapshot", True)
+    store.save()
+
+    verification = get_report_store(report_file).get_verification(
+        "web01.example.com"
+    )
+    assert verification == {"virt_snapshot": True}
+
+
+def test_summary(report_file):
+    """
+    Ensure that filter parameters can be retrieved
+    """
+    store = get_report_store(report_file)
+
+    assert store.get_summary("web02.example.com")["organization_name"] == \
+        "Other"
+
+
+def test_jsonl_index_rebuild(tmp_path, report):
+    """
+    Ensure that missing JSON lines indexes are rebuilt
+    """
+    filename = str(tmp_path / "errata-snapshot-report.jsonl")
+    write_jsonl(filename, report)
+    os.remove("{}.idx".format(filename))
+
+    store = JSONLReportStore(filename)
+    assert sorted(store) == sorted(report)
+    assert os.path.isfile("{}.idx".format(filename))
+
+
+@pytest.mark.parametrize("report_format", ["json", "jsonl", "sqlite"])
+def test_resume_writer(tmp_path, report, report_format):
+    """
+    Ensure that interrupted reports are continued after dropping an
+    incomplete line
+    """
+    filename = str(tmp_path / "errata-snapshot-report.{}".format(report_format))
+    writer = ReportWriter(filename, report_format)
+    writer.add_host("web01.example.com", report["web01.example.com"])
+    with open(writer.spool, "ab") as spool:
+        spool.write(b'{"host": "web03.example.com", "ent')
+
+    writer = ReportWriter(filename, report_format, resume=True)
+    assert writer.get_hostnames() == ["web01.example.com"]
+    writer.add_host("web02.example.com", report["web02.example.com"])
+    writer.close()
+
+    store = get_report_store(filename)
+    assert sorted(store) == sorted(report)
+    assert store["web02.example.com"] == report["web02.example.com"]
+    assert store["web01.example.com"] == report["web01.example.com"]
+
+
+@pytest.mark.parametrize("report_format", ["json", "jsonl", "sqlite"])
+def test_removed_erratum_keys(tmp_path, report_format):
+    """
+    Ensure that keys missing in a host's erratum stay missing
+    """
+    report = {
+        "web01.example.com": {"errata": [
+            {"errata_id": "RHSA-2017:0001", "reboot_suggested": True},
+        ], "params": {}, "verification": {}},
+        "web02.example.com": {"errata": [
+            {"errata_id": "RHSA-2017:0001"},
+        ], "params": {}, "verification": {}},
+    }
+    filename = str(tmp_path / "errata-snapshot-report.{}".format(report_format))
+    writer = ReportWriter(filename, report_format)
+    for host, entry in report.items():
+        writer.add_host(host, entry)
+    writer.close()
+
+    store = get_report_store(filename)
+    assert store["web02.example.com"]["errata"] == \
+        [{"errata_id": "RHSA-2017:0001"}]
+    assert store["web01.example.com"] == report["web01.example.com"]
+
+
+def test_invalid_report(tmp_path):
+    """
+    Ensure that invalid JSON documents are rejected
+    """
+    filename = tmp_path / "invalid.json"
+    filename.write_text("giertz")
+
+    with pytest.raises(ValueError):
+        ReportStore(str(filename))
+
+
+def test_sqlite_host_errata(tmp_path, report):
+    """
+    Ensure that host-specific errata differences and verification values
+    are kept in SQLite reports
+    """
+    report["web02.example.com"]["errata"] = [
+        {"errata_id": "RHSA-2017:0001", "reboot_suggested": True}
+    ]
+    report["web02.example.com"]["verification"] = {"virt_snapshot": True}
+    write_jsonl(str(tmp_path / "spool.jsonl"), report)
+    filename = str(tmp_path / "errata-snapshot-report.sqlite")
+    write_sqlite_report(str(tmp_path / "spool.jsonl"), filename)
+
+    store = SQLiteReportStore(filename)
+    assert store["web02.example.com"] == report["web02.example.com"]
+    store.set_verification("web02.example.com", "virt_snapshot", False)
+    store.close()
+
+    store = SQLiteReportStore(filename)
+    assert store.get_verification("web02.example.com") == \
+        {"virt_snapshot": False}
+    assert store["web01.example.com"] == report["web01.example.com"]
+
+
+def test_sqlite_invalid_report(tmp_path):
+    """
+    Ensure that SQLite databases other than snapshot reports are rejected
+    """
+    filename = str(tmp_path / "invalid.sqlite")
+    connection = sqlite3.connect(filename)
+    connection.execute("CREATE TABLE giertz (id INTEGER)")
+    connection.close()
+
+    with pytest.raises(ValueError):
+        SQLiteReportStore(filename)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the inverted CVE index
+"""
+
+from __future__ import absolute_import
+
+import pytest
+
+from katprep.storage.cveindex import (CVEIndex, get_cve_index_filename,
+get_erratum_cves)
+
+
+@pytest.fixture
+def report():
+    return {
+        "web01.example.com": {"errata": [
+            {"errata_id": "RHSA-2017:0001",
+             "cves": [{"cve_id": "CVE-2017-0001", "href": "/"},
+                      {"cve_id": "CVE-2017-0002", "href": "/"}]},
+            {"errata_id": "RHBA-2017:0002", "cves": []},
+        ]},
+        "web02.example.com": {"errata": [
+            {"errata_id": "RHSA-2017:0003", "cves": ["cve-2017-0001"]},
+        ]},
+    }
+
+
+def test_erratum_cves():
+    """
+    Ensure that CVE IDs are read from Katello and plain lists
+    """
+    assert get_erratum_cves({"cves": [{"cve_id": "CVE-1"}, "cve-2"]}) == \
+        ["CVE-1", "CVE-2"]
+    assert get_erratum_cves({"cves": None}) == []
+
+
+def test_lookup(report):
+    """
+    Ensure that errata and hosts are found by CVE
+    """
+    index = CVEIndex.from_report(report, release=False)
+
+    assert index.lookup("cve-2017-0001") == {
+        "RHSA-2017:0001": ["web01.example.com"],
+        "RHSA-2017:0003": ["web02.example.com"],
+    }
+    assert index.lookup("CVE-2017-0002") == \
+        {"RHSA-2017:0001": ["web01.example.com"]}
+    assert index.lookup("CVE-2017-9999") == {}
+
+
+def test_save_load(report, tmpdir):
+    """
+    Ensure that indexes are stored next to reports
+    """
+    filename = get_cve_index_filename(
+        str(tmpdir.join("errata-snapshot-report-sat-20170101-1200.json"))
+    )
+    assert filename.endswith("20170101-1200.cves.json")
+
+    CVEIndex.from_report(report, release=False).save(filename)
+    index = CVEIndex.load(filename)
+
+    assert index.lookup("CVE-2017-0002") == \
+        {"RHSA-2017:0001": ["web01.example.com"]}
+    with pytest.raises(ValueError):
+        CVEIndex({"hosts": [], "cves": {}})
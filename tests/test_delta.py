@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the errata delta between snapshot reports
+"""
+
+from __future__ import absolute_import
+
+import pytest
+
+from katprep.analysis.delta import (get_errata_index, get_host_delta,
+iter_deltas, iter_deltas_by_index)
+
+
+@pytest.fixture
+def report_old():
+    return {
+        "web01.example.com": {
+            "errata": [
+                {"errata_id": "RHSA-2017:0001", "summary": "Fix it"},
+                {"errata_id": "RHBA-2017:0002", "summary": "Fix more"},
+                {"errata_id": "RHBA-2017:0003", "summary": "Fix all"},
+            ],
+            "params": {"organization_name": "Example"},
+            "verification": {"virt_snapshot": True},
+        },
+        "web02.example.com": {
+            "errata": [],
+            "params": {"organization_name": "Example"},
+            "verification": {},
+        },
+    }
+
+
+@pytest.fixture
+def report_new():
+    return {
+        "web01.example.com": {
+            "errata": [
+                {"errata_id": "RHBA-2017:0002", "summary": "Fix more"},
+                {"errata_id": "RHEA-2017:0004", "summary": "Enhance it"},
+            ],
+            "params": {"organization_name": "Example"},
+            "verification": {},
+        },
+    }
+
+
+def test_host_delta(report_old, report_new):
+    """
+    Ensure that installed, remaining and new errata are detected
+    """
+    host = "web01.example.com"
+    delta = get_host_delta(host, report_old[host], report_new[host])
+
+    assert [x["errata_id"] for x in delta.installed] == \
+        ["RHSA-2017:0001", "RHBA-2017:0003"]
+    assert [x["errata_id"] for x in delta.remaining] == ["RHBA-2017:0002"]
+    assert [x["errata_id"] for x in delta.new] == ["RHEA-2017:0004"]
+    assert delta.is_patched()
+    assert delta.get_report_data()["errata"] == delta.installed
+    assert delta.verification == {"virt_snapshot": True}
+
+
+def test_host_delta_keeps_report(report_old, report_new):
+    """
+    Ensure that computing a delta doesn't alter the reports
+    """
+    host = "web01.example.com"
+    delta = get_host_delta(host, report_old[host], report_new[host])
+    delta.params["date"] = "2017-01-01"
+
+    assert len(report_old[host]["errata"]) == 3
+    assert "date" not in report_old[host]["params"]
+
+
+def test_iter_deltas_skips_missing_hosts(report_old, report_new):
+    """
+    Ensure that hosts missing in the newer report are skipped
+    """
+    deltas = list(iter_deltas(report_old, report_new))
+
+    assert [x.host for x in deltas] == ["web01.example.com"]
+
+
+def test_iter_deltas_by_index(report_old, report_new):
+    """
+    Ensure that deltas computed from the erratum IDs of the newer report
+    match the regular deltas
+    """
+    errata_index = get_errata_index(report_new)
+    assert errata_index == {
+        "web01.example.com": {"RHBA-2017:0002", "RHEA-2017:0004"}
+    }
+
+    deltas = list(iter_deltas_by_index(report_old, errata_index))
+    expected = list(iter_deltas(report_old, report_new))
+    assert [x.host for x in deltas] == ["web01.example.com"]
+    assert deltas[0].installed == expected[0].installed
+    assert deltas[0].remaining == expected[0].remaining
+    assert deltas[0].new == [{"errata_id": "RHEA-2017:0004"}]
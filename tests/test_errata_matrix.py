@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the sparse host×errata matrix
+"""
+
+from __future__ import absolute_import
+
+import pytest
+
+from katprep.analysis.matrix import ErrataMatrix
+
+
+@pytest.fixture
+def matrix():
+    matrix = ErrataMatrix()
+    matrix.add_host("web01", ["RHSA-1", "RHBA-2", "RHSA-1"])
+    matrix.add_host("web02", ["RHBA-2", "RHSA-1"])
+    matrix.add_host("web03", ["RHSA-1", "RHEA-3"])
+    matrix.add_host("web04", [])
+    return matrix
+
+
+def test_rows(matrix):
+    """
+    Ensure that rows are stored deduplicated in CSR layout
+    """
+    assert matrix.shape == (4, 3)
+    assert list(matrix.indptr) == [0, 2, 4, 6, 6]
+    assert sorted(matrix.get_row("web02")) == ["RHBA-2", "RHSA-1"]
+    with pytest.raises(ValueError):
+        matrix.add_host("web01", [])
+
+
+def test_hosts_missing(matrix):
+    """
+    Ensure that hosts missing an erratum are found
+    """
+    assert matrix.get_hosts_missing("RHSA-1") == ["web01", "web02", "web03"]
+    assert matrix.get_hosts_missing("RHEA-3") == ["web03"]
+    assert matrix.get_hosts_missing("RHSA-9") == []
+    #transposed matrix is rebuilt after adding hosts
+    matrix.add_host("web05", ["RHEA-3"])
+    assert matrix.get_hosts_missing("RHEA-3") == ["web03", "web05"]
+
+
+def test_common_errata(matrix):
+    """
+    Ensure that errata affecting most hosts are found
+    """
+    assert matrix.get_common_errata(0.5) == \
+        [("RHSA-1", 3, 0.75), ("RHBA-2", 2, 0.5)]
+    assert matrix.get_common_errata(0.9) == []
+
+
+def test_identical_hosts(matrix):
+    """
+    Ensure that hosts with identical errata sets are grouped
+    """
+    groups = matrix.get_identical_hosts()
+
+    assert len(groups) == 1
+    assert sorted(groups[0][0]) == ["RHBA-2", "RHSA-1"]
+    assert groups[0][1] == ["web01", "web02"]
+    assert len(matrix.get_identical_hosts(min_hosts=1)) == 3
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the Foreman name-to-ID index
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import time
+from urllib.parse import unquote
+
+import pytest
+
+from katprep.exceptions import SessionException
+from katprep.management.foreman import ForemanAPIClient
+
+
+class OfflineForeman(ForemanAPIClient):
+    """
+    Foreman client answering GET requests from a list of hosts
+    """
+
+    HOSTS = [
+        {"id": x, "name": "host{}.example.com".format(x)} for x in range(1, 6)
+    ]
+
+    def __init__(self, *args, **kwargs):
+        self.requests = []
+        super().__init__(*args, **kwargs)
+
+    def validate_api_support(self):
+        pass
+
+    def api_get(self, sub_url, hits=1337, page=1):
+        self.requests.append(unquote(sub_url))
+        hosts = self.HOSTS
+        if "search=" in sub_url:
+            name = unquote(sub_url).split('name="')[1].rstrip('"')
+            hosts = [x for x in hosts if x["name"] == name.lower()]
+        return json.dumps({
+            "subtotal": len(hosts),
+            "results": hosts[(page-1)*hits:page*hits]
+        })
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / "id-cache.json")
+
+
+def get_client(cache_file=None, ttl=ForemanAPIClient.ID_CACHE_TTL):
+    return OfflineForeman(
+        logging.ERROR, "foreman.example.com", "admin", "secret",
+        id_cache_file=cache_file, id_cache_ttl=ttl
+    )
+
+
+def test_search_lookup():
+    """
+    Ensure that names are searched server-side and cached afterwards
+    """
+    client = get_client()
+
+    assert client.get_id_by_name("HOST2.example.com", "host") == 2
+    assert client.get_id_by_name("host2.example.com", "host") == 2
+    assert client.requests == ['/hosts?search=name="HOST2.example.com"']
+    with pytest.raises(SessionException):
+        client.get_id_by_name("giertz.example.com", "host")
+
+
+def test_expired_entries():
+    """
+    Ensure that expired lookups are repeated
+    """
+    client = get_client(ttl=0)
+
+    client.get_id_by_name("host1.example.com", "host")
+    client.get_id_by_name("host1.example.com", "host")
+    assert len(client.requests) == 2
+
+
+def test_invalidate_entry():
+    """
+    Ensure that invalidated lookups are repeated
+    """
+    client = get_client()
+    client.build_id_index("host")
+    client.invalidate_id_cache("host", "host1.example.com")
+
+    assert client.get_id_by_name("host2.example.com", "host") == 2
+    assert client.get_id_by_name("host1.example.com", "host") == 1
+    assert client.requests == [
+        "/hosts", '/hosts?search=name="host1.example.com"'
+    ]
+
+
+def test_prepare_index():
+    """
+    Ensure that the index is only built if it saves requests
+    """
+    client = get_client()
+
+    assert not client.prepare_id_index("host", 1)
+    assert client.prepare_id_index("host", 3)
+    assert client.requests == ["/hosts", "/hosts"]
+    assert not client.prepare_id_index("host", 3)
+    with pytest.raises(SessionException):
+        client.get_id_by_name("giertz.example.com", "host")
+    assert len(client.requests) == 2
+
+
+def test_persisted_cache(cache_file):
+    """
+    Ensure that lookups are re-used by subsequent clients
+    """
+    client = get_client(cache_file)
+    client.build_id_index("host")
+    client.save_id_cache()
+
+    client = get_client(cache_file)
+    assert client.get_id_by_name("host5.example.com", "host") == 5
+    with pytest.raises(SessionException):
+        client.get_id_by_name("giertz.example.com", "host")
+    assert client.requests == []
+
+
+def test_persisted_cache_expired(cache_file):
+    """
+    Ensure that expired lookups aren't loaded
+    """
+    client = get_client(cache_file)
+    client.get_id_by_name("host1.example.com", "host")
+    client.save_id_cache()
+    with open(cache_file, "r") as cache:
+        data = json.load(cache)
+    data["foreman.example.com"]["index"]["host"]["host1.example.com"][1] = \
+        time.time() - 2 * ForemanAPIClient.ID_CACHE_TTL
+    with open(cache_file, "w") as cache:
+        json.dump(data, cache)
+
+    client = get_client(cache_file)
+    client.get_id_by_name("host1.example.com", "host")
+    assert len(client.requests) == 1
+
+
+@pytest.mark.parametrize("data", [
+    {"index": {"host": {"host1.example.com": 1}}},
+    {"index": {"host": {"host1.example.com": [1, "yesterday"]}}},
+    {"index": {"host": []}},
+    {"complete": {"host": None}},
+    [],
+])
+def test_invalid_persisted_cache(cache_file, data):
+    """
+    Ensure that invalid cache files don't break the client
+    """
+    with open(cache_file, "w") as cache:
+        json.dump({"foreman.example.com": data}, cache)
+
+    client = get_client(cache_file)
+    assert client.get_id_by_name("host1.example.com", "host") == 1
+    assert len(client.requests) == 1
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the verification journal
+"""
+
+from __future__ import absolute_import
+
+import json
+import os
+
+import pytest
+
+from katprep import get_report_store
+from katprep.storage.journal import (VerificationJournal,
+get_journal_filename, merge_journal, read_journal)
+
+
+@pytest.fixture
+def report_file(tmp_path):
+    filename = tmp_path / "errata-snapshot-report.json"
+    filename.write_text(json.dumps({
+        "web01.example.com": {
+            "errata": [], "params": {}, "verification": {}
+        },
+        "web02.example.com": {
+            "errata": [], "params": {}, "verification": {}
+        },
+    }))
+    return str(filename)
+
+
+def test_record(report_file):
+    """
+    Ensure that journal entries are read in order
+    """
+    journal = VerificationJournal(report_file, sync_interval=2)
+    journal.record("web01.example.com", "virt_snapshot", True)
+    journal.record("web01.example.com", "mon_status", "Ok")
+    journal.record("web01.example.com", "virt_snapshot", False)
+    journal.close()
+
+    assert list(read_journal(get_journal_filename(report_file))) == [
+        ("web01.example.com", "virt_snapshot", True),
+        ("web01.example.com", "mon_status", "Ok"),
+        ("web01.example.com", "virt_snapshot", False),
+    ]
+
+
+def test_incomplete_entry(report_file):
+    """
+    Ensure that incomplete entries of interrupted runs are ignored
+    """
+    journal = VerificationJournal(report_file)
+    journal.record("web01.example.com", "virt_snapshot", True)
+    journal.close()
+    with open(get_journal_filename(report_file), "a") as journal_file:
+        journal_file.write('{"host": "web02.exa')
+
+    assert list(read_journal(get_journal_filename(report_file))) == [
+        ("web01.example.com", "virt_snapshot", True),
+    ]
+
+
+def test_overlay(report_file):
+    """
+    Ensure that journal entries are applied when reading reports without
+    changing the report file
+    """
+    with open(report_file, "r") as report:
+        content = report.read()
+    journal = VerificationJournal(report_file)
+    journal.record("web02.example.com", "mon_status", "Ok")
+    journal.close()
+
+    store = get_report_store(report_file)
+    assert store.get_verification("web02.example.com") == \
+        {"mon_status": "Ok"}
+    assert store.get_verification("web01.example.com") == {}
+    with open(report_file, "r") as report:
+        assert report.read() == content
+
+
+def test_merge(report_file):
+    """
+    Ensure that journals are merged into reports and removed afterwards
+    """
+    journal = VerificationJournal(report_file)
+    journal.record("web01.example.com", "virt_snapshot", True)
+    journal.record("giertz.example.com", "virt_snapshot", True)
+    journal.close()
+
+    assert merge_journal(get_report_store(report_file)) == 1
+    assert not os.path.exists(get_journal_filename(report_file))
+    assert get_report_store(report_file).get_verification(
+        "web01.example.com"
+    ) == {"virt_snapshot": True}
+    assert merge_journal(get_report_store(report_file)) == 0
+
+
+def test_merge_keeps_mtime(report_file):
+    """
+    Ensure that merging the journal doesn't change the modification time
+    of the report as it dates snapshots and downtimes
+    """
+    os.utime(report_file, (86400, 86400))
+    journal = VerificationJournal(report_file)
+    journal.record("web01.example.com", "virt_snapshot", True)
+    journal.close()
+
+    assert merge_journal(get_report_store(report_file)) == 1
+    assert os.path.getmtime(report_file) == 86400
+    assert get_report_store(report_file).get_verification(
+        "web01.example.com"
+    ) == {"virt_snapshot": True}
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for concurrent maintenance preparation
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import json
+import threading
+import time
+
+import pytest
+
+from katprep import get_report_store
+from katprep.storage.journal import VerificationJournal
+
+maintenance = pytest.importorskip("katprep.maintenance")
+
+
+class ConcurrencyCounter(object):
+    """
+    Client counting concurrent snapshot and downtime requests
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.maximum = 0
+        self.requests = []
+
+    def _request(self, name):
+        with self.lock:
+            self.active = self.active + 1
+            self.maximum = max(self.maximum, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active = self.active - 1
+            self.requests.append(name)
+
+    def create_snapshot(self, vm_name, name, comment):
+        self._request(vm_name)
+
+    def remove_snapshot(self, vm_name, name):
+        self._request(vm_name)
+
+    def schedule_downtime(self, name, object_type, hours):
+        self._request(name)
+
+    def remove_downtime(self, name, object_type):
+        self._request(name)
+
+
+@pytest.fixture
+def report():
+    report = {}
+    for i in range(12):
+        report["host{}.example.com".format(i)] = {
+            "errata": [],
+            "params": {
+                "katprep_virt": "virt{}".format(i % 3),
+                "katprep_virt_snapshot": "1",
+                "katprep_mon": "mon{}".format(i % 2),
+            },
+            "verification": {},
+        }
+    return report
+
+
+@pytest.fixture
+def clients(monkeypatch, report):
+    virt = dict(("virt{}".format(x), ConcurrencyCounter()) for x in range(3))
+    mon = dict(("mon{}".format(x), ConcurrencyCounter()) for x in range(2))
+    monkeypatch.setattr(maintenance, "REPORT", report)
+    monkeypatch.setattr(maintenance, "VIRT_CLIENTS", virt)
+    monkeypatch.setattr(maintenance, "MON_CLIENTS", mon)
+    monkeypatch.setattr(maintenance, "VIRT_SEMAPHORES", {})
+    monkeypatch.setattr(maintenance, "MON_SEMAPHORES", {})
+    return (virt, mon)
+
+
+def get_options(**kwargs):
+    options = argparse.Namespace(
+        jobs=8, virt_concurrency=1, mon_concurrency=1,
+        virt_skip_snapshot=False, mon_skip_downtime=False,
+        mon_suggested=False, mon_downtime=8, generic_dry_run=False,
+        upgrade_packages=False, bulk_install=True, bulk_size=100
+    )
+    for key, value in kwargs.items():
+        setattr(options, key, value)
+    return options
+
+
+def test_interleaved_hosts(report):
+    """
+    Ensure that hosts are ordered round-robin by virtualization host
+    """
+    hosts = maintenance.get_interleaved_hosts(report)
+
+    assert sorted(hosts) == sorted(report)
+    assert [report[x]["params"]["katprep_virt"] for x in hosts[0:3]] == \
+        ["virt0", "virt1", "virt2"]
+
+
+@pytest.mark.parametrize("limit", [1, 2])
+def test_prepare_limits(clients, report, limit):
+    """
+    Ensure that all hosts are prepared without exceeding the concurrency
+    limit per backend
+    """
+    (virt, mon) = clients
+    maintenance.manage_hosts_preparation(
+        get_options(virt_concurrency=limit, mon_concurrency=limit)
+    )
+
+    for client in list(virt.values()) + list(mon.values()):
+        assert client.maximum <= limit
+    assert sorted(x for y in virt.values() for x in y.requests) == \
+        sorted(report)
+    assert sorted(x for y in mon.values() for x in y.requests) == \
+        sorted(report)
+
+
+def test_cleanup_missing_backend(clients, report):
+    """
+    Ensure that hosts with unknown backends don't stop the clean-up
+    """
+    (virt, _) = clients
+    del virt["virt0"]
+    maintenance.manage_hosts_preparation(get_options(), cleanup=True)
+
+    assert len([x for y in virt.values() for x in y.requests]) == 8
+
+
+class FakeForeman(object):
+    """
+    Foreman client recording PUT requests and returning tasks
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def get_id_by_name(self, name, api_object):
+        return name
+
+    def invalidate_id_cache(self, api_object=None, name=None):
+        pass
+
+    def api_put(self, sub_url, payload):
+        self.requests.append((sub_url, json.loads(payload)))
+        return json.dumps({"id": "task-{}".format(len(self.requests))})
+
+
+@pytest.fixture
+def report_store(monkeypatch, tmp_path):
+    filename = tmp_path / "errata-snapshot-report.json"
+    filename.write_text(json.dumps({
+        "web01.example.com": {
+            "errata": [{"errata_id": "RHSA-2017:0001"}], "params": {},
+            "verification": {}
+        },
+        "web02.example.com": {
+            "errata": [{"errata_id": "RHSA-2017:0001"}], "params": {},
+            "verification": {}
+        },
+    }))
+    store = get_report_store(str(filename))
+    monkeypatch.setattr(maintenance, "REPORT", store)
+    monkeypatch.setattr(
+        maintenance, "JOURNAL", VerificationJournal(str(filename))
+    )
+    return store
+
+
+def test_submit_host_maintenance(monkeypatch, report_store):
+    """
+    Ensure that errata are installed and the started tasks are recorded
+    """
+    client = FakeForeman()
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", client)
+
+    task_ids = maintenance.submit_maintenance(
+        get_options(bulk_install=False), ["web01.example.com"]
+    )
+    assert task_ids == {"web01.example.com": ["task-1"]}
+    assert client.requests == [(
+        "/hosts/web01.example.com/errata/apply",
+        {"errata_ids": ["RHSA-2017:0001"]}
+    )]
+    assert report_store.get_verification("web01.example.com") == \
+        {"foreman_tasks": ["task-1"]}
+
+
+def test_submit_bulk_maintenance(monkeypatch, report_store):
+    """
+    Ensure that hosts sharing errata are maintained by a bulk action
+    """
+    client = FakeForeman()
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", client)
+
+    task_ids = maintenance.submit_maintenance(
+        get_options(upgrade_packages=True),
+        ["web01.example.com", "web02.example.com"]
+    )
+    assert task_ids == {
+        "web01.example.com": ["task-1", "task-2"],
+        "web02.example.com": ["task-1", "task-3"],
+    }
+    assert client.requests[0] == (
+        "/../../katello/api/hosts/bulk/install_content", {
+            "organization_id": None,
+            "included": {
+                "search": "name ^ (web01.example.com, web02.example.com)"
+            },
+            "content_type": "errata",
+            "content": ["RHSA-2017:0001"]
+        }
+    )
+    assert [x[0] for x in client.requests[1:]] == [
+        "/hosts/web01.example.com/packages/upgrade_all",
+        "/hosts/web02.example.com/packages/upgrade_all",
+    ]
+
+
+def test_put_host_request_stale_id(monkeypatch, report_store):
+    """
+    Ensure that requests using stale host IDs are repeated with a fresh ID
+    """
+    class StaleForeman(FakeForeman):
+        def __init__(self):
+            super().__init__()
+            self.invalidated = []
+
+        def get_id_by_name(self, name, api_object):
+            return 42 if self.invalidated else 23
+
+        def invalidate_id_cache(self, api_object=None, name=None):
+            self.invalidated.append((api_object, name))
+
+        def api_put(self, sub_url, payload):
+            if "/23/" in sub_url:
+                raise maintenance.SessionException("404: Not found")
+            return super().api_put(sub_url, payload)
+
+    client = StaleForeman()
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", client)
+
+    maintenance.put_host_request(
+        "web01.example.com", "/hosts/{}/power", json.dumps({})
+    )
+    assert client.invalidated == [("host", "web01.example.com")]
+    assert client.requests == [("/hosts/42/power", {})]
+
+
+def test_failed_submit_no_reboot(monkeypatch, report_store):
+    """
+    Ensure that hosts whose maintenance couldn't be started aren't rebooted
+    """
+    class BrokenForeman(FakeForeman):
+        def api_put(self, sub_url, payload):
+            if sub_url.endswith("/errata/apply"):
+                raise maintenance.SessionException("500: Internal error")
+            return super().api_put(sub_url, payload)
+
+    client = BrokenForeman()
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", client)
+    options = get_options(
+        bulk_install=False, foreman_reboot=True, foreman_no_reboot=False
+    )
+
+    scheduler = maintenance.WaveScheduler(
+        lambda hosts: maintenance.submit_maintenance(options, hosts),
+        lambda task_ids: {},
+        lambda host, tasks: maintenance.finish_host_maintenance(
+            options, host, tasks
+        ),
+        poll_interval=0
+    )
+    assert scheduler.run([["web01.example.com"]])
+    assert client.requests == []
+
+
+def test_status_recorded_tasks(monkeypatch, report_store):
+    """
+    Ensure that recorded tasks are polled in bulk until they have finished
+    """
+    polls = []
+
+    class TaskClient(object):
+        def get_tasks(self, task_ids):
+            polls.append(sorted(task_ids))
+            state = "stopped" if len(polls) > 1 else "running"
+            return dict(
+                (x, {"id": x, "label": "Install", "state": state,
+                     "result": "success"}) for x in task_ids
+            )
+
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", TaskClient())
+    monkeypatch.setattr(maintenance.time, "sleep", lambda x: None)
+    report_store.set_verification(
+        "web01.example.com", "foreman_tasks", ["task-1"]
+    )
+    report_store.set_verification(
+        "web02.example.com", "foreman_tasks", ["task-2", "task-3"]
+    )
+
+    maintenance.status(get_options(status_wait=True), None)
+    assert polls == [["task-1", "task-2", "task-3"]] * 2
+
+
+def test_status_missing_tasks(monkeypatch, report_store):
+    """
+    Ensure that waiting for tasks that can't be retrieved stops eventually
+    """
+    polls = []
+
+    class TaskClient(object):
+        def get_tasks(self, task_ids):
+            polls.append(sorted(task_ids))
+            return {"task-1": {"id": "task-1", "label": "Install",
+                               "state": "stopped", "result": "success"}}
+
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", TaskClient())
+    monkeypatch.setattr(maintenance, "MISSING_POLLS", 3)
+    monkeypatch.setattr(maintenance.time, "sleep", lambda x: None)
+    report_store.set_verification(
+        "web01.example.com", "foreman_tasks", ["task-1"]
+    )
+    report_store.set_verification(
+        "web02.example.com", "foreman_tasks", ["task-2"]
+    )
+
+    maintenance.status(get_options(status_wait=True), None)
+    assert polls == [["task-1", "task-2"]] + [["task-2"]] * 2
+
+
+@pytest.mark.parametrize("sub_tasks, rebooted", [
+    ({
+        "web01.example.com": [{"id": "task-2", "state": "stopped",
+                               "result": "success"}],
+        "web02.example.com": [{"id": "task-3", "state": "stopped",
+                               "result": "error"}],
+    }, ["web01.example.com"]),
+    ({}, []),
+])
+def test_finish_bulk_sub_tasks(monkeypatch, report_store, sub_tasks,
+                               rebooted):
+    """
+    Ensure that failed bulk tasks only fail hosts whose sub-tasks failed
+    and that the sub-tasks are recorded per host
+    """
+    class BulkForeman(FakeForeman):
+        def get_sub_tasks(self, task_id):
+            self.requests.append(("sub_tasks", task_id))
+            return sub_tasks
+
+    client = BulkForeman()
+    monkeypatch.setattr(maintenance, "SAT_CLIENT", client)
+    monkeypatch.setattr(maintenance, "BULK_TASKS", {"task-1": None})
+    options = get_options(foreman_reboot=True, foreman_no_reboot=False)
+    task = {"id": "task-1", "label": "Bulk", "state": "stopped",
+            "result": "error"}
+
+    for host in ("web01.example.com", "web02.example.com"):
+        maintenance.finish_host_maintenance(options, host, [task])
+    assert client.requests[0] == ("sub_tasks", "task-1")
+    assert [x[0] for x in client.requests[1:]] == [
+        "/hosts/{}/power".format(x) for x in rebooted
+    ]
+    if sub_tasks:
+        assert report_store.get_verification("web02.example.com") == \
+            {"foreman_tasks": ["task-3"]}
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the report rendering engines
+"""
+
+from __future__ import absolute_import
+
+import os
+import subprocess
+
+import pytest
+import yaml
+
+from katprep.exceptions import TemplateException
+from katprep.rendering.native import NativeRenderer
+from katprep.rendering.pandoc import PandocRenderer
+from katprep.rendering.template import PandocTemplate
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
+
+
+@pytest.fixture
+def data():
+    return {
+        "params": {"name": "web01.example.com", "ip": "192.168.0.1"},
+        "verification": {"virt_snapshot": True},
+        "errata": [
+            {"errata_id": "RHSA-2017:0001", "type": "security",
+             "description": "Fix <b>it</b> & more"},
+            {"errata_id": "RHBA-2017:0002", "type": "bugfix"},
+        ],
+    }
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("$params.name$", "web01.example.com"),
+    ("$params.owner$", ""),
+    ("$verification.virt_snapshot$", "true"),
+    ("$if(params.ip)$IP$else$none$endif$", "IP"),
+    ("$if(params.owner)$owner$else$none$endif$", "none"),
+    ("$for(errata)$$errata.errata_id$$sep$, $endfor$",
+     "RHSA-2017:0001, RHBA-2017:0002"),
+    ("$for(errata)$$it.type$ $endfor$", "security bugfix "),
+    ("costs $$5$-- comment", "costs $5"),
+])
+def test_template(data, source, expected):
+    """
+    Ensure that variables, conditionals and loops are rendered
+    """
+    assert PandocTemplate(source).render(data) == expected
+
+
+def test_template_standalone_keywords(data):
+    """
+    Ensure that lines only containing keywords are swallowed
+    """
+    source = "start\n$for(errata)$\n- $errata.errata_id$\n$endfor$\nend\n"
+
+    assert PandocTemplate(source).render(data) == \
+        "start\n- RHSA-2017:0001\n- RHBA-2017:0002\nend\n"
+
+
+@pytest.mark.parametrize("source", [
+    "$if(params.name)$unclosed",
+    "$endfor$",
+    "$for(errata)$$endif$",
+    "$if(some thing)$$endif$",
+])
+def test_template_invalid(source):
+    """
+    Ensure that invalid templates are rejected
+    """
+    with pytest.raises(TemplateException):
+        PandocTemplate(source)
+
+
+def test_native_renderer(data, tmpdir):
+    """
+    Ensure that the integrated templates are rendered and escaped
+    """
+    for output_type in ["html", "md"]:
+        renderer = NativeRenderer(
+            os.path.join(TEMPLATE_DIR, "template.{}".format(output_type)),
+            output_type
+        )
+        filename = str(tmpdir.join("report"))
+        renderer.render(data, filename)
+
+        with open("{}.{}".format(filename, output_type)) as report:
+            content = report.read()
+        assert "web01.example.com" in content
+        assert "RHBA-2017:0002" in content
+        if output_type == "html":
+            assert "Fix &lt;b&gt;it&lt;/b&gt; &amp; more" in content
+        else:
+            assert "Fix <b>it</b> & more" in content
+        assert not os.path.exists("{}.yml".format(filename))
+
+
+def get_report_options(tmpdir, monkeypatch):
+    """
+    Returns katprep_report options rendering Markdown reports to tmpdir
+    """
+    from argparse import Namespace
+    from katprep import report
+
+    monkeypatch.setattr(report, "get_report_timestamp", lambda x: "20170101")
+    return Namespace(
+        engine="native", output_type="md", preserve_yaml=False, jobs=2,
+        force_render=False, output_path="{}/".format(tmpdir),
+        template_file=os.path.join(TEMPLATE_DIR, "template.md")
+    )
+
+
+def test_create_reports(data, tmpdir, monkeypatch):
+    """
+    Ensure that reports are rendered concurrently and errors are collected
+    """
+    from katprep import report
+    from katprep.analysis.delta import HostDelta
+
+    deltas = [
+        HostDelta("web{:02d}.example.com".format(i), data["params"],
+                  data["verification"], data["errata"], [], [])
+        for i in range(8)
+    ]
+    deltas.append(
+        HostDelta("missing/web.example.com", data["params"], {}, [], [], [])
+    )
+    options = get_report_options(tmpdir, monkeypatch)
+
+    errors = report.create_reports(options, deltas)
+
+    assert [host for host, _ in errors] == ["missing/web.example.com"]
+    assert len(tmpdir.listdir(lambda x: x.ext == ".md")) == 8
+
+
+def test_render_cache(data, tmpdir, monkeypatch):
+    """
+    Ensure that only reports with changed inputs are rendered again
+    """
+    from katprep import report
+    from katprep.analysis.delta import HostDelta
+
+    def get_deltas(reboot):
+        return [
+            HostDelta(host, dict(data["params"]),
+                      {"system_reboot": reboot}, data["errata"], [], [])
+            for host in ["web01.example.com", "web02.example.com"]
+        ]
+
+    rendered = []
+    options = get_report_options(tmpdir, monkeypatch)
+    report.create_reports(options, get_deltas(False))
+    options.jobs = 1
+    monkeypatch.setattr(
+        report, "render_host", lambda job: rendered.append(job[0]) or
+        (job[0], None)
+    )
+
+    #unchanged inputs, only volatile parameters differ
+    deltas = get_deltas(False)
+    deltas[0].params["time"] = "23:59"
+    report.create_reports(options, deltas)
+    assert rendered == []
+
+    #changed verification and missing output
+    deltas = get_deltas(False)
+    deltas[0].verification["system_reboot"] = True
+    tmpdir.join("errata-diff-web02.example.com-20170101.md").remove()
+    report.create_reports(options, deltas)
+    assert rendered == ["web01.example.com", "web02.example.com"]
+
+    #forced rendering
+    del rendered[:]
+    options.force_render = True
+    report.create_reports(options, get_deltas(False))
+    assert rendered == ["web01.example.com", "web02.example.com"]
+
+
+def test_preserve_yaml(data, tmpdir):
+    """
+    Ensure that YAML metadata is only written if requested
+    """
+    renderer = NativeRenderer(
+        os.path.join(TEMPLATE_DIR, "template.md"), "md", preserve_yaml=True
+    )
+    filename = str(tmpdir.join("report"))
+    renderer.render(data, filename)
+
+    with open("{}.yml".format(filename)) as metadata:
+        assert yaml.safe_load(metadata) == data
+
+
+def test_pandoc_renderer_stdin(data, tmpdir, monkeypatch):
+    """
+    Ensure that metadata is passed to pandoc without intermediate files
+    """
+    calls = []
+    monkeypatch.setattr(
+        subprocess, "run", lambda args, **kwargs: calls.append((args, kwargs))
+    )
+    renderer = PandocRenderer("template.html", "html")
+    filename = str(tmpdir.join("report"))
+    renderer.render(data, filename)
+
+    args, kwargs = calls[0]
+    assert args[-1] == "{}.html".format(filename)
+    assert yaml.safe_load(kwargs["input"]) == data
+    assert tmpdir.listdir() == []
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the errata catalog report format
+"""
+
+from __future__ import absolute_import
+
+import json
+
+import pytest
+
+from katprep.storage.catalog import (is_catalog_report, pack_report,
+unpack_report)
+
+
+@pytest.fixture
+def report():
+    return {
+        "web01.example.com": {
+            "errata": [
+                {"errata_id": "RHSA-2017:0001", "description": "Fix it"},
+                {"errata_id": "RHBA-2017:0002", "description": "Fix more"},
+            ],
+            "params": {"organization_name": "Example"},
+            "verification": {},
+        },
+        "web02.example.com": {
+            "errata": [
+                {"errata_id": "RHSA-2017:0001", "description": "Fix it",
+                 "installable": False},
+            ],
+            "params": {"organization_name": "Example"},
+            "verification": {"virt_snapshot": True},
+        },
+    }
+
+
+def test_pack_report(report):
+    """
+    Ensure that errata are only stored once
+    """
+    packed = pack_report(report)
+
+    assert is_catalog_report(packed)
+    assert sorted(packed["errata"]) == ["RHBA-2017:0002", "RHSA-2017:0001"]
+    assert packed["hosts"]["web01.example.com"]["errata"] == \
+        ["RHSA-2017:0001", "RHBA-2017:0002"]
+
+
+def test_unpack_report(report):
+    """
+    Ensure that packed reports can be converted back
+    """
+    packed = json.loads(json.dumps(pack_report(report)))
+
+    assert unpack_report(packed) == report
+
+
+def test_unpack_legacy_report(report):
+    """
+    Ensure that legacy reports are read unchanged
+    """
+    assert not is_catalog_report(report)
+    assert unpack_report(report) is report
+
+
+def test_removed_keys():
+    """
+    Ensure that keys missing in a host's erratum aren't restored from the
+    catalog
+    """
+    report = {
+        "web01.example.com": {"errata": [
+            {"errata_id": "RHSA-2017:0001", "reboot_suggested": True},
+        ]},
+        "web02.example.com": {"errata": [
+            {"errata_id": "RHSA-2017:0001", "severity": None},
+        ]},
+    }
+    packed = json.loads(json.dumps(pack_report(report)))
+
+    assert packed["hosts"]["web02.example.com"]["errata"] == [{
+        "errata_id": "RHSA-2017:0001", "severity": None,
+        "_removed": ["reboot_suggested"]
+    }]
+    assert unpack_report(packed) == report
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for retrieving host parameters and IDs from snapshot reports
+"""
+
+from __future__ import absolute_import
+
+import pytest
+
+from katprep import (get_host_params_by_report, get_id_by_report,
+get_required_hosts_by_report)
+
+
+@pytest.fixture
+def report():
+    return {
+        "web01.example.com": {
+            "errata": [],
+            "params": {
+                "host_id": 42, "organization_id": 1,
+                "organization_name": "Example", "katprep_virt": "esxi01",
+            },
+            "verification": {},
+        },
+        "web02.example.com": {
+            "errata": [],
+            "params": {
+                "organization_name": "Other", "katprep_virt": "esxi02",
+                "katprep_virt_type": "pyvmomi",
+            },
+            "verification": {},
+        },
+    }
+
+
+class NameLookup(object):
+    """
+    Foreman client recording name lookups
+    """
+
+    def __init__(self):
+        self.lookups = []
+
+    def get_id_by_name(self, name, api_object):
+        self.lookups.append((name, api_object))
+        return 1337
+
+
+def test_host_params(report):
+    """
+    Ensure that the parameters of the particular host are returned
+    """
+    assert get_host_params_by_report(report, "web02.example.com") == \
+        report["web02.example.com"]["params"]
+    assert get_host_params_by_report(report, "giertz.example.com") == {}
+
+
+def test_required_hosts(report):
+    """
+    Ensure that external hosts are returned along with a host using them
+    """
+    hosts = get_required_hosts_by_report(report, "katprep_virt")
+
+    assert list(hosts) == ["esxi01", "esxi02"]
+    assert hosts["esxi02"] == "web02.example.com"
+
+
+def test_stored_ids(report):
+    """
+    Ensure that IDs stored in the report are preferred
+    """
+    client = NameLookup()
+
+    assert get_id_by_report(report, "web01.example.com", "host", client) == 42
+    assert get_id_by_report(
+        report, "web01.example.com", "organization", client
+    ) == 1
+    assert client.lookups == []
+
+
+def test_id_lookup(report):
+    """
+    Ensure that IDs missing in reports of previous versions are looked up
+    """
+    client = NameLookup()
+
+    assert get_id_by_report(
+        report, "web02.example.com", "host", client
+    ) == 1337
+    get_id_by_report(report, "web02.example.com", "organization", client)
+    assert client.lookups == [
+        ("web02.example.com", "host"), ("Other", "organization")
+    ]
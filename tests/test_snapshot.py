@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scanning systems in katprep_snapshot
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from katprep import get_report_store, snapshot
+
+
+class FakeForeman(object):
+    """
+    Foreman client returning systems, their parameters and errata
+    """
+
+    def __init__(self, count, broken=(), broken_errata=()):
+        self.systems = [get_system(x) for x in range(count)]
+        self.broken = broken
+        self.broken_errata = broken_errata
+        self.scanned = []
+        self.listed = 0
+        self.lock = threading.Lock()
+
+    def iter_results(self, sub_url):
+        if sub_url.endswith("/errata"):
+            if int(sub_url.split("/")[-2]) in self.broken_errata:
+                raise snapshot.SessionException("Invalid response")
+            return [{"errata_id": "RHSA-2017:0001", "reboot_suggested": False}]
+        return self.__iter_systems()
+
+    def __iter_systems(self):
+        for system in self.systems:
+            self.listed = self.listed + 1
+            yield system
+
+    def api_get(self, sub_url):
+        host_id = int(sub_url.split("/")[-1])
+        #later systems finish first
+        time.sleep(0.002 * (len(self.systems) - host_id))
+        with self.lock:
+            self.scanned.append(host_id)
+        if host_id in self.broken:
+            return json.dumps({"id": host_id})
+        return json.dumps({
+            "id": host_id, "name": get_hostname(host_id),
+            "organization_id": 1, "organization_name": "Example",
+            "owner_id": 1, "facts": {"is_virtual": "true"},
+            "parameters": [{"name": "katprep_virt", "value": "virt01"}],
+        })
+
+    def get_name_by_id(self, object_id, api_object):
+        return "Admin"
+
+
+class RecordingWriter(object):
+    """
+    Report writer recording hosts and the number of listed systems that
+    weren't written yet
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.hosts = []
+        self.backlog = []
+
+    def add_host(self, host, entry):
+        self.hosts.append((host, entry))
+        self.backlog.append(self.client.listed - len(self.hosts))
+
+    def has_host(self, host):
+        return host in [x[0] for x in self.hosts]
+
+
+def get_hostname(host_id):
+    return "host{}.example.com".format(host_id)
+
+
+def get_system(host_id, total=1, updated_at="2017-01-01T00:00:00Z"):
+    return {
+        "id": host_id, "name": get_hostname(host_id), "updated_at": updated_at,
+        "content_facet_attributes": {"errata_counts": {
+            "security": total, "bugfix": 0, "enhancement": 0, "total": total
+        }},
+    }
+
+
+def get_options(**kwargs):
+    options = argparse.Namespace(
+        workers=4, filter_exclude=[], location=None, organization=None,
+        hostgroup=None, environment=None
+    )
+    for key, value in kwargs.items():
+        setattr(options, key, value)
+    return options
+
+
+@pytest.fixture
+def scan(monkeypatch):
+    def scan(client, options=None):
+        writer = RecordingWriter(client)
+        checkpoint = io.StringIO()
+        monkeypatch.setattr(snapshot, "SAT_CLIENT", client)
+        monkeypatch.setattr(snapshot, "REPORT_WRITER", writer)
+        monkeypatch.setattr(snapshot, "CHECKPOINT", checkpoint)
+        snapshot.scan_systems(options or get_options())
+        return (writer, [json.loads(x) for x in checkpoint.getvalue().split()])
+    monkeypatch.setattr(snapshot, "COMPLETED_SYSTEMS", set())
+    return scan
+
+
+def test_scan_order(scan):
+    """
+    Ensure that systems are written in the order Foreman returned them
+    """
+    client = FakeForeman(10)
+    (writer, checkpoint) = scan(client)
+
+    assert [x[0] for x in writer.hosts] == [get_hostname(x) for x in range(10)]
+    assert checkpoint == list(range(10))
+    assert writer.hosts[0][1]["params"]["katprep_virt"] == "virt01"
+    assert writer.hosts[0][1]["errata"][0]["errata_id"] == "RHSA-2017:0001"
+
+
+def test_scan_bounded(scan):
+    """
+    Ensure that only a limited number of systems is queued
+    """
+    client = FakeForeman(40)
+    (writer, _) = scan(client, get_options(workers=2))
+
+    assert len(writer.hosts) == 40
+    assert max(writer.backlog) <= 2 * 2 + 1
+
+
+def test_scan_failed_system(scan):
+    """
+    Ensure that systems that couldn't be scanned are dropped without
+    being recorded in the checkpoint
+    """
+    client = FakeForeman(5, broken=(3,), broken_errata=(1,))
+    (writer, checkpoint) = scan(client)
+
+    assert sorted(client.scanned) == list(range(5))
+    assert [x[0] for x in writer.hosts] == \
+        [get_hostname(x) for x in (0, 2, 4)]
+    assert checkpoint == [0, 2, 4]
+
+
+def test_scan_excluded(scan):
+    """
+    Ensure that excluded systems aren't scanned
+    """
+    client = FakeForeman(3)
+    (writer, _) = scan(client, get_options(filter_exclude=[get_hostname(1)]))
+
+    assert sorted(client.scanned) == [0, 2]
+    assert len(writer.hosts) == 2
+
+
+@pytest.fixture
+def previous_report(monkeypatch, tmp_path):
+    filename = tmp_path / "errata-snapshot-report-previous.json"
+    filename.write_text(json.dumps(dict(
+        (get_hostname(x), {
+            "errata": [{"errata_id": "RHSA-2016:0001"}],
+            "params": {
+                "errata_counts": get_system(x)["content_facet_attributes"][
+                    "errata_counts"],
+                "updated_at": get_system(x)["updated_at"],
+            },
+            "verification": {"virt_snapshot": True},
+        }) for x in range(3)
+    )))
+    report = get_report_store(str(filename))
+    monkeypatch.setattr(snapshot, "PREVIOUS_REPORT", report)
+    return report
+
+
+def test_since_unchanged(scan, previous_report):
+    """
+    Ensure that unchanged systems are copied from the previous report
+    without verification values and with their Foreman IDs
+    """
+    client = FakeForeman(3)
+    (writer, checkpoint) = scan(client)
+
+    assert client.scanned == []
+    assert checkpoint == [0, 1, 2]
+    entry = writer.hosts[1][1]
+    assert entry["errata"] == [{"errata_id": "RHSA-2016:0001"}]
+    assert entry["verification"] == {}
+    assert entry["params"]["host_id"] == 1
+
+
+@pytest.mark.parametrize("changed", [
+    get_system(1, total=2),
+    get_system(1, updated_at="2017-01-02T00:00:00Z"),
+])
+def test_since_changed(scan, previous_report, changed):
+    """
+    Ensure that systems with changed errata counters or modification
+    dates are scanned again
+    """
+    client = FakeForeman(3)
+    client.systems[1] = changed
+    (writer, _) = scan(client)
+
+    assert client.scanned == [1]
+    assert writer.hosts[1][1]["errata"][0]["errata_id"] == "RHSA-2017:0001"
+
+
+def test_since_new_system(scan, previous_report):
+    """
+    Ensure that systems missing in the previous report are scanned
+    """
+    client = FakeForeman(4)
+    (writer, _) = scan(client)
+
+    assert client.scanned == [3]
+    assert len(writer.hosts) == 4
+
+
+def test_resume_completed(scan, monkeypatch):
+    """
+    Ensure that systems captured by an interrupted run are skipped
+    """
+    client = FakeForeman(4)
+    monkeypatch.setattr(snapshot, "COMPLETED_SYSTEMS", {0, 2})
+    (writer, checkpoint) = scan(client)
+
+    assert sorted(client.scanned) == [1, 3]
+    assert checkpoint == [1, 3]
+    assert [x[0] for x in writer.hosts] == [get_hostname(1), get_hostname(3)]
+
+
+def test_load_checkpoint(tmp_path):
+    """
+    Ensure that an incomplete last checkpoint line is ignored
+    """
+    filename = tmp_path / "report.json.checkpoint"
+    filename.write_text("1\n2\n3")
+    assert snapshot.load_checkpoint(str(filename)) == {1, 2, 3}
+
+    filename.write_text('1\n2\n"3')
+    assert snapshot.load_checkpoint(str(filename)) == {1, 2}
+    assert snapshot.load_checkpoint(str(tmp_path / "missing")) == set()
+
+
+def test_find_interrupted_report(tmp_path):
+    """
+    Ensure that the latest interrupted report of a server is resumed
+    """
+    options = argparse.Namespace(
+        output_path="{}/".format(tmp_path), server="foreman.example.com",
+        report_format="json"
+    )
+    assert snapshot.find_interrupted_report(options) is None
+
+    for (name, mtime) in [
+            ("errata-snapshot-report-foreman-20170101-0000.json", 100),
+            ("errata-snapshot-report-foreman-20170102-0000.json", 200),
+            ("errata-snapshot-report-foreman-20170103-0000.jsonl", 300),
+            ("errata-snapshot-report-satellite-20170103-0000.json", 300)]:
+        checkpoint = tmp_path / snapshot.get_checkpoint_filename(name)
+        checkpoint.write_text("")
+        os.utime(str(checkpoint), (mtime, mtime))
+
+    assert snapshot.find_interrupted_report(options) == str(
+        tmp_path / "errata-snapshot-report-foreman-20170102-0000.json"
+    )
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the fleet-wide maintenance summary
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import csv
+import io
+import json
+import os
+
+import pytest
+
+from katprep import report
+from katprep.analysis.delta import HostDelta
+from katprep.analysis.summary import FleetSummary, SUMMARY_WRITERS
+
+
+@pytest.fixture
+def summary():
+    summary = FleetSummary()
+    summary.add(HostDelta(
+        "web01.example.com",
+        {"organization_name": "Example", "environment_name": "Production"},
+        {"system_reboot": True, "mon_status": "Ok"},
+        [
+            {"errata_id": "RHSA-2017:0001", "type": "security",
+             "severity": "Important", "reboot_suggested": True},
+            {"errata_id": "RHBA-2017:0002", "type": "bugfix"},
+        ], [], []
+    ))
+    summary.add(HostDelta(
+        "web02.example.com",
+        {"organization_name": "Example", "environment_name": "Testing"},
+        {"mon_status": "Warning/Critical", "mon_status_detail": "HTTP"},
+        [], [{"errata_id": "RHBA-2017:0002", "type": "bugfix"}], []
+    ))
+    return summary
+
+
+def test_summary(summary):
+    """
+    Ensure that errata, reboots and failures are aggregated
+    """
+    assert (summary.systems, summary.patched, summary.errata) == (2, 1, 2)
+    assert summary.by_type == {"security": 1, "bugfix": 1}
+    assert summary.by_severity == {"Important": 1, "None": 1}
+    assert (summary.reboots_suggested, summary.rebooted) == (1, 1)
+    assert summary.groups["organization"]["Example"] == \
+        {"systems": 2, "patched": 1, "errata": 2}
+    assert summary.groups["environment"]["Testing"]["patched"] == 0
+    assert summary.failures == \
+        [("web02.example.com", "Warning/Critical", "HTTP")]
+
+
+@pytest.mark.parametrize("summary_format", sorted(SUMMARY_WRITERS))
+def test_summary_writers(summary, summary_format):
+    """
+    Ensure that summaries are written in all formats
+    """
+    report_file = io.StringIO()
+    SUMMARY_WRITERS[summary_format](summary, report_file, "Summary")
+    content = report_file.getvalue()
+
+    assert "web02.example.com" in content
+    assert "Production" in content
+    if summary_format == "csv":
+        rows = list(csv.reader(io.StringIO(content)))
+        assert ["Errata by type", "security", "Errata", "1"] in rows
+
+
+def test_create_summary(monkeypatch, tmp_path):
+    """
+    Ensure that summaries are created without opening both reports at
+    the same time
+    """
+    filenames = []
+    for (name, errata, mtime) in [
+            ("old", ["RHSA-2017:0001", "RHBA-2017:0002"], 100),
+            ("new", ["RHBA-2017:0002"], 200)]:
+        filename = tmp_path / "errata-snapshot-report-{}.json".format(name)
+        filename.write_text(json.dumps({"web01.example.com": {
+            "errata": [{"errata_id": x, "type": "security"} for x in errata],
+            "params": {"organization_name": "Example"}, "verification": {}
+        }}))
+        os.utime(str(filename), (mtime, mtime))
+        filenames.append(str(filename))
+
+    opened = []
+    is_valid_report = report.is_valid_report
+
+    def open_report(filename):
+        store = is_valid_report(filename)
+        opened.append(store)
+        close = store.close
+        store.close = lambda: (opened.remove(store), close())
+        assert len(opened) == 1
+        return store
+
+    monkeypatch.setattr(report, "is_valid_report", open_report)
+    options = argparse.Namespace(
+        reports=filenames, output_path="{}/".format(tmp_path),
+        summary_format="csv"
+    )
+    report.analyze_reports(options)
+    report.create_summary(options)
+
+    summaries = list(tmp_path.glob("errata-summary-*.csv"))
+    assert len(summaries) == 1
+    rows = list(csv.reader(io.StringIO(summaries[0].read_text())))
+    assert ["Errata by type", "security", "Errata", "1"] in rows
+    assert opened == []
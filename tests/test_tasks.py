@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for tracking Foreman tasks
+"""
+
+from __future__ import absolute_import
+
+import pytest
+
+from katprep.tasks import Backoff, is_finished
+
+
+@pytest.mark.parametrize("task, finished", [
+    ({"state": "stopped", "result": "success"}, True),
+    ({"state": "paused", "result": "error"}, True),
+    ({"state": "running", "result": "pending"}, False),
+    (None, False),
+])
+def test_is_finished(task, finished):
+    """
+    Ensure that stopped and paused tasks are considered finished
+    """
+    assert is_finished(task) == finished
+
+
+def test_backoff():
+    """
+    Ensure that polling intervals grow without progress and are reset
+    """
+    backoff = Backoff(interval=5, maximum=30)
+
+    assert [backoff.next() for _ in range(5)] == [5, 10, 20, 30, 30]
+    assert backoff.next(progress=True) == 5
+    assert backoff.next() == 10
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for trend analytics over multiple snapshot reports
+"""
+
+from __future__ import absolute_import
+
+import datetime
+import json
+
+import pytest
+
+from katprep.analysis.trends import TrendData, get_snapshot_date
+from katprep.storage.jsonfile import ReportStore
+
+SECURITY = {"errata_id": "RHSA-2017:0001", "type": "security"}
+BUGFIX = {"errata_id": "RHBA-2017:0002", "type": "bugfix"}
+
+
+def get_host(environment, errata):
+    return {
+        "params": {"environment_name": environment},
+        "verification": {},
+        "errata": errata,
+    }
+
+
+@pytest.fixture
+def trends(tmpdir):
+    snapshots = [
+        {"web01": get_host("Production", [SECURITY, BUGFIX]),
+         "web02": get_host("Testing", [SECURITY])},
+        {"web01": get_host("Production", [BUGFIX]),
+         "web02": get_host("Testing", [SECURITY]),
+         "web03": get_host("Testing", [])},
+        {"web01": get_host("Production", []),
+         "web03": get_host("Testing", [SECURITY, BUGFIX])},
+    ]
+    trends = TrendData()
+    for day, snapshot in enumerate(snapshots, 1):
+        filename = tmpdir.join(
+            "errata-snapshot-report-sat-201701{:02d}-1200.json".format(day)
+        )
+        filename.write(json.dumps(snapshot))
+        trends.add_snapshot(
+            get_snapshot_date(str(filename)), ReportStore(str(filename))
+        )
+    return trends
+
+
+def test_snapshot_date(tmpdir):
+    """
+    Ensure that snapshot dates are read from report filenames
+    """
+    filename = tmpdir.join("errata-snapshot-report-sat-20170102-1330.json")
+    filename.write("{}")
+
+    assert get_snapshot_date(str(filename)) == \
+        datetime.datetime(2017, 1, 2, 13, 30)
+
+
+def test_outstanding(trends):
+    """
+    Ensure that outstanding errata are counted per snapshot
+    """
+    assert [x[1:] for x in trends.get_outstanding("security")] == \
+        [(2, 2), (1, 1), (1, 1)]
+    assert [x[1:] for x in trends.get_outstanding("bugfix")] == \
+        [(1, 1), (1, 1), (1, 1)]
+
+
+def test_latency(trends):
+    """
+    Ensure that patch latencies are measured between snapshots
+    """
+    stats = dict((x[0], x[1:]) for x in trends.get_latency_stats())
+
+    #web01: RHSA after 1 day, RHBA after 2 days; web02 missing afterwards
+    assert stats["security"][:2] == (1, 1.0)
+    assert stats["bugfix"][:2] == (1, 2.0)
+    assert stats["enhancement"][0] == 0
+
+
+def test_environment_drift(trends):
+    """
+    Ensure that environment means are compared with the fleet mean
+    """
+    drift = dict((x[0], x[1:]) for x in trends.get_environment_drift())
+
+    assert drift["Production"][0] == [2.0, 1.0, 0.0]
+    assert drift["Testing"][0] == [1.0, 0.5, 2.0]
+    assert drift["Testing"][1][2] == pytest.approx(1.0)
+
+
+def test_chronological_order(trends):
+    """
+    Ensure that older snapshots can't be added afterwards
+    """
+    with pytest.raises(ValueError):
+        trends.add_snapshot(datetime.datetime(2016, 1, 1), {})
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for rolling maintenance in waves
+"""
+
+from __future__ import absolute_import
+
+import argparse
+
+import pytest
+
+from katprep.waves import (WaveScheduler, get_bulk_groups,
+get_group_param, get_waves)
+
+
+@pytest.fixture
+def report():
+    report = {}
+    for i in range(5):
+        report["host{}.example.com".format(i)] = {
+            "errata": [],
+            "params": {
+                "hostgroup_name": "web" if i % 2 else "db",
+                "katprep_ring": str(i % 3),
+            },
+            "verification": {},
+        }
+    return report
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("hostgroup", "hostgroup_name"),
+    ("location", "location_name"),
+    ("param:katprep_ring", "katprep_ring"),
+])
+def test_group_param(value, expected):
+    """
+    Ensure that grouping keys are mapped to host parameters
+    """
+    assert get_group_param(value) == expected
+
+
+@pytest.mark.parametrize("value", ["giertz", "param:"])
+def test_invalid_group_param(value):
+    """
+    Ensure that invalid grouping keys are rejected
+    """
+    with pytest.raises(argparse.ArgumentTypeError):
+        get_group_param(value)
+
+
+def test_waves(report):
+    """
+    Ensure that hosts are split into waves
+    """
+    waves = get_waves(report, 2)
+
+    assert [len(x) for x in waves] == [2, 2, 1]
+    assert sorted(x for y in waves for x in y) == sorted(report)
+
+
+def test_grouped_waves(report):
+    """
+    Ensure that waves don't span multiple groups
+    """
+    waves = get_waves(report, 2, "hostgroup_name")
+
+    assert waves == [
+        ["host0.example.com", "host2.example.com"],
+        ["host4.example.com"],
+        ["host1.example.com", "host3.example.com"],
+    ]
+
+
+class FakeTasks(object):
+    """
+    Fake Foreman tasks finishing after a number of polls
+    """
+
+    def __init__(self, polls=2, no_task=(), missing=(), failed=()):
+        self.polls = polls
+        self.no_task = no_task
+        self.failed = failed
+        self.missing = missing
+        self.tasks = {}
+        self.events = []
+        self.finished = {}
+
+    def submit(self, hosts):
+        task_ids = {}
+        for host in hosts:
+            self.events.append(("submit", host))
+            if host in self.no_task:
+                task_ids[host] = []
+            elif host not in self.failed:
+                self.tasks[host] = 0
+                task_ids[host] = [host]
+        return task_ids
+
+    def poll(self, task_ids):
+        tasks = {}
+        for task_id in task_ids:
+            self.tasks[task_id] += 1
+            if task_id in self.missing:
+                continue
+            if self.tasks[task_id] >= self.polls:
+                tasks[task_id] = {"state": "stopped", "result": "success"}
+            else:
+                tasks[task_id] = {"state": "running", "result": "pending"}
+        self.in_flight = max(getattr(self, "in_flight", 0), len(task_ids))
+        return tasks
+
+    def finish(self, host, tasks):
+        self.events.append(("finish", host))
+        self.finished[host] = [x["result"] for x in tasks]
+
+
+def test_scheduler_waves():
+    """
+    Ensure that waves start once the previous wave has finished
+    """
+    tasks = FakeTasks()
+    scheduler = WaveScheduler(
+        tasks.submit, tasks.poll, tasks.finish, poll_interval=0
+    )
+
+    assert scheduler.run([["a", "b"], ["c"]])
+    assert tasks.events.index(("submit", "c")) > \
+        max(tasks.events.index(("finish", "a")),
+            tasks.events.index(("finish", "b")))
+    assert len(tasks.events) == 6
+
+
+def test_scheduler_max_in_flight():
+    """
+    Ensure that the number of hosts with running tasks is limited
+    """
+    tasks = FakeTasks(no_task=("b",))
+    scheduler = WaveScheduler(
+        tasks.submit, tasks.poll, tasks.finish, max_in_flight=2,
+        poll_interval=0
+    )
+
+    assert scheduler.run([["a", "b", "c", "d", "e"]])
+    assert tasks.in_flight == 2
+    assert sorted(x[1] for x in tasks.events if x[0] == "finish") == \
+        ["a", "b", "c", "d", "e"]
+
+
+def test_scheduler_failed_submit():
+    """
+    Ensure that hosts whose maintenance couldn't be started are failed
+    while hosts without tasks are finished regularly
+    """
+    tasks = FakeTasks(no_task=("b",), failed=("c",))
+    scheduler = WaveScheduler(
+        tasks.submit, tasks.poll, tasks.finish, poll_interval=0
+    )
+
+    assert scheduler.run([["a", "b", "c"]])
+    assert tasks.finished == {"a": ["success"], "b": [], "c": ["failed"]}
+
+
+def test_scheduler_timeout():
+    """
+    Ensure that remaining waves are skipped after a timeout
+    """
+    tasks = FakeTasks(polls=1000)
+    scheduler = WaveScheduler(
+        tasks.submit, tasks.poll, tasks.finish, poll_interval=0.01,
+        timeout=0.05
+    )
+
+    assert not scheduler.run([["a"], ["b"]])
+    assert ("submit", "b") not in tasks.events
+    assert tasks.finished == {"a": ["timeout"]}
+
+
+def test_scheduler_missing_tasks():
+    """
+    Ensure that hosts whose tasks can't be retrieved are failed
+    """
+    tasks = FakeTasks(missing=("b",))
+    scheduler = WaveScheduler(
+        tasks.submit, tasks.poll, tasks.finish, poll_interval=0,
+        missing_polls=3
+    )
+
+    assert scheduler.run([["a", "b"], ["c"]])
+    assert tasks.finished == {
+        "a": ["success"], "b": ["missing"], "c": ["success"]
+    }
+    assert tasks.tasks["b"] == 3
+
+
+def test_bulk_groups(report):
+    """
+    Ensure that hosts with identical errata are grouped
+    """
+    for i, host in enumerate(sorted(report)):
+        report[host]["params"]["organization_name"] = "Example"
+        report[host]["errata"] = [
+            {"errata_id": "RHSA-2017:0001"}, {"errata_id": "RHBA-2017:0001"}
+        ][0:i % 3]
+    groups = get_bulk_groups(report, sorted(report), 1)
+
+    assert groups == [
+        ("Example", ["RHSA-2017:0001"], ["host1.example.com"]),
+        ("Example", ["RHSA-2017:0001"], ["host4.example.com"]),
+        ("Example", ["RHBA-2017:0001", "RHSA-2017:0001"],
+         ["host2.example.com"]),
+    ]
+    assert len(get_bulk_groups(report, sorted(report))) == 2